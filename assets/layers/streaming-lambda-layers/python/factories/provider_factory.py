@@ -1,29 +1,46 @@
+from typing import TYPE_CHECKING, List
 from providers.base_provider import BaseProvider
-from providers.bedrock_provider import BedrockProvider
-from providers.openai_provider import OpenAIProvider
 from utils.enums import Provider, BedrockModel, OpenAiModel
-from model.streaming import StreamingCallback
 import os
 import logging
 
+if TYPE_CHECKING:
+    from langchain.llms.base import LLM
+    from model.streaming import StreamingCallback
+
 class ProviderFactory:
     """
     Factory class to instantiate AI model providers based on the provider type.
     """
 
-    def __init__(self, model_name: str, streaming_callback: StreamingCallback = None, api_key: str = None, max_tokens: int = 1000, temperature: float = 0.7) -> None:
+    def __init__(self, model_name: str, streaming_callback: "StreamingCallback" = None, api_key: str = None, max_tokens: int = 1000, temperature: float = 0.7,
+                 hedge_delay_ms: float = None, hedge_models: List[str] = None, hedge_regions: List[str] = None) -> None:
         """
         Initialize the ProviderFactory with necessary parameters.
         
         Parameters:
         model_name (str): The name of the model to instantiate.
-        streaming_callback (StreamingCallback, optional): Callback handler for streaming responses.
+        streaming_callback (StreamingCallback, optional): Callback handler for streaming responses. Required for get_llm
+            of the returned provider, not for get_cached_llm, where the callback is passed when the LLM is invoked.
         api_key (str, optional): API key for OpenAI models.
         max_tokens (int, optional): Maximum number of tokens in the model's response. Defaults to 1000.
         temperature (float, optional): Temperature to set for the model. Defaults to 0.7.
+        hedge_delay_ms (float, optional): Enables hedging: if no first token arrived after this many milliseconds, the
+            request is also sent to the next alternate, see HedgedProvider. Defaults to None, no hedging.
+        hedge_models (List[str], optional): Names of alternate models, hedged with in order.
+        hedge_regions (List[str], optional): Alternate regions of the Bedrock model, hedged with before hedge_models.
         """
         self.model_name = model_name
-        self.provider = self._get_provider_type()
+        self.provider = self._get_provider_type(model_name)
+        self.hedge_delay_ms = hedge_delay_ms
+        self.hedge_models = hedge_models or []
+        self.hedge_regions = hedge_regions or []
+        for hedge_model in self.hedge_models:
+            self._get_provider_type(hedge_model)
+        if self.hedge_regions and self.provider != Provider.BEDROCK:
+            raise ValueError("Alternate regions are only supported for Bedrock models")
+        if hedge_delay_ms is not None and not (self.hedge_models or self.hedge_regions):
+            raise ValueError("Hedging needs alternate models or regions")
         self.streaming_callback = streaming_callback
         self.api_key = api_key
         self.max_tokens = max_tokens
@@ -31,36 +48,61 @@ class ProviderFactory:
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.debug(f"ProviderFactory initialized with model_name: {self.model_name}, max_tokens: {self.max_tokens}, temperature: {self.temperature}")
     
-    def _get_provider_type(self):
-        if self.model_name in BedrockModel.__members__:
+    @staticmethod
+    def _get_provider_type(model_name: str):
+        if model_name in BedrockModel.__members__:
             return Provider.BEDROCK
-        elif self.model_name in OpenAiModel.__members__:
+        elif model_name in OpenAiModel.__members__:
             return Provider.OPENAI
         else:
-            raise ValueError(f"{self.model_name} is not a currently supported model")
+            raise ValueError(f"{model_name} is not a currently supported model")
     
     def get_provider(self) -> BaseProvider:
         """
         Determine the provider based on the model name and instantiate the corresponding provider.
+        Provider modules are imported here, so cold starts only load the LangChain integration in use.
+        With hedge_delay_ms, a HedgedProvider over the provider of the model and of its alternates is returned.
         Returns:
         BaseProvider: An instance of a provider implementing BaseProvider.
         Raises:
         ValueError: If the provider for the given model is unsupported or not found.
         """
-        if self.provider == Provider.BEDROCK:
-            model_id = BedrockModel[self.model_name].value
-            self.logger.debug(f"Model '{self.model_name}' identified as Bedrock model with ID '{model_id}'")
-            if not self.streaming_callback:
-                raise ValueError("Streaming callback is required for Bedrock Models")
-            return BedrockProvider(model_id=model_id, streaming_callback=self.streaming_callback, max_tokens=self.max_tokens, temperature=self.temperature)
-        elif self.provider == Provider.OPENAI:
-            model_id = OpenAiModel[self.model_name].value
-            self.logger.debug(f"Model '{self.model_name}' identified as OpenAi model with ID '{model_id}'")
-            if not self.streaming_callback:
-                raise ValueError("Streaming callback is required for OpenAi Models")
+        if self.hedge_delay_ms is None:
+            return self._create_provider(self.model_name, self.streaming_callback)
+
+        providers = [self._create_provider(self.model_name)]
+        providers += [self._create_provider(self.model_name, region=region) for region in self.hedge_regions]
+        providers += [self._create_provider(hedge_model) for hedge_model in self.hedge_models]
+        from providers.hedged_provider import HedgedProvider
+
+        return HedgedProvider(providers, streaming_callback=self.streaming_callback, hedge_delay_ms=self.hedge_delay_ms)
+
+    def _create_provider(self, model_name: str, streaming_callback: "StreamingCallback" = None, region: str = None) -> BaseProvider:
+        provider = self._get_provider_type(model_name)
+        if provider == Provider.BEDROCK:
+            model_id = BedrockModel[model_name].value
+            self.logger.debug(f"Model '{model_name}' identified as Bedrock model with ID '{model_id}'")
+            from providers.bedrock_provider import BedrockProvider
+
+            return BedrockProvider(model_id=model_id, streaming_callback=streaming_callback, max_tokens=self.max_tokens, temperature=self.temperature, region=region)
+        elif provider == Provider.OPENAI:
+            model_id = OpenAiModel[model_name].value
+            self.logger.debug(f"Model '{model_name}' identified as OpenAi model with ID '{model_id}'")
             if not self.api_key:
                 raise ValueError("API Key is required for OpenAI Models")
-            return OpenAIProvider(model_id=model_id, api_key=self.api_key, streaming_callback=self.streaming_callback, max_tokens=self.max_tokens, temperature=self.temperature)
+            from providers.openai_provider import OpenAIProvider
+
+            return OpenAIProvider(model_id=model_id, api_key=self.api_key, streaming_callback=streaming_callback, max_tokens=self.max_tokens, temperature=self.temperature)
         else:
-            self.logger.error(f"Unsupported or unknown model name: {self.model_name}")
-            raise ValueError(f"Unsupported or unknown model name: {self.model_name}")
+            self.logger.error(f"Unsupported or unknown model name: {model_name}")
+            raise ValueError(f"Unsupported or unknown model name: {model_name}")
+
+    def get_cached_llm(self) -> "LLM":
+        """
+        Return the LLM for the model from the LLM cache, creating it on first use.
+        The streaming callback is not attached, pass it when invoking the LLM, e.g.
+        `llm.stream(messages, config={"callbacks": [streaming_callback]})`.
+        Returns:
+        LLM: A LangChain LLM shared across warm invocations.
+        """
+        return self.get_provider().get_cached_llm()
@@ -0,0 +1,145 @@
+import itertools
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils.enums import WebSocketMessageFields as wssm
+from utils.enums import WebSocketMessageTypes as wsst
+
+# API Gateway WebSocket frames are limited to 32 KB
+MAX_FRAME_BYTES = 32 * 1024
+
+FRAGMENT_SEPARATOR = b"\n"
+
+
+class PayloadFragmenter:
+    """
+    Split payloads larger than `max_frame_bytes` into numbered fragments that fit in one frame
+
+    A fragment is a header line followed by a slice of the UTF-8 encoded payload, e.g.
+    `{"type": "fragment", "id": 3, "index": 0, "count": 4}\\n{"message": "The answer...`. JSON frames
+    never contain a raw line break, so clients tell fragments apart by the separator and join the
+    slices of all fragments of an id in order, see `FragmentAssembler`. Payloads are sliced through a
+    memoryview of the encoded buffer, each fragment is built with a single copy of its slice, and
+    slices end on UTF-8 character boundaries so every fragment is valid text.
+
+    Parameters
+    ----------
+    max_frame_bytes : int, optional, by default MAX_FRAME_BYTES
+        Maximum size of a posted frame, header included
+    """
+
+    def __init__(self, max_frame_bytes: int = MAX_FRAME_BYTES) -> None:
+        # room for a header with large numbers and at least one 4 byte character
+        if max_frame_bytes < 128:
+            raise ValueError("max_frame_bytes must be at least 128")
+        self.max_frame_bytes = max_frame_bytes
+        self.fragmented_payloads = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def split(self, payload: bytes) -> List[bytes]:
+        """
+        Return the frames to post for `payload`, the payload itself when it fits in one frame
+
+        Parameters
+        ----------
+        payload : bytes
+            UTF-8 encoded payload
+
+        Returns
+        -------
+        List[bytes]
+            Frames to post in order
+        """
+        if len(payload) <= self.max_frame_bytes:
+            return [payload]
+
+        with self._lock:
+            fragment_id = next(self._ids)
+            self.fragmented_payloads += 1
+
+        # the header size depends on the number of fragments, which depends on the header size
+        count = 2
+        while True:
+            slices = self._slices(payload, self.max_frame_bytes - len(_header(fragment_id, count, count)))
+            if len(slices) <= count:
+                break
+            count = len(slices)
+
+        view = memoryview(payload)
+        return [
+            b"".join((_header(fragment_id, index, len(slices)), view[start:end]))
+            for index, (start, end) in enumerate(slices)
+        ]
+
+    @staticmethod
+    def _slices(payload: bytes, max_bytes: int) -> List[Tuple[int, int]]:
+        slices = []
+        start = 0
+        while start < len(payload):
+            end = min(start + max_bytes, len(payload))
+            # never split a multi-byte character, continuation bytes are 0b10xxxxxx
+            while end < len(payload) and payload[end] & 0xC0 == 0x80:
+                end -= 1
+            slices.append((start, end))
+            start = end
+        return slices
+
+
+def _header(fragment_id: int, index: int, count: int) -> bytes:
+    header = {wssm.TYPE: wsst.FRAGMENT, wssm.ID: fragment_id, wssm.INDEX: index, wssm.COUNT: count}
+    return json.dumps(header).encode("utf-8") + FRAGMENT_SEPARATOR
+
+
+class FragmentAssembler:
+    """
+    Reference client for fragmented payloads, the counterpart of `PayloadFragmenter`
+
+    Frames that are not fragments are returned as they are. Fragments are kept until all fragments
+    of their payload arrived, the joined payload is then returned.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[int, Dict[int, bytes]] = {}
+
+    @property
+    def pending_payloads(self) -> int:
+        return len(self._pending)
+
+    def add(self, frame: bytes) -> Optional[bytes]:
+        """
+        Add a received frame
+
+        Parameters
+        ----------
+        frame : bytes
+            Frame received over the websocket
+
+        Returns
+        -------
+        Optional[bytes]
+            The complete payload, or None while fragments of the payload are missing
+
+        Raises
+        ------
+        ValueError
+            If a fragment header is malformed
+        """
+        header, separator, data = frame.partition(FRAGMENT_SEPARATOR)
+        if not separator:
+            return frame
+        try:
+            fields = json.loads(header)
+            fragment_id, index, count = fields[wssm.ID], fields[wssm.INDEX], fields[wssm.COUNT]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Malformed fragment header {header[:100]!r}") from e
+        if fields.get(wssm.TYPE) != wsst.FRAGMENT or not 0 <= index < count:
+            raise ValueError(f"Malformed fragment header {header[:100]!r}")
+
+        fragments = self._pending.setdefault(fragment_id, {})
+        fragments[index] = data
+        if len(fragments) < count:
+            return None
+        del self._pending[fragment_id]
+        return b"".join(fragments[i] for i in range(count))
@@ -0,0 +1,162 @@
+import json
+from json.encoder import encode_basestring, encode_basestring_ascii
+from typing import Any, Dict, List, Optional
+
+from utils.enums import WebSocketMessageFields as wssm
+from utils.enums import WebSocketMessageTypes as wsst
+
+# message types whose frames are built by the encoder, the others are serialized with json.dumps
+FRAME_TYPES = (wsst.STREAM, wsst.DELTA, wsst.END, wsst.ERROR, wsst.SCORE)
+
+_EMPTY_FRAME = json.dumps({wssm.MESSAGE: ""})
+
+# longer texts are escaped by orjson in chunks of this many characters
+_ORJSON_CHUNK_CHARS = 16384
+
+
+def _load_orjson() -> Any:
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+class FrameEncoder:
+    """
+    Encode the STREAM, DELTA, END, ERROR and SCORE frames of a streamed answer directly to UTF-8 bytes
+
+    Each message type has a precomputed template around the message, so only the message text is
+    escaped. The output is byte for byte `json.dumps(frame, ensure_ascii=ensure_ascii).encode("utf-8")`
+    for a frame with the fields message, type, offset, index, score and sequence in that order, as built by
+    `BedrockStreamingCallback`. When `orjson` is installed it escapes the text, except for texts it
+    would escape differently than `json.dumps`, i.e. non ASCII text or DEL when `ensure_ascii=True`.
+
+    Parameters
+    ----------
+    ensure_ascii : bool, optional, by default True
+        Whether to escape non ASCII characters, like `json.dumps`. Without escaping, frames of non
+        English answers are smaller.
+    use_orjson : bool, optional, by default None
+        Whether to escape the text with `orjson`. By default it is used when it is installed.
+
+    Raises
+    ------
+    ImportError
+        If `use_orjson=True` and `orjson` is not installed
+    """
+
+    _PREFIX = _EMPTY_FRAME[:-3].encode("utf-8")
+    _OFFSET = f', "{wssm.OFFSET.value}": '.encode("utf-8")
+    _INDEX = f', "{wssm.INDEX.value}": '.encode("utf-8")
+    _SCORE = f', "{wssm.SCORE.value}": '.encode("utf-8")
+    _SEQUENCE = f', "{wssm.SEQUENCE.value}": '.encode("utf-8")
+    # e.g. ', "type": "stream"', the fields between the message and the closing brace
+    _TYPE_FIELDS: Dict[wsst, bytes] = {
+        message_type: json.dumps({wssm.MESSAGE: "", wssm.TYPE: message_type})[len(_EMPTY_FRAME) - 1 : -1].encode()
+        for message_type in FRAME_TYPES
+    }
+
+    def __init__(self, ensure_ascii: bool = True, use_orjson: Optional[bool] = None) -> None:
+        self.ensure_ascii = ensure_ascii
+        self._orjson = None if use_orjson is False else _load_orjson()
+        if use_orjson and self._orjson is None:
+            raise ImportError("use_orjson=True requires the orjson package")
+
+    @property
+    def uses_orjson(self) -> bool:
+        return self._orjson is not None
+
+    def encode(
+        self,
+        message_type: wsst,
+        message: str,
+        offset: Optional[int] = None,
+        sequence: Optional[int] = None,
+        index: Optional[int] = None,
+        score: Optional[float] = None,
+    ) -> bytes:
+        """
+        Encode a frame
+
+        Parameters
+        ----------
+        message_type : WebSocketMessageTypes
+            One of FRAME_TYPES
+        message : str
+            Message text
+        offset : int, optional
+            Offset of a DELTA frame
+        sequence : int, optional
+            Sequence number of the frame
+        index : int, optional
+            Index of the sentence of a SCORE frame
+        score : float, optional
+            Relevance score of a SCORE frame
+
+        Returns
+        -------
+        bytes
+            UTF-8 encoded JSON frame
+
+        Raises
+        ------
+        ValueError
+            If the message type is not one of FRAME_TYPES
+        """
+        type_fields = self._TYPE_FIELDS.get(message_type)
+        if type_fields is None:
+            # plain strings hash differently than the enum members
+            type_fields = self._TYPE_FIELDS.get(_as_message_type(message_type))
+            if type_fields is None:
+                raise ValueError(f"Cannot encode frames of type {message_type}, expected one of {FRAME_TYPES}")
+
+        parts = [self._PREFIX]
+        self._add_escaped(parts, message)
+        parts.append(type_fields)
+        if offset is not None:
+            parts += (self._OFFSET, b"%d" % offset)
+        if index is not None:
+            parts += (self._INDEX, b"%d" % index)
+        if score is not None:
+            parts += (self._SCORE, json.dumps(score).encode("ascii"))
+        if sequence is not None:
+            parts += (self._SEQUENCE, b"%d" % sequence)
+        parts.append(b"}")
+        return b"".join(parts)
+
+    def _add_escaped(self, parts: List[bytes], text: str) -> None:
+        """
+        Append the quoted JSON string of `text`, encoded to UTF-8, to `parts`
+        """
+        if self._orjson is not None and (not self.ensure_ascii or (text.isascii() and "\x7f" not in text)):
+            try:
+                if len(text) <= _ORJSON_CHUNK_CHARS:
+                    parts.append(self._orjson.dumps(text))
+                    return
+                # orjson allocates several times the size of the text for its output, so long texts are
+                # escaped in chunks, characters are escaped independently of each other
+                escaped = [b'"']
+                for start in range(0, len(text), _ORJSON_CHUNK_CHARS):
+                    escaped.append(self._orjson.dumps(text[start : start + _ORJSON_CHUNK_CHARS])[1:-1])
+                escaped.append(b'"')
+                parts += escaped
+                return
+            except self._orjson.JSONEncodeError:
+                # lone surrogates, left to the json module
+                pass
+        if self.ensure_ascii:
+            parts.append(encode_basestring_ascii(text).encode("ascii"))
+        else:
+            parts.append(encode_basestring(text).encode("utf-8"))
+
+
+def _as_message_type(message_type: Any) -> Optional[wsst]:
+    try:
+        return wsst(message_type)
+    except ValueError:
+        return None
+
+
+# shared by the streaming callbacks, encoders hold no per stream state
+FRAME_ENCODER = FrameEncoder()
@@ -1,8 +1,31 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Optional
 
 
 class BasePublisher(ABC):
     @abstractmethod
     def publish(self, payload: Any) -> None:
-        pass
\ No newline at end of file
+        pass
+
+    async def apublish(self, payload: Any) -> None:
+        """
+        Publish from a coroutine. The sync `publish` runs in a worker thread so that a blocking call,
+        such as a post to API Gateway, does not hold up the event loop. Publishers that do not block
+        override this to publish directly.
+        """
+        # asyncio is imported on first use to keep it out of the cold start of sync handlers
+        import asyncio
+
+        await asyncio.to_thread(self.publish, payload)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all published payloads are delivered. Returns False if `timeout` seconds passed first.
+        """
+        return True
+
+    def is_closed_error(self, error: Exception) -> bool:
+        """
+        Whether `error` raised by `publish` means nothing can be delivered anymore, e.g. a closed connection.
+        """
+        return False
@@ -0,0 +1,78 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Iterable, List, Optional, Set
+
+from messaging.fragments import MAX_FRAME_BYTES, PayloadFragmenter
+from messaging.publishers.base import BasePublisher
+from messaging.publishers.websocket import is_gone_error
+from utils.clients import get_client
+
+
+class BroadcastWebSocketPublisher(BasePublisher):
+    """
+    Publisher that sends every payload to many connections of one API Gateway WebSocket endpoint
+
+    Each payload is encoded once and the same bytes are posted to all connections through one pooled
+    client, with at most `max_concurrency` requests in flight. Connections that are gone are removed
+    and recorded in `stale_connections`; other failures are logged and kept in `errors`. Payloads
+    larger than `max_frame_bytes` are posted as fragments, see `PayloadFragmenter`.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        connection_ids: Iterable[str] = (),
+        client: Any = None,
+        max_concurrency: int = 32,
+        max_frame_bytes: Optional[int] = MAX_FRAME_BYTES,
+    ) -> None:
+        self._client = client or get_client(
+            "apigatewaymanagementapi", endpoint_url=endpoint_url, max_pool_connections=max_concurrency
+        )
+        self._connection_ids = dict.fromkeys(connection_ids)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="broadcast")
+        self.stale_connections: Set[str] = set()
+        self.errors: List[Exception] = []
+        self.fragmenter = PayloadFragmenter(max_frame_bytes) if max_frame_bytes is not None else None
+        self.logger = logging.getLogger(self.__class__.__name__)
+        super().__init__()
+
+    @property
+    def connection_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._connection_ids)
+
+    def add_connection(self, connection_id: str) -> None:
+        with self._lock:
+            self._connection_ids[connection_id] = None
+
+    def remove_connection(self, connection_id: str) -> None:
+        with self._lock:
+            self._connection_ids.pop(connection_id, None)
+
+    def publish(self, payload: Any) -> None:
+        data = payload if isinstance(payload, bytes) else payload.encode("utf-8")
+        frames = self.fragmenter.split(data) if self.fragmenter is not None else [data]
+        for frame in frames:
+            self._post_to_all(frame)
+
+    def _post_to_all(self, data: bytes) -> None:
+        futures = {
+            self._executor.submit(self._client.post_to_connection, Data=data, ConnectionId=connection_id): connection_id
+            for connection_id in self.connection_ids
+        }
+        # waiting for every connection keeps the payloads in order per connection
+        wait(futures)
+
+        for future, connection_id in futures.items():
+            error = future.exception()
+            if error is None:
+                continue
+            if is_gone_error(error):
+                self.remove_connection(connection_id)
+                self.stale_connections.add(connection_id)
+            else:
+                self.logger.error(f"Failed to post to connection {connection_id}: {error}")
+                self.errors.append(error)
@@ -0,0 +1,132 @@
+import threading
+from typing import Any, List, Optional
+
+from messaging.publishers.base import BasePublisher
+from utils.enums import ResponseStreamFormats
+
+CONTENT_TYPES = {
+    ResponseStreamFormats.NDJSON: "application/x-ndjson",
+    ResponseStreamFormats.SSE: "text/event-stream",
+}
+
+
+class ResponseStreamPublisher(BasePublisher):
+    """
+    Publisher that writes frames to a Lambda response stream, e.g. for functions behind a function URL
+
+    Unlike `WebSocketPublisher`, there is no API call per frame: frames are written to `writer`, any
+    object with a `write(bytes)` method and optionally `flush()` and `close()`, such as the response
+    stream of the runtime. Frames are framed as newline delimited JSON, or as server-sent events with
+    one `data:` line per line of the payload.
+
+    Framed bytes are buffered and written in chunks of at most `chunk_bytes`. With `auto_flush=True`,
+    the buffer is written and the writer flushed after every frame, for the lowest latency. Otherwise
+    bytes are only written once a chunk is full and flushed when `flush` is called, which
+    `MessageDeliveryService.flush` does before the handler returns.
+
+    Parameters:
+        writer (Any): Response stream to write to.
+        framing (ResponseStreamFormats): NDJSON or SSE.
+        chunk_bytes (int): Maximum size of a write.
+        auto_flush (bool): Whether to write and flush after every frame.
+    """
+
+    def __init__(
+        self,
+        writer: Any,
+        framing: ResponseStreamFormats = ResponseStreamFormats.NDJSON,
+        chunk_bytes: int = 16 * 1024,
+        auto_flush: bool = True,
+    ) -> None:
+        if chunk_bytes < 1:
+            raise ValueError("chunk_bytes must be at least 1")
+        self._writer = writer
+        self.framing = ResponseStreamFormats(framing)
+        self.chunk_bytes = chunk_bytes
+        self.auto_flush = auto_flush
+        self.bytes_written = 0
+        self.writes = 0
+        self.flushes = 0
+        self._buffer: List[bytes] = []
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        super().__init__()
+
+    @property
+    def content_type(self) -> str:
+        """Content type of the response, to send with the response metadata"""
+        return CONTENT_TYPES[self.framing]
+
+    def publish(self, payload: Any) -> None:
+        data = payload if isinstance(payload, bytes) else payload.encode("utf-8")
+        framed = self._frame(data)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot publish to a closed response stream")
+            self._buffer.extend(framed)
+            self._buffered_bytes += sum(len(part) for part in framed)
+            if self.auto_flush:
+                self._write_buffer(whole=True)
+                self._flush_writer()
+            elif self._buffered_bytes >= self.chunk_bytes:
+                self._write_buffer(whole=False)
+
+    def _frame(self, data: bytes) -> List[bytes]:
+        if self.framing == ResponseStreamFormats.NDJSON:
+            return [data, b"\n"]
+        # every line of an event needs its own field name, JSON frames are a single line
+        if b"\n" not in data:
+            return [b"data: ", data, b"\n\n"]
+        framed = []
+        for line in data.split(b"\n"):
+            framed += (b"data: ", line, b"\n")
+        framed.append(b"\n")
+        return framed
+
+    def _write_buffer(self, whole: bool) -> None:
+        """
+        Write the buffered bytes in chunks of at most `chunk_bytes`, keeping a partial last chunk
+        unless `whole` is set
+        """
+        if not self._buffer:
+            return
+        data = self._buffer[0] if len(self._buffer) == 1 else b"".join(self._buffer)
+        end = len(data) if whole else len(data) - len(data) % self.chunk_bytes
+        if end == len(data) <= self.chunk_bytes:
+            chunks = [data]
+        else:
+            chunks = [data[start : min(start + self.chunk_bytes, end)] for start in range(0, end, self.chunk_bytes)]
+        for chunk in chunks:
+            self._writer.write(chunk)
+            self.bytes_written += len(chunk)
+            self.writes += 1
+        rest = data[end:]
+        self._buffer = [rest] if rest else []
+        self._buffered_bytes = len(rest)
+
+    def _flush_writer(self) -> None:
+        flush = getattr(self._writer, "flush", None)
+        if flush is not None:
+            flush()
+        self.flushes += 1
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write the buffered frames and flush the writer
+        """
+        with self._lock:
+            self._write_buffer(whole=True)
+            self._flush_writer()
+        return True
+
+    def close(self) -> None:
+        """
+        Flush and close the writer, ending the response
+        """
+        self.flush()
+        with self._lock:
+            self._closed = True
+            close = getattr(self._writer, "close", None)
+            if close is not None:
+                close()
@@ -1,15 +1,204 @@
-from typing import Any
-import boto3
+import collections
+import json
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from messaging.fragments import MAX_FRAME_BYTES, PayloadFragmenter
+from messaging.frames import FRAME_ENCODER, FrameEncoder
 from messaging.publishers.base import BasePublisher
+from utils.clients import get_client
+from utils.enums import WebSocketMessageFields as wssm
+from utils.enums import WebSocketMessageTypes as wsst
+
+if TYPE_CHECKING:
+    from utils.instrumentation import StreamingInstrumentation
+
 
 class WebSocketPublisher(BasePublisher):
-    def __init__(self, endpoint_url: str, connection_id: str) -> None:
-        self._client = boto3.client("apigatewaymanagementapi", endpoint_url=endpoint_url)
+    """
+    Publisher that posts every payload to one API Gateway WebSocket connection
+
+    Payloads larger than `max_frame_bytes` once encoded are posted as fragments, see
+    `PayloadFragmenter`. With `max_frame_bytes=None` payloads are always posted whole. With an
+    `instrumentation`, every `post_to_connection` call is timed as PostToConnection.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        connection_id: str,
+        client: Any = None,
+        max_frame_bytes: Optional[int] = MAX_FRAME_BYTES,
+        instrumentation: Optional["StreamingInstrumentation"] = None,
+    ) -> None:
+        self._client = client or get_client("apigatewaymanagementapi", endpoint_url=endpoint_url)
         self._connection_id = connection_id
+        self.fragmenter = PayloadFragmenter(max_frame_bytes) if max_frame_bytes is not None else None
+        self.instrumentation = instrumentation
         super().__init__()
 
     def publish(self, payload: Any) -> None:
-        self._client.post_to_connection(
-            Data=payload.encode('utf-8'),
-            ConnectionId=self._connection_id,
+        data = payload if isinstance(payload, bytes) else payload.encode('utf-8')
+        frames = self.fragmenter.split(data) if self.fragmenter is not None else [data]
+        for frame in frames:
+            if self.instrumentation is None:
+                self._client.post_to_connection(Data=frame, ConnectionId=self._connection_id)
+                continue
+            started = time.perf_counter()
+            try:
+                self._client.post_to_connection(Data=frame, ConnectionId=self._connection_id)
+            finally:
+                self.instrumentation.record("PostToConnection", time.perf_counter() - started)
+
+    def is_closed_error(self, error: Exception) -> bool:
+        return is_gone_error(error)
+
+
+class BackgroundWebSocketPublisher(WebSocketPublisher):
+    """
+    WebSocket publisher that posts from a background thread, so `publish` does not wait for API Gateway
+
+    Payloads are posted in order by a single worker thread. When more than `max_queue_size` payloads
+    are waiting, STREAM and DELTA frames that a later STREAM or END frame makes obsolete are dropped
+    and consecutive DELTA frames are merged into one, encoded by `frame_encoder`. END and ERROR frames
+    are never dropped.
+
+    The worker thread only runs while payloads are waiting and exits once the queue is empty, the next
+    `publish` starts a new one, so publishers left behind by warm invocations hold no thread. Call
+    `flush` before the Lambda handler returns.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        connection_id: str,
+        client: Any = None,
+        max_queue_size: int = 32,
+        max_frame_bytes: Optional[int] = MAX_FRAME_BYTES,
+        instrumentation: Optional["StreamingInstrumentation"] = None,
+        frame_encoder: Optional[FrameEncoder] = None,
+    ) -> None:
+        super().__init__(
+            endpoint_url,
+            connection_id,
+            client=client,
+            max_frame_bytes=max_frame_bytes,
+            instrumentation=instrumentation,
         )
+        self.max_queue_size = max_queue_size
+        self.frame_encoder = frame_encoder or FRAME_ENCODER
+        self.dropped_frames = 0
+        self.errors = []
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker: Optional[threading.Thread] = None
+
+    def publish(self, payload: Any) -> None:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot publish to a closed publisher")
+            self._queue.append(payload)
+            if len(self._queue) > self.max_queue_size:
+                self._compact()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"websocket-{self._connection_id}", daemon=True)
+                self._worker.start()
+
+    async def apublish(self, payload: Any) -> None:
+        # only queues the payload, there is no need for a worker thread
+        self.publish(payload)
+
+    def _compact(self) -> None:
+        """
+        Drop obsolete STREAM and DELTA frames and merge consecutive DELTA frames
+        """
+        frames = [_decode_frame(payload) for payload in self._queue]
+        last_full = max(
+            (i for i, frame in enumerate(frames) if frame.get(wssm.TYPE) in (wsst.STREAM, wsst.END)),
+            default=-1,
+        )
+
+        compacted = []
+        pending_delta = None
+        for i, (payload, frame) in enumerate(zip(self._queue, frames)):
+            frame_type = frame.get(wssm.TYPE)
+            if frame_type in (wsst.STREAM, wsst.DELTA) and i < last_full:
+                continue
+            if frame_type == wsst.DELTA:
+                pending_delta = frame if pending_delta is None else _merge_deltas(pending_delta, frame)
+                continue
+            if pending_delta is not None:
+                compacted.append(self._encode_delta(pending_delta))
+                pending_delta = None
+            compacted.append(payload)
+        if pending_delta is not None:
+            compacted.append(self._encode_delta(pending_delta))
+
+        self.dropped_frames += len(self._queue) - len(compacted)
+        self._queue = collections.deque(compacted)
+
+    def _encode_delta(self, frame: dict) -> bytes:
+        return self.frame_encoder.encode(
+            wsst.DELTA, frame[wssm.MESSAGE], offset=frame[wssm.OFFSET], sequence=frame.get(wssm.SEQUENCE)
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._queue:
+                    # the worker stops once everything is posted, `flush` waits for it
+                    self._worker = None
+                    self._condition.notify_all()
+                    return
+                payload = self._queue.popleft()
+            try:
+                super().publish(payload)
+            except Exception as e:
+                self.logger.error(f"Failed to post to connection {self._connection_id}: {e}")
+                self.errors.append(e)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: self._worker is None, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Flush and refuse further payloads
+        """
+        delivered = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+        return delivered
+
+
+def is_gone_error(error: Exception) -> bool:
+    """
+    Whether `error` is the GoneException API Gateway raises when posting to a closed connection
+    """
+    if type(error).__name__ == "GoneException":
+        return True
+    return getattr(error, "response", {}).get("Error", {}).get("Code") == "GoneException"
+
+
+def _decode_frame(payload: Any) -> dict:
+    try:
+        frame = json.loads(payload)
+    except (TypeError, ValueError):
+        return {}
+    return frame if isinstance(frame, dict) else {}
+
+
+def _merge_deltas(first: dict, second: dict) -> dict:
+    """
+    Combine two consecutive DELTA frames into one with the same effect, keeping the later sequence number
+    """
+    offset, message = first[wssm.OFFSET], first[wssm.MESSAGE]
+    if second[wssm.OFFSET] >= offset:
+        message = message[: second[wssm.OFFSET] - offset] + second[wssm.MESSAGE]
+    else:
+        offset, message = second[wssm.OFFSET], second[wssm.MESSAGE]
+    return {**second, wssm.OFFSET: offset, wssm.MESSAGE: message}
@@ -0,0 +1,63 @@
+from typing import Any, Dict
+
+from utils.enums import WebSocketMessageFields as wssm
+from utils.enums import WebSocketMessageTypes as wsst
+
+STREAM_SUFFIX = "..."
+
+
+class StreamReassembler:
+    """
+    Reference client for the streamed answer frames
+
+    Rebuilds the answer from STREAM, DELTA and END frames, checking that sequence numbers increase
+    when frames carry them. Numbers may be skipped, since a sender may drop obsolete frames or merge
+    DELTA frames. `text` is the cleaned answer without the "..." that STREAM frames end with.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.finished = False
+        self.error = None
+        self._last_sequence = -1
+
+    def add(self, frame: Dict[str, Any]) -> str:
+        """
+        Apply a decoded frame
+
+        Parameters
+        ----------
+        frame : dict
+            Frame received over the websocket, after `json.loads`
+
+        Returns
+        -------
+        str
+            The answer reassembled so far
+
+        Raises
+        ------
+        ValueError
+            If a frame is out of order or does not fit the answer received so far
+        """
+        if wssm.SEQUENCE in frame:
+            if frame[wssm.SEQUENCE] <= self._last_sequence:
+                raise ValueError(f"Received frame {frame[wssm.SEQUENCE]} after frame {self._last_sequence}")
+            self._last_sequence = frame[wssm.SEQUENCE]
+
+        message = frame[wssm.MESSAGE]
+        message_type = frame[wssm.TYPE]
+        if message_type == wsst.STREAM:
+            self.text = message[: len(message) - len(STREAM_SUFFIX)] if message.endswith(STREAM_SUFFIX) else message
+        elif message_type == wsst.DELTA:
+            offset = frame[wssm.OFFSET]
+            if offset > len(self.text):
+                raise ValueError(f"Delta offset {offset} is past the end of the answer ({len(self.text)})")
+            self.text = self.text[:offset] + message
+        elif message_type == wsst.END:
+            self.text = message
+            self.finished = True
+        elif message_type == wsst.ERROR:
+            self.error = message
+            self.finished = True
+        return self.text
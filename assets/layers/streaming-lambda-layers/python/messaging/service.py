@@ -1,18 +1,251 @@
-from typing import Any
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 from messaging.publishers.base import BasePublisher
 
+if TYPE_CHECKING:
+    from utils.instrumentation import StreamingInstrumentation
+
+
+def _remaining(deadline: float) -> Optional[float]:
+    """Seconds left until a monotonic deadline, None for no limit"""
+    if deadline == math.inf:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class DeliveryReport:
+    """
+    Outcome of posting one payload to the attached publishers
+    """
 
-class MessageDeliveryService:
     def __init__(self) -> None:
+        self.delivered: List[BasePublisher] = []
+        self.failed: Dict[BasePublisher, Exception] = {}
+        self.timed_out: List[BasePublisher] = []
+        self.detached: List[BasePublisher] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed and not self.timed_out
+
+
+class MessageDeliveryService:
+    """
+    Posts payloads to all attached publishers
+
+    By default publishers are called one after the other and exceptions are raised to the caller.
+    With `concurrent=True`, every publisher gets its own sender thread, so payloads are published to
+    all of them in parallel while each publisher still receives them in order. `post` then waits at
+    most the timeout of each publisher, the `timeout` given to `attach` or else `publish_timeout`
+    seconds, a failing publisher does not affect the others, and publishers whose connection is gone
+    are detached.
+
+    `apost` is the asyncio counterpart of `post`: it awaits `apublish` of all publishers at once.
+    Without `concurrent`, it waits for every publisher and raises the first exception. With
+    `concurrent=True`, it follows the rules of `post` and payloads are still published in order to
+    each publisher, even when an earlier one timed out.
+
+    With an `instrumentation`, the time every `post` and `apost` takes is recorded as Publish.
+    """
+
+    def __init__(
+        self,
+        concurrent: bool = False,
+        publish_timeout: Optional[float] = None,
+        instrumentation: Optional["StreamingInstrumentation"] = None,
+    ) -> None:
         self._publishers = []
+        self.concurrent = concurrent
+        self.publish_timeout = publish_timeout
+        self.instrumentation = instrumentation
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._executors: Dict[BasePublisher, ThreadPoolExecutor] = {}
+        self._last_futures = {}
+        self._publish_locks = {}
+        self._pending_tasks = set()
+        self._timeouts: Dict[BasePublisher, float] = {}
 
-    def attach(self, publisher: BasePublisher) -> None:
-        self._publishers.append(publisher)
+    def attach(self, publisher: BasePublisher, timeout: Optional[float] = None) -> None:
+        """
+        Attach a publisher. With `concurrent=True`, posts wait at most `timeout` seconds for it,
+        by default `publish_timeout`.
+        """
+        with self._lock:
+            self._publishers.append(publisher)
+            if timeout is not None:
+                self._timeouts[publisher] = timeout
 
     def detach(self, publisher: BasePublisher) -> None:
-        self._publishers.remove(publisher)
+        with self._lock:
+            self._publishers.remove(publisher)
+            executor = self._executors.pop(publisher, None)
+            self._last_futures.pop(publisher, None)
+            self._publish_locks.pop(publisher, None)
+            self._timeouts.pop(publisher, None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def post(self, payload: Any) -> DeliveryReport:
+        if self.instrumentation is None:
+            return self._post(payload)
+        started = time.perf_counter()
+        try:
+            return self._post(payload)
+        finally:
+            self.instrumentation.record("Publish", time.perf_counter() - started)
+
+    def _post(self, payload: Any) -> DeliveryReport:
+        report = DeliveryReport()
+        if not self.concurrent:
+            for publisher in self._publishers:
+                publisher.publish(payload)
+                report.delivered.append(publisher)
+            return report
+
+        with self._lock:
+            futures = {}
+            for publisher in self._publishers:
+                executor = self._executors.get(publisher)
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="publisher")
+                    self._executors[publisher] = executor
+                futures[publisher] = executor.submit(publisher.publish, payload)
+                self._last_futures[publisher] = futures[publisher]
+        # publishers are timed out at their own deadline, so the ones with the shortest go first
+        deadlines = self._deadlines(futures)
+        timed_out = set()
+        for publisher in sorted(futures, key=deadlines.get):
+            wait([futures[publisher]], timeout=_remaining(deadlines[publisher]))
+            if not futures[publisher].done():
+                timed_out.add(publisher)
+
+        for publisher, future in futures.items():
+            if publisher in timed_out:
+                report.timed_out.append(publisher)
+            else:
+                self._record(report, publisher, future.exception())
+        return report
+
+    async def apost(self, payload: Any) -> DeliveryReport:
+        """
+        Post a payload from a coroutine, awaiting all publishers concurrently
+        """
+        if self.instrumentation is None:
+            return await self._apost(payload)
+        started = time.perf_counter()
+        try:
+            return await self._apost(payload)
+        finally:
+            self.instrumentation.record("Publish", time.perf_counter() - started)
+
+    async def _apost(self, payload: Any) -> DeliveryReport:
+        # asyncio is imported on first use to keep it out of the cold start of sync handlers
+        import asyncio
+
+        report = DeliveryReport()
+        publishers = list(self._publishers)
+        if not self.concurrent:
+            if len(publishers) == 1:
+                # awaited directly, gather would wrap the publish in a task for every payload
+                await publishers[0].apublish(payload)
+                report.delivered.append(publishers[0])
+                return report
+            results = await asyncio.gather(
+                *(publisher.apublish(payload) for publisher in publishers), return_exceptions=True
+            )
+            for publisher, result in zip(publishers, results):
+                if isinstance(result, BaseException):
+                    raise result
+                report.delivered.append(publisher)
+            return report
+
+        tasks = {}
+        for publisher in publishers:
+            lock = self._publish_locks.get(publisher)
+            if lock is None:
+                lock = self._publish_locks[publisher] = asyncio.Lock()
+            tasks[publisher] = asyncio.ensure_future(self._apublish_in_order(publisher, lock, payload))
+            self._pending_tasks.add(tasks[publisher])
+            tasks[publisher].add_done_callback(self._pending_tasks.discard)
+        deadlines = self._deadlines(tasks)
+        timed_out = set()
+        for publisher in sorted(tasks, key=deadlines.get):
+            await asyncio.wait([tasks[publisher]], timeout=_remaining(deadlines[publisher]))
+            if not tasks[publisher].done():
+                timed_out.add(publisher)
+
+        for publisher, task in tasks.items():
+            if publisher in timed_out:
+                report.timed_out.append(publisher)
+            else:
+                self._record(report, publisher, task.exception())
+        return report
+
+    @staticmethod
+    async def _apublish_in_order(publisher: BasePublisher, lock: Any, payload: Any) -> None:
+        # asyncio locks are fair, so payloads reach each publisher in the order they were posted
+        async with lock:
+            await publisher.apublish(payload)
+
+    def _deadlines(self, publishers: Dict[BasePublisher, Any]) -> Dict[BasePublisher, float]:
+        """Monotonic time until which a post waits for each publisher, infinite without a timeout"""
+        now = time.monotonic()
+        deadlines = {}
+        for publisher in publishers:
+            timeout = self._timeouts.get(publisher, self.publish_timeout)
+            deadlines[publisher] = math.inf if timeout is None else now + timeout
+        return deadlines
+
+    def _record(self, report: DeliveryReport, publisher: BasePublisher, error: Optional[BaseException]) -> None:
+        """
+        Record the outcome of a concurrent publish, detaching publishers whose connection is gone
+        """
+        if error is None:
+            report.delivered.append(publisher)
+            return
+        report.failed[publisher] = error
+        if publisher.is_closed_error(error):
+            # an earlier payload may already have detached the publisher
+            if publisher in self._publishers:
+                self.logger.info(f"Detaching publisher with closed connection: {error}")
+                self.detach(publisher)
+                report.detached.append(publisher)
+        else:
+            self.logger.error(f"Failed to publish payload: {error}")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every publisher delivered its payloads, e.g. before the Lambda handler returns.
+        Returns False if `timeout` seconds passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            publishers = list(self._publishers)
+            last_futures = list(self._last_futures.values())
+        _, not_done = wait(last_futures, timeout=timeout)
+        delivered = not not_done
+        for publisher in publishers:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            delivered = publisher.flush(remaining) and delivered
+        return delivered
+
+    async def aflush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until payloads posted with `apost` were published and every publisher delivered its
+        payloads. Returns False if `timeout` seconds passed first.
+        """
+        import asyncio
 
-    def post(self, payload: Any) -> None:
-        for publisher in self._publishers:
-            publisher.publish(payload)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._pending_tasks:
+            _, not_done = await asyncio.wait(list(self._pending_tasks), timeout=timeout)
+            if not_done:
+                return False
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return await asyncio.to_thread(self.flush, remaining)
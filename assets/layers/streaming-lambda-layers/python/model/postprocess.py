@@ -1,192 +1,13 @@
 import re
 import string
-from typing import List, Literal
-
-from model.relevance.bleu import compute_bleu
-from model.relevance.tokenizer import Tokenizer13a
-from utils.text import clean_text_snippet
-
-STOPWORD_SET = {
-    "wouldn't",
-    "both",
-    "about",
-    "me",
-    "its",
-    "out",
-    "hasn",
-    "itself",
-    "been",
-    "ain",
-    "myself",
-    "below",
-    "down",
-    "any",
-    "d",
-    "herself",
-    "up",
-    "whom",
-    "these",
-    "by",
-    "isn't",
-    "very",
-    "am",
-    "ours",
-    "has",
-    "a",
-    "than",
-    "yourself",
-    "not",
-    "i",
-    "his",
-    "if",
-    "couldn't",
-    "too",
-    "should",
-    "doing",
-    "mightn't",
-    "you'll",
-    "my",
-    "those",
-    "hers",
-    "then",
-    "other",
-    "being",
-    "you've",
-    "he",
-    "above",
-    "had",
-    "how",
-    "once",
-    "only",
-    "she",
-    "wouldn",
-    "doesn't",
-    "haven't",
-    "mustn",
-    "same",
-    "hadn't",
-    "our",
-    "more",
-    "shouldn",
-    "there",
-    "when",
-    "hasn't",
-    "just",
-    "wasn",
-    "at",
-    "each",
-    "do",
-    "over",
-    "most",
-    "while",
-    "she's",
-    "and",
-    "ma",
-    "they",
-    "himself",
-    "nor",
-    "the",
-    "further",
-    "having",
-    "off",
-    "you'd",
-    "as",
-    "them",
-    "aren",
-    "it",
-    "such",
-    "all",
-    "who",
-    "this",
-    "their",
-    "her",
-    "with",
-    "will",
-    "couldn",
-    "where",
-    "of",
-    "didn't",
-    "or",
-    "here",
-    "won't",
-    "before",
-    "isn",
-    "that'll",
-    "needn",
-    "have",
-    "did",
-    "into",
-    "we",
-    "yourselves",
-    "in",
-    "few",
-    "after",
-    "so",
-    "s",
-    "t",
-    "ve",
-    "haven",
-    "needn't",
-    "yours",
-    "don",
-    "theirs",
-    "again",
-    "during",
-    "are",
-    "weren",
-    "o",
-    "is",
-    "but",
-    "can",
-    "should've",
-    "were",
-    "from",
-    "didn",
-    "m",
-    "don't",
-    "it's",
-    "re",
-    "until",
-    "because",
-    "under",
-    "between",
-    "through",
-    "ll",
-    "some",
-    "aren't",
-    "y",
-    "won",
-    "was",
-    "you're",
-    "wasn't",
-    "own",
-    "him",
-    "what",
-    "which",
-    "on",
-    "shan't",
-    "that",
-    "be",
-    "against",
-    "mightn",
-    "shan",
-    "you",
-    "no",
-    "doesn",
-    "does",
-    "ourselves",
-    "weren't",
-    "mustn't",
-    "shouldn't",
-    "to",
-    "themselves",
-    "why",
-    "for",
-    "now",
-    "hadn",
-    "an",
-    "your",
-}
+import time
+from collections import Counter, deque
+from itertools import islice
+from typing import Iterable, Iterator, List, Literal, NamedTuple, Optional, Tuple, Union
+
+from model.relevance.context_index import ContextIndex, normalize_context
+from model.relevance.stopwords import STOPWORD_SET
+from utils.text import TextNormalizer
 
 
 def _get_last_word_combination(input_text: str, length: int) -> str:
@@ -260,9 +81,9 @@ def _remove_duplicates(splitted_text: List[str], length: int):
 
 
 # make a list of strings which represent every sequence of word_length adjacent words
-def remove_repetitions(input_text: str):
+def _remove_repetitions_legacy(input_text: str):
     """
-    Remove repeated word combinations
+    Remove repeated word combinations by comparing concatenated word combinations
 
     Parameters
     ----------
@@ -289,6 +110,175 @@ def remove_repetitions(input_text: str):
     return input_text
 
 
+_HASH_MODULUS = (1 << 61) - 1
+_HASH_BASE = 1_000_003
+
+
+def _prefix_hashes(ids: List[int]) -> List[int]:
+    """
+    Polynomial prefix hashes of a sequence of word ids
+
+    Parameters
+    ----------
+    ids : List[int]
+        Word ids, all greater than zero
+
+    Returns
+    -------
+    List[int]
+        Hash of every prefix, starting with the empty one
+    """
+    hashes = [0]
+    for word_id in ids:
+        hashes.append((hashes[-1] * _HASH_BASE + word_id) % _HASH_MODULUS)
+    return hashes
+
+
+def _substring_hash(hashes: List[int], powers: List[int], start: int, end: int) -> int:
+    return (hashes[end] - hashes[start] * powers[end - start]) % _HASH_MODULUS
+
+
+def _has_adjacent_repetition(ids: List[int], hashes: List[int], powers: List[int], length: int) -> bool:
+    """
+    Check whether two adjacent, equal word combinations of a given length exist
+
+    Every such repetition covers exactly one anchor position that is a multiple of `length`, so it
+    is enough to extend the match between each anchor and the position `length` words later.
+
+    Parameters
+    ----------
+    ids : List[int]
+        Word ids
+    hashes : List[int]
+        Prefix hashes of `ids`
+    powers : List[int]
+        Powers of the hash base
+    length : int
+        Length of the combinations
+    """
+
+    def _extension(low: int, high: int, equal) -> int:
+        # largest k in [low, high] with equal(k), given that equal(low) holds and equal is monotone
+        while low < high:
+            middle = (low + high + 1) // 2
+            if equal(middle):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    for anchor in range(0, len(ids) - length, length):
+        if ids[anchor] != ids[anchor + length]:
+            continue
+        forward = _extension(
+            1,
+            min(length, len(ids) - anchor - length),
+            lambda k: _substring_hash(hashes, powers, anchor, anchor + k)
+            == _substring_hash(hashes, powers, anchor + length, anchor + length + k),
+        )
+        backward = _extension(
+            0,
+            min(length - 1, anchor),
+            lambda k: _substring_hash(hashes, powers, anchor - k, anchor)
+            == _substring_hash(hashes, powers, anchor + length - k, anchor + length),
+        )
+        if forward + backward >= length:
+            return True
+    return False
+
+
+def _remove_adjacent_repetitions(ids: List[int], powers: List[int], length: int) -> List[int]:
+    """
+    Remove adjacent, equal word combinations of a given length
+
+    Equivalent to `_remove_duplicates` on the combinations of `length` words: the leftmost repetition
+    is removed first, and since a removal only changes words to its right, the search resumes
+    `length - 1` positions before it instead of at the start.
+
+    Parameters
+    ----------
+    ids : List[int]
+        Word ids
+    powers : List[int]
+        Powers of the hash base
+    length : int
+        Length of the combinations
+
+    Returns
+    -------
+    List[int]
+        Word ids without the repetitions
+    """
+    output = []
+    hashes = [0]
+    position = 0
+    i = 0
+    while True:
+        # the output only ever holds the words needed to compare the combinations at i
+        needed = i + 2 * length
+        while len(output) < needed and position < len(ids):
+            output.append(ids[position])
+            hashes.append((hashes[-1] * _HASH_BASE + ids[position]) % _HASH_MODULUS)
+            position += 1
+        if len(output) < needed:
+            break
+        if (
+            output[i] == output[i + length]
+            and _substring_hash(hashes, powers, i, i + length)
+            == _substring_hash(hashes, powers, i + length, needed)
+            and output[i : i + length] == output[i + length : needed]
+        ):
+            del output[i + length :]
+            del hashes[i + length + 1 :]
+            i = max(0, i - length + 1)
+        else:
+            i += 1
+    output.extend(ids[position:])
+    return output
+
+
+def remove_repetitions(input_text: str, legacy: bool = False):
+    """
+    Remove repeated word combinations
+
+    Adjacent repetitions of 2 words are removed first, then of 3 words and so on, working on word
+    ids and rolling hashes. Gives the same output as the original string based implementation.
+
+    Parameters
+    ----------
+    input_text : str
+        Input text with repetitions
+    legacy : bool, by default False
+        Whether to use the original string based implementation, e.g. for differential testing
+    """
+    if legacy:
+        return _remove_repetitions_legacy(input_text)
+
+    words = re.findall(r"\S+|\n", input_text)
+    if len(words) < 2:
+        return input_text
+
+    vocabulary = {}
+    ids = [vocabulary.setdefault(word, len(vocabulary) + 1) for word in words]
+    powers = [1]
+    for _ in range(len(ids)):
+        powers.append(powers[-1] * _HASH_BASE % _HASH_MODULUS)
+
+    hashes = _prefix_hashes(ids)
+    length = 2
+    while 2 * length <= len(ids):
+        if _has_adjacent_repetition(ids, hashes, powers, length):
+            ids = _remove_adjacent_repetitions(ids, powers, length)
+            if len(ids) == length:
+                # a single combination is left, for which the original implementation returns the input
+                return input_text
+            hashes = _prefix_hashes(ids)
+        length += 1
+
+    words_by_id = [None, *vocabulary]
+    return " ".join(words_by_id[word_id] for word_id in ids).replace("\n ", "\n")
+
+
 def clean_question(question: str) -> str:
     """
     Clean question sent to LLM
@@ -345,6 +335,30 @@ def clean_answer(  # noqa: C901
     # replace incomplete line breaks
     answer = answer.replace("<n>", "")
 
+    return _clean_replaced_answer(
+        answer, has_bulletpoint=has_bulletpoint, remove_last_keywords=remove_last_keywords
+    )
+
+
+def _clean_replaced_answer(answer: str, has_bulletpoint: bool, remove_last_keywords: bool) -> str:
+    """
+    Run the `clean_answer` steps that follow the "<n>" replacement
+
+    Parameters
+    ----------
+    answer : str
+        Answer with incomplete line breaks already removed
+    has_bulletpoint : bool
+        Whether the raw answer started with a bulletpoint that should be kept
+    remove_last_keywords : bool
+        Whether to remove "Keywords:" at the end of the answer
+
+    Returns
+    -------
+    str
+        Cleaned LLM answer
+    """
+
     # check if answer is empty
     if len(answer) <= 1:
         return "[NO ANSWER]"
@@ -381,20 +395,198 @@ def clean_answer(  # noqa: C901
     return remove_repetitions(answer)
 
 
+class IncrementalAnswerCleaner:
+    """
+    Incrementally clean a streamed LLM answer
+
+    State is kept between tokens so that `feed` only processes the newly arrived text. A trailing
+    "<" or "<n" is held back until the next token shows whether it starts a "<n>" line break, so
+    that frames never show half a marker. While the answer is shorter than `2 * window_words` words,
+    `snapshot` equals `clean_answer` of the text received so far without that held back suffix,
+    e.g. after "Done <n" the snapshot is `clean_answer("Done ")`. Past that, the oldest words are
+    frozen: their repetitions are removed once and they are not revisited, so repetitions reaching
+    back further than the trailing window are only removed by the final `clean_answer` call on the
+    full text.
+
+    Parameters
+    ----------
+    window_words : int, by default 32
+        Number of trailing words kept live for repetition detection
+    remove_first_bulletpoint : bool, by default True
+        Whether to add two dots in the start of the snippet
+    remove_last_keywords : bool, by default False
+        Whether to remove "Keywords:" at the end of the answer
+    """
+
+    _WORD_PATTERN = re.compile(r"\S+|\n")
+
+    def __init__(
+        self,
+        window_words: int = 32,
+        remove_first_bulletpoint: bool = True,
+        remove_last_keywords: bool = False,
+    ) -> None:
+        self.window_words = window_words
+        self.remove_first_bulletpoint = remove_first_bulletpoint
+        self.remove_last_keywords = remove_last_keywords
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget all text received so far
+        """
+        self._first_char = None  # first raw character, used for the bulletpoint check
+        self._carry = ""  # trailing "<" or "<n" which may still turn into "<n>"
+        self._live = ""  # replaced text that is still processed on every snapshot
+        self._frozen = ""  # cleaned text of the words that left the window
+        self._head_done = False  # whether the start of the answer has been frozen
+        self._cut = False  # whether "Human:" was found
+
+    @property
+    def _has_bulletpoint(self) -> bool:
+        return not self.remove_first_bulletpoint and self._first_char == "-"
+
+    def feed(self, token: str) -> None:
+        """
+        Add a new token to the answer
+
+        Parameters
+        ----------
+        token : str
+            Token produced by the LLM
+        """
+        if self._cut or not token:
+            return
+        if self._first_char is None:
+            self._first_char = token[0]
+
+        # replace incomplete line breaks, holding back a possible "<n>" prefix
+        text = self._carry + token
+        hold = 2 if text.endswith("<n") else 1 if text.endswith("<") else 0
+        self._carry = text[len(text) - hold :]
+        text = text[: len(text) - hold].replace("<n>", "")
+        if not text:
+            return
+
+        old_length = len(self._live)
+        self._live += text
+
+        # everything after "Human:" is dropped, so stop accumulating once it shows up
+        if self._head_done:
+            start = max(0, old_length - 5)
+        elif len(self._live) < 8:
+            start = None
+        else:
+            # "Answer:" is stripped before the split, which may break a "Human:" overlapping it
+            base = 8 if not self._has_bulletpoint and self._live[:7] == "Answer:" else 0
+            start = base if old_length < 8 else max(base, old_length - 5)
+        if start is not None:
+            index = self._live.find("Human:", start)
+            if index >= 0:
+                self._live = self._live[: index + 6]
+                self._cut = True
+                return
+
+        if len(self._WORD_PATTERN.findall(self._live)) > 2 * self.window_words:
+            self._freeze()
+
+    def _freeze(self) -> None:
+        """
+        Move all but the last `window_words` words out of the live text
+        """
+        text = self._live
+        if not self._head_done:
+            if self._has_bulletpoint:
+                text = "- " + text
+            if text[:7] == "Answer:":
+                text = text[8:]
+            text = text[0].capitalize() + text[1:]
+            self._head_done = True
+
+        matches = list(self._WORD_PATTERN.finditer(text))
+        n_frozen = len(matches) - self.window_words
+        if n_frozen <= 0:
+            self._live = text
+            return
+        piece = remove_repetitions(" ".join(match.group() for match in matches[:n_frozen]))
+        self._frozen = self._join(self._frozen, piece)
+        self._live = text[matches[n_frozen - 1].end() :]
+
+    @staticmethod
+    def _join(head: str, tail: str) -> str:
+        # equivalent to joining the words of both parts with spaces and replacing "\n " by "\n"
+        if not head:
+            return tail
+        if not tail:
+            return head
+        return head + ("" if head[-1] == "\n" else " ") + tail
+
+    def snapshot(self) -> str:
+        """
+        Clean answer for the text received so far
+
+        Returns
+        -------
+        str
+            Cleaned LLM answer
+        """
+        if not self._head_done:
+            return _clean_replaced_answer(
+                self._live,
+                has_bulletpoint=self._has_bulletpoint,
+                remove_last_keywords=self.remove_last_keywords,
+            )
+
+        answer = self._live
+        if self._cut:
+            answer = answer[:-6]
+        else:
+            while answer and answer[-1] == " ":
+                answer = answer[:-1]
+            while answer and answer[-1] == "\n":
+                answer = answer[:-1]
+            if answer[-8:] == "Context:":
+                answer = answer[:-8]
+
+        if self.remove_last_keywords:
+            words = answer.split()
+            if words and words[-1] == "Keywords:":
+                answer = answer[:-10]
+
+        if answer[-1:] not in ["!", "?", "."]:
+            answer += "."
+
+        tail = remove_repetitions(" ".join(self._WORD_PATTERN.findall(answer)))
+        return self._join(self._frozen, tail)
+
+
+# Version 1 is the original scoring. Version 2 analyzes texts with TextAnalyzer, which drops stopwords
+# per token (version 1 compared whole strings to the stopwords for token intersection) and matches
+# whole tokens rather than substrings of the context for word relevance.
+SCORING_VERSIONS = (1, 2)
+DEFAULT_SCORING_VERSION = 1
+
+
+def _check_scoring_version(scoring_version: int) -> None:
+    if scoring_version not in SCORING_VERSIONS:
+        raise ValueError(f"Unknown scoring version {scoring_version}, expected one of {SCORING_VERSIONS}")
+
+
 def check_relevance(
-    context: str,
+    context: Union[str, ContextIndex],
     question: str,
     answer: str,
     length_cutoff: int = 3,
     verbose: bool = False,
+    scoring_version: int = DEFAULT_SCORING_VERSION,
 ) -> List[float]:
     """
     Check relevance of the context for answer and question
 
     Parameters
     ----------
-    context : str
-        Context provided for RAG
+    context : Union[str, ContextIndex]
+        Context provided for RAG, or its prebuilt index to check many answers against the same context
     question : str
         User question
     answer : str
@@ -403,6 +595,8 @@ def check_relevance(
         If number of terms in the question or answer is smaller than length_cutoff, return score of 1.0
     verbose : bool
         Whether to print intermediate steps details
+    scoring_version : int, optional, by default DEFAULT_SCORING_VERSION
+        1 for the original scoring, 2 to drop stopwords per token and match whole tokens
 
     Returns
     -------
@@ -410,10 +604,18 @@ def check_relevance(
         Coverage scores for question and answer between 0 and 1
     """
 
+    _check_scoring_version(scoring_version)
+    if scoring_version == 2:
+        return _check_analyzed_relevance(context, question, answer, length_cutoff, verbose)
+
     # remove punctuation and lowercase
     question = re.sub(r"[^\w\s]", "", question).lower()
-    context = re.sub(r"[^\w\s]", "", context).lower()
     answer = re.sub(r"[^\w\s]", "", answer).lower()
+    if isinstance(context, ContextIndex):
+        contains = context.contains
+    else:
+        context = re.sub(r"[^\w\s]", "", context).lower()
+        contains = context.__contains__
 
     # split question
     question = re.compile("\\w+").findall(question)
@@ -425,13 +627,13 @@ def check_relevance(
 
     # calculate question coverage
     if len(question) >= length_cutoff:
-        coverage_q = sum([term in context for term in question]) / len(question)
+        coverage_q = sum([contains(term) for term in question]) / len(question)
     else:
         coverage_q = 1.0
 
     # calculate answer coverage
     if len(answer) >= length_cutoff:
-        coverage_a = sum([term in context for term in answer]) / len(answer)
+        coverage_a = sum([contains(term) for term in answer]) / len(answer)
     else:
         coverage_a = 1.0
 
@@ -446,23 +648,54 @@ def check_relevance(
     return [coverage_q, coverage_a]
 
 
+def _check_analyzed_relevance(
+    context: Union[str, ContextIndex], question: str, answer: str, length_cutoff: int, verbose: bool
+) -> List[float]:
+    """
+    Scoring version 2 of `check_relevance`, on token ids without stopwords
+    """
+    from model.relevance.analysis import Vocabulary
+
+    if isinstance(context, ContextIndex):
+        vocabulary = context.vocabulary
+        context_ids = context.analyzed_id_set
+    else:
+        # token ids only need to be consistent within this call
+        vocabulary = Vocabulary()
+        context_ids = vocabulary.analyze_set(context)
+
+    coverages = []
+    for text in (question, answer):
+        ids = vocabulary.analyze_set(text)
+        coverages.append(len(ids & context_ids) / len(ids) if len(ids) >= length_cutoff else 1.0)
+
+    if verbose:
+        print(f"Question: {vocabulary.tokens(vocabulary.analyze(question))}")
+        print(f"Answer: {vocabulary.tokens(vocabulary.analyze(answer))}")
+        print(f"Coverage: Q = {coverages[0]}, A = {coverages[1]}")
+    return coverages
+
+
 def check_token_intersection(
-    context: str,
+    context: Union[str, ContextIndex],
     answer: str,
     length_cutoff: int = 3,
+    scoring_version: int = DEFAULT_SCORING_VERSION,
 ) -> float:
     """
     Calculates relevance score using token intersection metrics
 
     Parameters
     ----------
-    context : str
-        Context provided by the retriever
+    context : Union[str, ContextIndex]
+        Context provided by the retriever, or its prebuilt index to check many answers against the same context
     answer : str
         Answer from the LLM to be checked
     length_cutoff : int, optional, by default 3
         Returns 1.0 if the number of tokens in the answer is below length_cutoff
         Returns 0.0 if the number of tokens in the context is below length_cutoff
+    scoring_version : int, optional, by default DEFAULT_SCORING_VERSION
+        1 for the original scoring, 2 to drop stopwords per token before counting n-grams
 
     Returns
     -------
@@ -470,31 +703,39 @@ def check_token_intersection(
         Relevance score between 0 (likely hallucinated) and 1 (likely based on the context)
     """
 
-    context = re.sub(r"[^\w\s]", "", context).lower()
-    answer = re.sub(r"[^\w\s]", "", answer).lower()
+    _check_scoring_version(scoring_version)
+    index = context if isinstance(context, ContextIndex) else ContextIndex(context)
+    if scoring_version == 2:
+        answer_ids = index.vocabulary.analyze(answer)
+        if len(index.analyzed_ids) < length_cutoff:
+            return 0.0
+        if len(answer_ids) < length_cutoff:
+            return 1.0
+        precisions = index.analyzed_ngram_precisions(answer_ids)
+        return sum(precisions) / len(precisions)
 
-    if len(context.split()) < length_cutoff:
+    answer = normalize_context(answer)
+
+    if index.word_count < length_cutoff:
         return 0.0
 
     if len(answer.split()) < length_cutoff:
         return 1.0
 
-    context = [[c] for c in [context]]
-    answer = [answer]
-
-    tokenizer = Tokenizer13a()
-    context = [[tokenizer(c) for c in con if c not in STOPWORD_SET] for con in context]
-    answer = [tokenizer(a) for a in answer if a not in STOPWORD_SET]
+    # relevance scoring is imported on first use to keep it out of the streaming cold start
+    from model.relevance.tokenizer import TOKENIZER_13A
 
-    scores = compute_bleu(context, answer)  # returns tuple: BLEU, n-gram precisions, geometric mean of n-gram
-    return sum(scores[1]) / len(scores[1])  # average of n-gram precisions as relevance score
+    # the n-gram precisions of compute_bleu, with the context n-grams counted once by the index
+    precisions = index.ngram_precisions(TOKENIZER_13A(answer))
+    return sum(precisions) / len(precisions)  # average of n-gram precisions as relevance score
 
 
 def calculate_relevance_score(
     answer: str,
-    context: str,
+    context: Union[str, ContextIndex],
     question: str = None,
     method: Literal[None, "WORLD_RELEVANCE", "TOKEN_INTERSECTION"] = None,
+    scoring_version: int = DEFAULT_SCORING_VERSION,
 ) -> float:
     """
     Calculates relevance score
@@ -503,12 +744,14 @@ def calculate_relevance_score(
     ----------
     answer : str
         LLM answer
-    context : str
-        Retrieved context
+    context : Union[str, ContextIndex]
+        Retrieved context, or its prebuilt index
     question : str, optional
         User question, by default None
     method : str, optional
         Hallucination detection method, one of [None, "WORLD_RELEVANCE", "TOKEN_INTERSECTION"], by default None
+    scoring_version : int, optional, by default DEFAULT_SCORING_VERSION
+        Scoring version of the method, see `SCORING_VERSIONS`
 
     Returns
     -------
@@ -516,12 +759,101 @@ def calculate_relevance_score(
         Hallucination score between 0.0 (likely hallucinated) and 1.0 (likely correct)
     """
     if method == "WORD_RELEVANCE":
-        return min(check_relevance(answer=answer, context=context, question=question, length_cutoff=3))
+        return min(
+            check_relevance(
+                answer=answer, context=context, question=question, length_cutoff=3, scoring_version=scoring_version
+            )
+        )
     if method == "TOKEN_INTERSECTION":
-        return check_token_intersection(answer=answer, context=context, length_cutoff=3)
+        return check_token_intersection(
+            answer=answer, context=context, length_cutoff=3, scoring_version=scoring_version
+        )
     return 1.0
 
 
+def calculate_relevance_scores(
+    triples: Iterable[Tuple[str, str, Optional[str]]],
+    method: Literal[None, "WORD_RELEVANCE", "TOKEN_INTERSECTION"] = None,
+    processes: Optional[int] = None,
+    chunk_size: int = 256,
+    scoring_version: int = DEFAULT_SCORING_VERSION,
+) -> Iterator[float]:
+    """
+    Calculates relevance scores for a batch of (answer, context, question) triples
+
+    Triples are read and scored in chunks, and scores are yielded in input order, so at most a few
+    chunks are held in memory whatever the size of the input. Within a chunk, each distinct context
+    is indexed once and shared by all answers scored against it.
+
+    Parameters
+    ----------
+    triples : Iterable[Tuple[str, str, Optional[str]]]
+        (answer, context, question) triples, e.g. a generator reading an evaluation dataset
+    method : str, optional
+        Hallucination detection method, one of [None, "WORD_RELEVANCE", "TOKEN_INTERSECTION"], by default None
+    processes : int, optional
+        Number of worker processes to score chunks in parallel, by default None to score in this process
+    chunk_size : int, optional
+        Number of triples scored per chunk, by default 256
+    scoring_version : int, optional
+        Scoring version of the method, see `SCORING_VERSIONS`
+
+    Returns
+    -------
+    Iterator[float]
+        Hallucination scores between 0.0 (likely hallucinated) and 1.0 (likely correct), in input order
+    """
+    _check_scoring_version(scoring_version)
+    triples = iter(triples)
+    chunks = iter(lambda: list(islice(triples, chunk_size)), [])
+    if not processes:
+        for chunk in chunks:
+            yield from _score_chunk(chunk, method, scoring_version)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # keep every worker busy with one chunk queued behind it, without reading ahead any further
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_score_chunk, chunk, method, scoring_version))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _score_chunk(
+    chunk: List[Tuple[str, str, Optional[str]]], method: Optional[str], scoring_version: int
+) -> List[float]:
+    if method is None:
+        return [1.0] * len(chunk)
+    contexts = Counter(context for _, context, _ in chunk)
+    indexes = {}
+    scores = []
+    for answer, context, question in chunk:
+        # for word relevance, indexing only pays off when the context is scored many times
+        if method == "TOKEN_INTERSECTION" or contexts[context] >= 16:
+            if context not in indexes:
+                indexes[context] = ContextIndex(context)
+            context = indexes[context]
+        scores.append(
+            calculate_relevance_score(
+                answer, context, question=question, method=method, scoring_version=scoring_version
+            )
+        )
+    return scores
+
+
+_SENTENCE_NORMALIZER = TextNormalizer(
+    add_dots_on_start=False,
+    add_dots_on_end=False,
+    remove_consecutive_spaces=False,
+    remove_only_excluded_leading_chars=False,
+)
+
+
 def split_into_sentences(text: str) -> List[str]:
     """
     Split text into a list of non-empty sentences
@@ -538,18 +870,120 @@ def split_into_sentences(text: str) -> List[str]:
     """
 
     try:
-        sentences = re.split(r"[.!?]\s*", text)
-        sentences = [
-            clean_text_snippet(
-                sentence,
-                add_dots_on_start=False,
-                add_dots_on_end=False,
-                remove_consecutive_spaces=False,
-                remove_only_excluded_leading_chars=False,
-            ).strip()
-            for sentence in sentences
-        ]
-        return [sentence for sentence in sentences if len(sentence) > 1]
+        sentences = _SENTENCE_NORMALIZER.clean_batch(re.split(r"[.!?]\s*", text))
+        return [sentence for sentence in (s.strip() for s in sentences) if len(sentence) > 1]
 
     except Exception:
         return [text]
+
+
+def _clean_sentence(sentence: str) -> str:
+    return _SENTENCE_NORMALIZER(sentence).strip()
+
+
+class SentenceScore(NamedTuple):
+    index: int
+    sentence: str
+    score: float
+
+
+class StreamingRelevanceScorer:
+    """
+    Score each sentence of a streamed answer against the retrieved context as soon as it completes
+
+    Sentences are delimited like `split_into_sentences`: once all tokens are fed and `finish` is
+    called, the scored sentences are the ones `split_into_sentences` returns for the full text.
+    Only tokens containing ".", "!" or "?" cost more than appending to a buffer.
+
+    When `max_overhead_ms` is set, sentences are no longer scored while the average time spent in
+    the scorer per token fed exceeds it. They are counted in `skipped_sentences`.
+
+    Parameters
+    ----------
+    context : Union[str, ContextIndex]
+        Retrieved context, or its prebuilt index when the same context is scored repeatedly
+    question : str, optional
+        User question, required by "WORD_RELEVANCE", by default None
+    method : str, optional
+        Hallucination detection method, "TOKEN_INTERSECTION" or "WORD_RELEVANCE", by default "TOKEN_INTERSECTION"
+    max_overhead_ms : float, optional
+        Budget for the average time in milliseconds added per token, by default None
+    scoring_version : int, optional
+        Scoring version of the method, see `SCORING_VERSIONS`
+    """
+
+    _SENTENCE_END_PATTERN = re.compile(r"[.!?]")
+    _LEADING_SPACE_PATTERN = re.compile(r"^\s+")
+
+    def __init__(
+        self,
+        context: Union[str, ContextIndex],
+        question: str = None,
+        method: Literal["WORD_RELEVANCE", "TOKEN_INTERSECTION"] = "TOKEN_INTERSECTION",
+        max_overhead_ms: Optional[float] = None,
+        scoring_version: int = DEFAULT_SCORING_VERSION,
+    ):
+        _check_scoring_version(scoring_version)
+        self.scoring_version = scoring_version
+        self.index = context if isinstance(context, ContextIndex) else ContextIndex(context)
+        self.question = question
+        self.method = method
+        self.max_overhead = None if max_overhead_ms is None else max_overhead_ms / 1000
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the answer fed so far, keeping the context index"""
+        self.scores: List[SentenceScore] = []
+        self.tokens = 0
+        self.elapsed = 0.0
+        self.skipped_sentences = 0
+        self._buffer = ""
+        self._sentences = 0
+
+    @property
+    def overhead_per_token(self) -> float:
+        """Average time in seconds spent in the scorer per token fed"""
+        return self.elapsed / self.tokens if self.tokens else 0.0
+
+    def feed(self, token: str) -> List[SentenceScore]:
+        """
+        Add a token, returning the scores of the sentences it completed
+        """
+        start = time.perf_counter()
+        self.tokens += 1
+        self._buffer += token
+        completed = []
+        if self._SENTENCE_END_PATTERN.search(token):
+            *sentences, self._buffer = self._SENTENCE_END_PATTERN.split(self._buffer)
+            completed = self._score(sentences)
+        self.elapsed += time.perf_counter() - start
+        return completed
+
+    def finish(self) -> List[SentenceScore]:
+        """
+        Score the last sentence, which does not need to end with a punctuation mark
+        """
+        start = time.perf_counter()
+        completed = self._score([self._buffer])
+        self._buffer = ""
+        self.elapsed += time.perf_counter() - start
+        return completed
+
+    def _score(self, sentences: List[str]) -> List[SentenceScore]:
+        completed = []
+        for sentence in sentences:
+            # split_into_sentences drops the whitespace following the punctuation mark
+            sentence = _clean_sentence(self._LEADING_SPACE_PATTERN.sub("", sentence))
+            if len(sentence) <= 1:
+                continue
+            index = self._sentences
+            self._sentences += 1
+            if self.max_overhead is not None and self.overhead_per_token > self.max_overhead:
+                self.skipped_sentences += 1
+                continue
+            score = calculate_relevance_score(
+                sentence, self.index, question=self.question, method=self.method, scoring_version=self.scoring_version
+            )
+            completed.append(SentenceScore(index, sentence, score))
+        self.scores.extend(completed)
+        return completed
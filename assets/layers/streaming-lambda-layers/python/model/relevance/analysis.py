@@ -0,0 +1,154 @@
+import re
+import string
+import threading
+from array import array
+from typing import Dict, FrozenSet, List, Optional
+
+from model.relevance.stopwords import STOPWORD_SET
+
+_NON_WORD_PATTERN = re.compile(r"[^\w]")
+
+
+class TextAnalyzer:
+    """
+    Shared analysis stage of the relevance checks: lowercase, strip punctuation and drop stopwords
+    per token
+
+    Tokens are the whitespace separated words of the text, lowercased and without punctuation, like
+    the terms of `check_relevance`. A word is a stopword when it is in the stopword set once its
+    leading and trailing punctuation is removed, so "Don't," is dropped. Each distinct word is only
+    analyzed once, after which it costs a dictionary lookup; once `max_words` distinct words were
+    seen, the memo of words is cleared. Token ids are assigned by a `Vocabulary`, so the analyzer
+    holds no more than `max_words` words however many texts it analyzes.
+
+    Parameters
+    ----------
+    stopwords : FrozenSet[str], optional
+        Lowercase words to drop, by default STOPWORD_SET
+    max_words : int, optional
+        Number of distinct words memoized, by default 2**18
+    """
+
+    def __init__(self, stopwords: Optional[FrozenSet[str]] = None, max_words: int = 2**18):
+        self.stopwords = frozenset(STOPWORD_SET if stopwords is None else stopwords)
+        self.max_words = max_words
+        self._word_tokens: Dict[str, Optional[str]] = {}
+
+    def token(self, word: str) -> Optional[str]:
+        """
+        Return the token of a whitespace separated word, None for stopwords
+
+        Parameters
+        ----------
+        word : str
+            Word of a text
+
+        Returns
+        -------
+        Optional[str]
+            Lowercase token without punctuation, or None
+        """
+        try:
+            return self._word_tokens[word]
+        except KeyError:
+            pass
+        lowered = word.lower()
+        if lowered.strip(string.punctuation) in self.stopwords:
+            token = None
+        else:
+            token = _NON_WORD_PATTERN.sub("", lowered)
+            if not token or token in self.stopwords:
+                token = None
+        if len(self._word_tokens) >= self.max_words:
+            self._word_tokens = {}
+        self._word_tokens[word] = token
+        return token
+
+
+# shared by the relevance checks, so that words are analyzed once across contexts and answers
+TEXT_ANALYZER = TextAnalyzer()
+
+
+class Vocabulary:
+    """
+    Token ids of one scoring scope, a context and the texts scored against it, returned as compact
+    arrays
+
+    Ids are only comparable between texts analyzed by the same vocabulary. A `ContextIndex` owns the
+    vocabulary of its context, so the ids live as long as the index and are dropped with it.
+
+    Parameters
+    ----------
+    analyzer : TextAnalyzer, optional
+        Analysis of the words, by default TEXT_ANALYZER
+    """
+
+    _STOPWORD = -1
+
+    def __init__(self, analyzer: Optional[TextAnalyzer] = None):
+        self.analyzer = TEXT_ANALYZER if analyzer is None else analyzer
+        self._word_ids: Dict[str, int] = {}
+        self._token_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of distinct tokens, token ids are smaller than this"""
+        return len(self._token_ids)
+
+    def analyze(self, text: str) -> array:
+        """
+        Return the ids of the tokens of `text` that are not stopwords, in order
+
+        Parameters
+        ----------
+        text : str
+            Text to analyze
+
+        Returns
+        -------
+        array
+            Token ids, an `array("l")`
+        """
+        words = text.split()
+        ids = list(map(self._word_ids.get, words))
+        if None in ids:
+            ids = [self._word_id(word) if token_id is None else token_id for word, token_id in zip(words, ids)]
+        return array("l", [token_id for token_id in ids if token_id != self._STOPWORD])
+
+    def analyze_set(self, text: str) -> FrozenSet[int]:
+        """
+        Return the distinct ids of the tokens of `text` that are not stopwords
+
+        Only the distinct words of `text` are looked up, which is cheaper than `analyze` for long texts.
+
+        Parameters
+        ----------
+        text : str
+            Text to analyze
+
+        Returns
+        -------
+        FrozenSet[int]
+            Distinct token ids
+        """
+        ids = set()
+        for word in set(text.split()):
+            token_id = self._word_ids.get(word)
+            ids.add(self._word_id(word) if token_id is None else token_id)
+        ids.discard(self._STOPWORD)
+        return frozenset(ids)
+
+    def _word_id(self, word: str) -> int:
+        token = self.analyzer.token(word)
+        if token is None:
+            token_id = self._STOPWORD
+        else:
+            with self._lock:
+                token_id = self._token_ids.setdefault(token, len(self._token_ids))
+        self._word_ids[word] = token_id
+        return token_id
+
+    def tokens(self, ids: array) -> List[str]:
+        """Return the tokens of an array of token ids, for inspection"""
+        names = {token_id: token for token, token_id in self._token_ids.items()}
+        return [names[token_id] for token_id in ids]
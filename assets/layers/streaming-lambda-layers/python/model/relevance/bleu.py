@@ -23,7 +23,7 @@ evaluation metrics for machine translation. COLING 2004.
 
 import collections
 import math
-from typing import Tuple
+from typing import List, Literal, Tuple
 
 
 def _get_ngrams(segment: str, max_order: int) -> collections.Counter:
@@ -53,7 +53,11 @@ def _get_ngrams(segment: str, max_order: int) -> collections.Counter:
 
 
 def compute_bleu(
-    reference_corpus: list, translation_corpus: list, max_order: int = 4, smooth: bool = False
+    reference_corpus: list,
+    translation_corpus: list,
+    max_order: int = 4,
+    smooth: bool = False,
+    engine: Literal["python", "numpy"] = "python",
 ) -> Tuple[float]:
     """
     Computes BLEU score of translated segments against one or more references.
@@ -68,6 +72,9 @@ def compute_bleu(
         Maximum n-gram order to use when computing BLEU score
     smooth : bool, optional
         Whether or not to apply Lin et al. 2004 smoothing
+    engine : str, optional
+        "python" counts n-grams with Counters of token tuples, "numpy" with integer n-gram ids in
+        NumPy arrays, which is faster for large corpora. Both return the same result.
 
     Returns
     -------
@@ -78,6 +85,24 @@ def compute_bleu(
     float
         Geometric mean of n-gram
     """
+    if engine == "numpy":
+        # NumPy is only imported by the evaluation code paths that use it
+        from model.relevance.bleu_numpy import count_ngram_matches
+
+        counts = count_ngram_matches(reference_corpus, translation_corpus, max_order)
+    elif engine == "python":
+        counts = _count_ngram_matches(reference_corpus, translation_corpus, max_order)
+    else:
+        raise ValueError(f"Unknown BLEU engine: {engine}")
+    return _bleu_from_counts(*counts, max_order=max_order, smooth=smooth)
+
+
+def _count_ngram_matches(
+    reference_corpus: list, translation_corpus: list, max_order: int
+) -> Tuple[List[int], List[int], int, int]:
+    """
+    Count clipped n-gram matches and possible matches per order, and the reference and translation lengths
+    """
     matches_by_order = [0] * max_order
     possible_matches_by_order = [0] * max_order
     reference_length = 0
@@ -97,7 +122,17 @@ def compute_bleu(
             possible_matches = len(translation) - order + 1
             if possible_matches > 0:
                 possible_matches_by_order[order - 1] += possible_matches
+    return matches_by_order, possible_matches_by_order, reference_length, translation_length
 
+
+def _bleu_from_counts(
+    matches_by_order: List[int],
+    possible_matches_by_order: List[int],
+    reference_length: int,
+    translation_length: int,
+    max_order: int,
+    smooth: bool,
+) -> Tuple[float]:
     precisions = [0] * max_order
     for i in range(0, max_order):
         if smooth:
@@ -0,0 +1,121 @@
+"""NumPy engine for the n-gram counting of `compute_bleu`.
+
+Tokens are mapped to integer ids and every n-gram of the corpus gets an integer id, computed one
+order at a time by ranking the pairs (id of the (n-1)-gram, id of the next token) with `np.unique`.
+The ids are exact, there are no hash collisions, so the clipped counts and the BLEU score are the
+same as with the Counter based engine in `model.relevance.bleu`.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+def count_ngram_matches(
+    reference_corpus: list, translation_corpus: list, max_order: int
+) -> Tuple[List[int], List[int], int, int]:
+    """
+    Count clipped n-gram matches and possible matches per order, and the reference and translation lengths
+
+    Parameters
+    ----------
+    reference_corpus : list of lists of references for each translation
+        Each reference should be tokenized into a list of tokens
+    translation_corpus : list of translations to score
+        Each translation should be tokenized into a list of tokens
+    max_order : int
+        Maximum n-gram order
+
+    Returns
+    -------
+    List[int]
+        Clipped n-gram matches per order
+    List[int]
+        Possible n-gram matches per order
+    int
+        Total length of the shortest reference of each translation
+    int
+        Total length of the translations
+    """
+    # documents are the translations followed by all references, each tagged with its segment
+    translations = []
+    references = []
+    reference_segments = []
+    reference_length = 0
+    for segment, (segment_references, translation) in enumerate(zip(reference_corpus, translation_corpus)):
+        reference_length += min(len(r) for r in segment_references)
+        translations.append(translation)
+        references.extend(segment_references)
+        reference_segments.extend([segment] * len(segment_references))
+
+    documents = translations + references
+    n_translations = len(translations)
+    document_segments = np.concatenate(
+        [np.arange(n_translations, dtype=np.int64), np.asarray(reference_segments, dtype=np.int64)]
+    )
+    lengths = np.fromiter((len(document) for document in documents), dtype=np.int64, count=len(documents))
+    translation_lengths = lengths[:n_translations]
+    translation_length = int(translation_lengths.sum())
+
+    vocabulary = {}
+    token_ids = np.fromiter(
+        (vocabulary.setdefault(token, len(vocabulary)) for document in documents for token in document),
+        dtype=np.int64,
+        count=int(lengths.sum()),
+    )
+    base = len(vocabulary) + 1
+
+    # document and number of tokens left in the document, for every token position
+    token_documents = np.repeat(np.arange(len(documents), dtype=np.int64), lengths)
+    starts = np.cumsum(lengths) - lengths
+    remaining = lengths[token_documents] - (np.arange(len(token_ids), dtype=np.int64) - starts[token_documents])
+
+    matches_by_order = [0] * max_order
+    possible_matches_by_order = [0] * max_order
+    positions = np.arange(len(token_ids), dtype=np.int64)
+    ngram_ids = token_ids
+    n_ngrams = base
+    for order in range(1, max_order + 1):
+        possible_matches_by_order[order - 1] = int(np.maximum(translation_lengths - order + 1, 0).sum())
+        if order > 1:
+            # extend the (n-1)-grams that still have a token left in their document
+            keep = remaining[positions] >= order
+            positions = positions[keep]
+            pairs = ngram_ids[keep] * base + token_ids[positions + order - 1]
+            unique_pairs, ngram_ids = np.unique(pairs, return_inverse=True)
+            ngram_ids = ngram_ids.reshape(-1)
+            n_ngrams = len(unique_pairs)
+        matches_by_order[order - 1] = _clipped_matches(
+            token_documents[positions], ngram_ids, document_segments, n_translations, n_ngrams
+        )
+    return matches_by_order, possible_matches_by_order, reference_length, translation_length
+
+
+def _clipped_matches(
+    documents: np.ndarray, ngram_ids: np.ndarray, document_segments: np.ndarray, n_translations: int, n_ngrams: int
+) -> int:
+    """
+    Sum over segments and n-grams of min(count in the translation, max count in any reference)
+    """
+    is_translation = documents < n_translations
+    translation_keys, translation_counts = np.unique(
+        documents[is_translation] * n_ngrams + ngram_ids[is_translation], return_counts=True
+    )
+    reference_keys, reference_counts = np.unique(
+        documents[~is_translation] * n_ngrams + ngram_ids[~is_translation], return_counts=True
+    )
+    if len(translation_keys) == 0 or len(reference_keys) == 0:
+        return 0
+
+    # merge the references of a segment, keeping the largest count of each n-gram
+    segment_keys = document_segments[reference_keys // n_ngrams] * n_ngrams + reference_keys % n_ngrams
+    order = np.argsort(segment_keys, kind="stable")
+    segment_keys = segment_keys[order]
+    merged_keys, first = np.unique(segment_keys, return_index=True)
+    merged_counts = np.maximum.reduceat(reference_counts[order], first)
+
+    # translation documents are numbered like their segments
+    found = np.searchsorted(merged_keys, translation_keys)
+    found = np.minimum(found, len(merged_keys) - 1)
+    clipped = np.where(merged_keys[found] == translation_keys, merged_counts[found], 0)
+    return int(np.minimum(translation_counts, clipped).sum())
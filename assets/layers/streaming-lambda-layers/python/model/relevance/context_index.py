@@ -0,0 +1,200 @@
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, FrozenSet, Hashable, List, Sequence
+
+if TYPE_CHECKING:
+    from model.relevance.analysis import Vocabulary
+
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+
+def normalize_context(text: str) -> str:
+    """
+    Remove punctuation and lowercase, the normalization applied by the relevance checks
+    """
+    return _PUNCTUATION_PATTERN.sub("", text).lower()
+
+
+class ContextIndex:
+    """
+    Index of a retrieved context, built once and reused to score many answers against that context
+
+    The term index answers `term in context` for `check_relevance`, and the n-gram counts replace
+    the context side of the BLEU computation in `check_token_intersection`. Scoring version 2 uses
+    the token ids of the context without stopwords instead. Each part is built on first use, after
+    which scoring an answer costs time proportional to the answer only.
+
+    Parameters
+    ----------
+    context : str
+        Context provided by the retriever
+    max_order : int, optional, by default 4
+        Maximum n-gram order counted for token intersection
+    """
+
+    def __init__(self, context: str, max_order: int = 4):
+        self._context = context
+        self.text = normalize_context(context)
+        self.max_order = max_order
+        self.word_count = len(self.text.split())
+        self._terms = None
+        self._suffixes = None
+        self._tokens = None
+        self._ngram_counts = None
+        self._vocabulary = None
+        self._analyzed_ids = None
+        self._analyzed_id_set = None
+        self._analyzed_ngram_counts = None
+
+    @property
+    def terms(self) -> FrozenSet[str]:
+        """Distinct whitespace separated words of the normalized context"""
+        if self._terms is None:
+            self._terms = frozenset(self.text.split())
+        return self._terms
+
+    def contains(self, term: str) -> bool:
+        """
+        Return whether `term` occurs anywhere in the normalized context, same as `term in index.text`
+
+        Terms are matched as substrings, like the original scan. A term without whitespace can only
+        occur inside a single context word, where it is the prefix of one of the word's suffixes, so
+        the sorted suffixes of the distinct context words are searched instead of the whole context.
+        """
+        if not term or any(c.isspace() for c in term):
+            return term in self.text
+        if term in self.terms:
+            return True
+        if self._suffixes is None:
+            self._suffixes = sorted({word[start:] for word in self.terms for start in range(len(word))})
+        position = bisect_left(self._suffixes, term)
+        return position < len(self._suffixes) and self._suffixes[position].startswith(term)
+
+    @property
+    def tokens(self) -> List[str]:
+        """13a tokens of the normalized context"""
+        if self._tokens is None:
+            # the tokenizer is imported on first use to keep it out of the streaming cold start
+            from model.relevance.tokenizer import TOKENIZER_13A
+
+            self._tokens = TOKENIZER_13A(self.text)
+        return self._tokens
+
+    def ngram_precisions(self, translation: Sequence[str]) -> List[float]:
+        """
+        Clipped n-gram precisions of a tokenized translation against the context tokens, the same as
+        the precisions returned by `compute_bleu([[index.tokens]], [translation])`
+
+        Parameters
+        ----------
+        translation : Sequence[str]
+            Tokenized answer
+
+        Returns
+        -------
+        List[float]
+            N-gram precisions for orders 1 to max_order
+        """
+        if self._ngram_counts is None:
+            self._ngram_counts = NgramCounts(self.tokens, self.max_order)
+        return self._ngram_counts.precisions(translation)
+
+    @property
+    def vocabulary(self) -> "Vocabulary":
+        """Vocabulary of the context, analyze the answers scored against the index with it"""
+        if self._vocabulary is None:
+            # imported on first use, only scoring version 2 analyzes the context
+            from model.relevance.analysis import Vocabulary
+
+            self._vocabulary = Vocabulary()
+        return self._vocabulary
+
+    @property
+    def analyzed_ids(self) -> array:
+        """Token ids of the context without stopwords, see `Vocabulary.analyze`"""
+        if self._analyzed_ids is None:
+            self._analyzed_ids = self.vocabulary.analyze(self._context)
+        return self._analyzed_ids
+
+    @property
+    def analyzed_id_set(self) -> FrozenSet[int]:
+        """Distinct token ids of the context without stopwords"""
+        if self._analyzed_id_set is None:
+            self._analyzed_id_set = frozenset(self.analyzed_ids)
+        return self._analyzed_id_set
+
+    def analyzed_ngram_precisions(self, answer_ids: Sequence[int]) -> List[float]:
+        """
+        Clipped n-gram precisions of the token ids of an answer against the token ids of the context,
+        both without stopwords
+
+        Parameters
+        ----------
+        answer_ids : Sequence[int]
+            Token ids of the answer, analyzed with `vocabulary`
+
+        Returns
+        -------
+        List[float]
+            N-gram precisions for orders 1 to max_order
+        """
+        if self._analyzed_ngram_counts is None:
+            self._analyzed_ngram_counts = NgramCounts(self.analyzed_ids, self.max_order)
+        return self._analyzed_ngram_counts.precisions(answer_ids)
+
+
+class NgramCounts:
+    """
+    Counts of the n-grams of a reference token sequence, for orders 1 to `max_order`
+
+    Tokens are mapped to dense ids and each n-gram is encoded as a single integer, so the counts
+    only hold integers whatever the tokens are.
+
+    Parameters
+    ----------
+    tokens : Sequence[Hashable]
+        Reference tokens, e.g. strings or token ids
+    max_order : int
+        Maximum n-gram order counted
+    """
+
+    def __init__(self, tokens: Sequence[Hashable], max_order: int):
+        self.max_order = max_order
+        self.vocabulary: Dict[Hashable, int] = {}
+        ids = [self.vocabulary.setdefault(token, len(self.vocabulary)) for token in tokens]
+        self._base = len(self.vocabulary) + 1
+        self.counts = [
+            Counter(self._key(ids[i : i + order]) for i in range(len(ids) - order + 1))
+            for order in range(1, max_order + 1)
+        ]
+
+    def _key(self, ids: Sequence[int]) -> int:
+        """Encode an n-gram of dense ids as a single integer, unique per n-gram within an order"""
+        key = 0
+        for token_id in ids:
+            key = key * self._base + token_id
+        return key
+
+    def precisions(self, translation: Sequence[Hashable]) -> List[float]:
+        """
+        Clipped n-gram precisions of `translation` against the reference tokens, as in `compute_bleu`
+        """
+        # tokens missing from the reference can not be part of a matching n-gram
+        ids = [self.vocabulary.get(token) for token in translation]
+        precisions = []
+        for order in range(1, self.max_order + 1):
+            possible_matches = len(ids) - order + 1
+            if possible_matches <= 0:
+                precisions.append(0.0)
+                continue
+            counts: Dict[int, int] = Counter(
+                self._key(ids[i : i + order])
+                for i in range(possible_matches)
+                if None not in ids[i : i + order]
+            )
+            reference_counts = self.counts[order - 1]
+            matches = sum(min(count, reference_counts.get(key, 0)) for key, count in counts.items())
+            precisions.append(float(matches) / possible_matches)
+        return precisions
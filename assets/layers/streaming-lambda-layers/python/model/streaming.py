@@ -1,46 +1,484 @@
-import json
-from langchain_core.callbacks import BaseCallbackHandler
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+from messaging.frames import FRAME_ENCODER, FrameEncoder
 from messaging.service import MessageDeliveryService
-from model.postprocess import clean_answer
-from utils.enums import WebSocketMessageFields as wssm
+from model.postprocess import IncrementalAnswerCleaner, SentenceScore, StreamingRelevanceScorer, clean_answer
 from utils.enums import WebSocketMessageTypes as wsst
+from utils.instrumentation import StreamingInstrumentation
 
-class BedrockStreamingCallback(BaseCallbackHandler):
+# any LangChain callback handler can be passed to the providers to stream tokens
+StreamingCallback = BaseCallbackHandler
+
+SENTENCE_END_CHARACTERS = (".", "!", "?", "\n")
+STREAM_SUFFIX = "..."
+DELTA_MAX_REWRITE_CHARS = 16
+
+
+class StreamingMetrics:
     """
-    Custom Bedrock streaming callback to be used with RunnableWithMessageHistory and BedrockChat
+    Counters describing how LLM tokens were delivered as frames
+    """
+
+    def __init__(self) -> None:
+        self.tokens = 0
+        self.frames = 0
+        self.total_added_latency = 0.0
+        self.max_added_latency = 0.0
+
+    @property
+    def tokens_per_frame(self) -> float:
+        return self.tokens / self.frames if self.frames else 0.0
+
+    @property
+    def average_added_latency(self) -> float:
+        """Average time in seconds a token waited in the buffer before its frame was posted."""
+        return self.total_added_latency / self.tokens if self.tokens else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "frames": self.frames,
+            "tokens_per_frame": self.tokens_per_frame,
+            "average_added_latency_ms": self.average_added_latency * 1000,
+            "max_added_latency_ms": self.max_added_latency * 1000,
+        }
+
+
+class ResponseBuffer:
+    """
+    Appendable buffer of the raw text streamed by the LLM
+
+    Tokens are kept as fragments, joined into chunks of `chunk_fragments` fragments as they arrive,
+    so appending a token never copies the text received before it, unlike growing a `str` with `+=`.
+    The full text is only materialized by `getvalue`, which keeps the joined text as the single chunk
+    so that asking again without new tokens is free.
+
+    Parameters
+    ----------
+    chunk_fragments : int, optional, by default 256
+        Number of fragments joined into one chunk
     """
 
-    def __init__(self, message_service: MessageDeliveryService):
-        self.current_response = ""
+    def __init__(self, chunk_fragments: int = 256) -> None:
+        self.chunk_fragments = chunk_fragments
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Forget all text received so far
+        """
+        self._chunks: List[str] = []
+        self._fragments: List[str] = []
+        self._length = 0
+
+    def append(self, text: str) -> None:
+        """
+        Add text at the end of the buffer
+        """
+        if not text:
+            return
+        self._fragments.append(text)
+        self._length += len(text)
+        if len(self._fragments) >= self.chunk_fragments:
+            self._chunks.append("".join(self._fragments))
+            self._fragments = []
+
+    def getvalue(self) -> str:
+        """
+        Return the full text received so far
+        """
+        if self._fragments:
+            self._chunks.append("".join(self._fragments))
+            self._fragments = []
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return self.getvalue()
+
+
+class _StreamingFrames(ABC):
+    """
+    State and frame building shared by the sync and asyncio streaming callbacks
+
+    Frames are collected in an outbox while the callback state is updated, the callbacks then post
+    them in order with `MessageDeliveryService.post` or `apost`.
+    """
+
+    def __init__(
+        self,
+        message_service: MessageDeliveryService,
+        coalesce: bool = False,
+        max_latency_ms: float = 50.0,
+        max_frame_bytes: int = 512,
+        flush_on_sentence_end: bool = True,
+        delta_frames: bool = False,
+        relevance_scorer: StreamingRelevanceScorer = None,
+        score_frames: bool = True,
+        frame_encoder: FrameEncoder = None,
+        instrumentation: StreamingInstrumentation = None,
+    ):
+        self.response_buffer = ResponseBuffer()
         self.message_service = message_service
+        self.answer_cleaner = IncrementalAnswerCleaner()
+        self.coalesce = coalesce
+        self.max_latency = max_latency_ms / 1000
+        self.max_frame_bytes = max_frame_bytes
+        self.flush_on_sentence_end = flush_on_sentence_end
+        self.delta_frames = delta_frames
+        self.relevance_scorer = relevance_scorer
+        self.score_frames = score_frames
+        self.frame_encoder = frame_encoder or FRAME_ENCODER
+        self.instrumentation = instrumentation
+        self.metrics = StreamingMetrics()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._timer = None
+        self._flush_generation = 0
+        self._sequence = 0
+        self._sent_text = ""
+        self._outbox = []
+        self._reset_pending()
+
+    @property
+    def current_response(self) -> str:
+        """Raw text streamed by the LLM so far"""
+        return self.response_buffer.getvalue()
+
+    @current_response.setter
+    def current_response(self, text: str) -> None:
+        self.response_buffer.clear()
+        self.response_buffer.append(text)
+
+    def _reset_pending(self) -> None:
+        self._pending_tokens = 0
+        self._pending_bytes = 0
+        self._pending_first_arrival = 0.0
+        self._pending_arrival_sum = 0.0
+
+    def _start(self) -> None:
+        self._cancel_timer()
+        self.response_buffer.clear()
+        self.answer_cleaner.reset()
+        if self.relevance_scorer is not None:
+            self.relevance_scorer.reset()
+        self.metrics = StreamingMetrics()
+        self._sequence = 0
+        self._sent_text = ""
+        self._outbox = []
+        self._reset_pending()
+        if self.instrumentation is not None:
+            self.instrumentation.start()
+
+    def _add_token(self, token: str) -> Optional[float]:
+        """
+        Buffer a token and build the frames it completes
+
+        Returns
+        -------
+        Optional[float]
+            Seconds until the buffered tokens must be flushed when they wait for the flush timer, else None
+        """
+        now = time.perf_counter()
+        if self.instrumentation is not None:
+            self.instrumentation.token(now)
+        self.response_buffer.append(token)
+        self.answer_cleaner.feed(token)
+        self.metrics.tokens += 1
+
+        if self._pending_tokens == 0:
+            self._pending_first_arrival = now
+        self._pending_tokens += 1
+        self._pending_bytes += len(token.encode("utf-8"))
+        self._pending_arrival_sum += now
+
+        delay = None
+        if not self.coalesce or self._should_flush(token, now):
+            self._flush_stream()
+        else:
+            delay = max(0.0, self.max_latency - (now - self._pending_first_arrival))
+
+        if self.relevance_scorer is not None:
+            self._add_scores(self.relevance_scorer.feed(token))
+        return delay
+
+    def _should_flush(self, token: str, now: float) -> bool:
+        if self._pending_bytes >= self.max_frame_bytes:
+            return True
+        if now - self._pending_first_arrival >= self.max_latency:
+            return True
+        return self.flush_on_sentence_end and token.rstrip(" ").endswith(SENTENCE_END_CHARACTERS)
+
+    @abstractmethod
+    def _cancel_timer(self) -> None:
+        """Cancel the pending flush timer, if any"""
+
+    def _take_pending(self) -> None:
+        """
+        Account the buffered tokens as delivered with the frame that is about to be posted
+        """
+        self._cancel_timer()
+        self._flush_generation += 1
+        now = time.perf_counter()
+        self.metrics.frames += 1
+        if self._pending_tokens:
+            self.metrics.total_added_latency += self._pending_tokens * now - self._pending_arrival_sum
+            self.metrics.max_added_latency = max(self.metrics.max_added_latency, now - self._pending_first_arrival)
+        self._reset_pending()
+
+    def _flush_stream(self) -> None:
+        if self._pending_tokens == 0:
+            return
+        self._take_pending()
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            started = time.perf_counter()
+        answer = self.answer_cleaner.snapshot()
+        if instrumentation is not None:
+            cleaned = time.perf_counter()
+        if not self.delta_frames:
+            serialized_response_body = self.frame_encoder.encode(wsst.STREAM, answer + STREAM_SUFFIX)
+        else:
+            offset = _delta_offset(self._sent_text, answer)
+            if offset is None:
+                serialized_response_body = self.frame_encoder.encode(
+                    wsst.STREAM, answer + STREAM_SUFFIX, sequence=self._next_sequence()
+                )
+            else:
+                serialized_response_body = self.frame_encoder.encode(
+                    wsst.DELTA, answer[offset:], offset=offset, sequence=self._next_sequence()
+                )
+            self._sent_text = answer
+        if instrumentation is not None:
+            self._record_frame(started, cleaned)
+        self._outbox.append(serialized_response_body)
+
+    def _add_scores(self, scores: List[SentenceScore]) -> None:
+        if not self.score_frames:
+            return
+        for score in scores:
+            serialized_response_body = self.frame_encoder.encode(
+                wsst.SCORE, score.sentence, index=score.index, score=score.score, sequence=self._next_sequence()
+            )
+            self._outbox.append(serialized_response_body)
+
+    def _next_sequence(self) -> Optional[int]:
+        """Sequence number of the next frame, None without delta frames"""
+        if not self.delta_frames:
+            return None
+        self._sequence += 1
+        return self._sequence - 1
+
+    def _end(self) -> None:
+        if self.relevance_scorer is not None:
+            self._add_scores(self.relevance_scorer.finish())
+            self.logger.debug(
+                f"Relevance scoring overhead: {self.relevance_scorer.overhead_per_token * 1000:.3f}ms per token, "
+                f"{self.relevance_scorer.skipped_sentences} sentences skipped"
+            )
+        self._take_pending()
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            started = time.perf_counter()
+        answer = clean_answer(self.current_response)
+        if instrumentation is not None:
+            cleaned = time.perf_counter()
+        serialized_response_body = self.frame_encoder.encode(wsst.END, answer, sequence=self._next_sequence())
+        if instrumentation is not None:
+            self._record_frame(started, cleaned)
+        self._outbox.append(serialized_response_body)
+        self.logger.debug(f"Streaming metrics: {self.metrics.as_dict()}")
+
+    def _record_frame(self, started: float, cleaned: float) -> None:
+        encoded = time.perf_counter()
+        self.instrumentation.record("Clean", cleaned - started)
+        self.instrumentation.record("Encode", encoded - cleaned)
+        self.instrumentation.record("FrameProcessing", encoded - started)
+
+    def _emit_metrics(self) -> None:
+        """Write the EMF record of the generation once its END frame was posted"""
+        if self.instrumentation is not None:
+            self.instrumentation.end()
+            self.instrumentation.emit()
+
+    def _error(self, error: BaseException) -> None:
+        self._flush_stream()
+        self._take_pending()
+        serialized_response_body = self.frame_encoder.encode(
+            wsst.ERROR, f"Error occurred: {str(error)}", sequence=self._next_sequence()
+        )
+        self._outbox.append(serialized_response_body)
+
+    def _take_outbox(self) -> List[Any]:
+        outbox, self._outbox = self._outbox, []
+        return outbox
+
+
+class BedrockStreamingCallback(_StreamingFrames, BaseCallbackHandler):
+    """
+    Custom Bedrock streaming callback to be used with RunnableWithMessageHistory and BedrockChat
+
+    By default every token is posted as its own STREAM frame. With `coalesce=True`, tokens are
+    buffered and posted as one frame once the first buffered token is `max_latency_ms` old, the
+    buffered tokens reach `max_frame_bytes`, or a token ends a sentence. Buffered tokens are always
+    delivered before the END or ERROR frame.
+
+    With `delta_frames=True`, frames carry a sequence number and STREAM frames are replaced by DELTA
+    frames holding only the text after `offset`: the client keeps the first `offset` characters of
+    its answer and appends the message. A full STREAM frame is sent instead when cleaning rewrote
+    more than the last `DELTA_MAX_REWRITE_CHARS` characters of the answer, e.g. when a repetition
+    was removed. END frames always carry the full answer.
+
+    With a `relevance_scorer`, each sentence is scored against the retrieved context as soon as it
+    completes, and a SCORE frame with the sentence, its index and its score is posted unless
+    `score_frames=False`. The scores are also kept in `relevance_scorer.scores`.
+
+    STREAM, DELTA, SCORE, END and ERROR frames are all encoded to bytes by `frame_encoder`, by default
+    the shared `FRAME_ENCODER`.
+
+    The raw answer is accumulated in a `ResponseBuffer` and only materialized when `current_response`
+    is read or the END frame is built.
+
+    With an `instrumentation`, token arrivals and the time spent building frames are recorded, and
+    a CloudWatch EMF record of the generation is written to stdout after the END frame was posted.
+
+    For generations run with `ainvoke` or `astream`, use `AsyncBedrockStreamingCallback`.
+    """
+
+    def __init__(self, message_service: MessageDeliveryService, *args, **kwargs):
+        super().__init__(message_service, *args, **kwargs)
+        self._lock = threading.RLock()
+
+    def _deliver(self) -> None:
+        for serialized_response_body in self._take_outbox():
+            self.message_service.post(payload=serialized_response_body)
 
     def on_llm_start(self, serialized, prompts, **kwargs) -> None:
         """Called when LLM starts running."""
-        self.current_response = ""
+        with self._lock:
+            self._start()
 
     def on_llm_new_token(self, token: str, **kwargs) -> None:
         """
         Runs on each new token produced by LLM. Concatenates tokens and posts to message_service
         """
-        self.current_response += token
-        serialized_response_body = json.dumps({
-            wssm.MESSAGE: clean_answer(self.current_response) + "...",
-            wssm.TYPE: wsst.STREAM,
-        })
-        self.message_service.post(payload=serialized_response_body)
+        with self._lock:
+            delay = self._add_token(token)
+            if delay is not None and self._timer is None:
+                self._timer = threading.Timer(delay, self._on_timer, args=(self._flush_generation,))
+                self._timer.daemon = True
+                self._timer.start()
+            self._deliver()
+
+    def _on_timer(self, generation: int) -> None:
+        with self._lock:
+            # a frame was posted since this timer was started
+            if generation != self._flush_generation:
+                return
+            self._timer = None
+            self._flush_stream()
+            self._deliver()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
 
     def on_llm_end(self, response, **kwargs) -> None:
-        """Called when LLM generation ends."""
-        serialized_response_body = json.dumps({
-            wssm.MESSAGE: clean_answer(self.current_response),
-            wssm.TYPE: wsst.END,
-        })
-        self.message_service.post(payload=serialized_response_body)
+        """Called when LLM generation ends. The END frame also delivers any buffered tokens."""
+        with self._lock:
+            self._end()
+            self._deliver()
+            self._emit_metrics()
 
     def on_llm_error(self, error: Exception, **kwargs) -> None:
-        """Called when LLM encounters an error."""
-        serialized_response_body = json.dumps({
-            wssm.MESSAGE: f"Error occurred: {str(error)}",
-            wssm.TYPE: wsst.ERROR,
-        })
-        self.message_service.post(payload=serialized_response_body)
+        """Called when LLM encounters an error. Buffered tokens are posted before the ERROR frame."""
+        with self._lock:
+            self._error(error)
+            self._deliver()
+
+
+class AsyncBedrockStreamingCallback(_StreamingFrames, AsyncCallbackHandler):
+    """
+    Asyncio counterpart of `BedrockStreamingCallback`, for generations run with `ainvoke` or `astream`
+
+    Takes the same options and posts the same frames, awaiting `MessageDeliveryService.apost`, so a
+    single event loop drives both the generation and the delivery without handing every token to a
+    thread executor. The coalescing timer is scheduled on the running event loop.
+    """
+
+    def __init__(self, message_service: MessageDeliveryService, *args, **kwargs):
+        super().__init__(message_service, *args, **kwargs)
+        self._lock = asyncio.Lock()
+        self._timer_task = None
+
+    async def _deliver(self) -> None:
+        for serialized_response_body in self._take_outbox():
+            await self.message_service.apost(payload=serialized_response_body)
+
+    async def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        """Called when LLM starts running."""
+        async with self._lock:
+            self._start()
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        """
+        Runs on each new token produced by LLM. Concatenates tokens and posts to message_service
+        """
+        async with self._lock:
+            delay = self._add_token(token)
+            if delay is not None and self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer, self._flush_generation)
+            await self._deliver()
+
+    def _on_timer(self, generation: int) -> None:
+        self._timer = None
+        self._timer_task = asyncio.ensure_future(self._flush_on_timer(generation))
+
+    async def _flush_on_timer(self, generation: int) -> None:
+        async with self._lock:
+            # a frame was posted since this timer was started
+            if generation != self._flush_generation:
+                return
+            self._flush_stream()
+            await self._deliver()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def on_llm_end(self, response, **kwargs) -> None:
+        """Called when LLM generation ends. The END frame also delivers any buffered tokens."""
+        async with self._lock:
+            self._end()
+            await self._deliver()
+            self._emit_metrics()
+
+    async def on_llm_error(self, error: BaseException, **kwargs) -> None:
+        """Called when LLM encounters an error. Buffered tokens are posted before the ERROR frame."""
+        async with self._lock:
+            self._error(error)
+            await self._deliver()
+
+
+def _delta_offset(previous: str, current: str):
+    """
+    Return the length of the common prefix of two answers, or None if the answers differ before
+    the last DELTA_MAX_REWRITE_CHARS characters of `previous`
+    """
+    offset = max(0, len(previous) - DELTA_MAX_REWRITE_CHARS)
+    if not current.startswith(previous[:offset]):
+        return None
+    end = min(len(previous), len(current))
+    while offset < end and previous[offset] == current[offset]:
+        offset += 1
+    return offset
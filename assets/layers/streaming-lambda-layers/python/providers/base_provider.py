@@ -1,14 +1,19 @@
 from abc import ABC, abstractmethod
-from langchain.llms.base import LLM
+from typing import TYPE_CHECKING, Hashable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from langchain.llms.base import LLM
+    from providers.llm_cache import LLMCache
 
 class BaseProvider(ABC):
     """
     Abstract base class for AI model providers.
-    All provider-specific classes must inherit from this class and implement the get_llm method.
+    All provider-specific classes must inherit from this class and implement the get_llm, cache_key and
+    create_llm methods, the last two let get_cached_llm hand out cached LLMs.
     """
 
     @abstractmethod
-    def get_llm(self) -> LLM:
+    def get_llm(self) -> "LLM":
         """
         Instantiate and return the LangChain LLM class specific to the provider.
         
@@ -16,3 +21,43 @@ class BaseProvider(ABC):
             LLM: An instance of a LangChain LLM.
         """
         pass
+
+    @abstractmethod
+    def cache_key(self) -> Tuple[Hashable, ...]:
+        """
+        Return the key identifying LLMs that can be shared between requests to this provider.
+
+        Returns:
+            tuple: The provider settings used to build the LLM, with secrets replaced by digests.
+        """
+        pass
+
+    @abstractmethod
+    def create_llm(self, callbacks: Optional[List] = None) -> "LLM":
+        """
+        Instantiate the LangChain LLM class specific to the provider.
+
+        Parameters:
+            callbacks (list, optional): Callback handlers to attach to the LLM. Defaults to None.
+
+        Returns:
+            LLM: An instance of a LangChain LLM.
+        """
+        pass
+
+    def get_cached_llm(self, cache: "LLMCache" = None) -> "LLM":
+        """
+        Return an LLM shared across warm invocations, built without callbacks.
+        Pass the per-request streaming callback when invoking it, e.g.
+        `llm.stream(messages, config={"callbacks": [streaming_callback]})`.
+
+        Parameters:
+            cache (LLMCache, optional): Cache to use. Defaults to the module level LLM_CACHE.
+
+        Returns:
+            LLM: A cached instance of a LangChain LLM.
+        """
+        from providers.llm_cache import LLM_CACHE
+
+        cache = LLM_CACHE if cache is None else cache
+        return cache.get_or_create(self.cache_key(), self.create_llm)
@@ -1,22 +1,26 @@
-import boto3
-from langchain_aws import ChatBedrock
-from model.streaming import StreamingCallback
+from typing import TYPE_CHECKING, Hashable, List, Optional, Tuple
 from providers.base_provider import BaseProvider
+from utils.clients import get_client
 import os
 import logging
 
+if TYPE_CHECKING:
+    from langchain_aws import ChatBedrock
+    from model.streaming import StreamingCallback
+
 class BedrockProvider(BaseProvider):
     """
     Provider implementation for AWS Bedrock Models
     """
 
-    def __init__(self, model_id: str, streaming_callback: StreamingCallback, max_tokens: int = 1000, temperature: float = .7, region: str = None) -> None:
+    def __init__(self, model_id: str, streaming_callback: "StreamingCallback" = None, max_tokens: int = 1000, temperature: float = .7, region: str = None) -> None:
         """
         Initialize the BedrockProvider with necessary parameters.
 
         Parameters:
             model_id (str): The model identifier for Bedrock.
-            streaming_callback (StreamingCallback): Callback handler for streaming responses.
+            streaming_callback (StreamingCallback, optional): Callback handler for streaming responses. Not needed for
+                get_cached_llm, where the callback is passed when the LLM is invoked.
             max_tokens (int, optional): Maximum number of tokens in the model's response. Defaults to 1000.
             temperature (float, optional): Temperature to set for the model. Defaults to 0.7.
             region (str, optional): AWS region where Bedrock is deployed. Defaults to environment variable.
@@ -29,20 +33,40 @@ class BedrockProvider(BaseProvider):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.debug(f"Initialized BedrockProvider with model_id: {self.model_id}, region: {self.region}, max_tokens: {self.max_tokens}, temperature: {self.temperature}")
     
-    def get_llm(self) -> ChatBedrock:
+    def get_llm(self) -> "ChatBedrock":
         """
         Instantiate and return the ChatBedrock LLM.
 
         Returns:
             ChatBedrock: An instance of ChatBedrock configured with the specified model and callback.
         """
+        if not self.streaming_callback:
+            raise ValueError("Streaming callback is required for Bedrock Models, or use get_cached_llm and pass it when invoking the LLM")
+        return self.create_llm(callbacks=[self.streaming_callback])
+
+    def cache_key(self) -> Tuple[Hashable, ...]:
+        return ("bedrock", self.model_id, self.max_tokens, self.temperature, self.region)
+
+    def create_llm(self, callbacks: Optional[List] = None) -> "ChatBedrock":
+        """
+        Instantiate the ChatBedrock LLM.
+
+        Parameters:
+            callbacks (list, optional): Callback handlers to attach to the LLM. Defaults to None.
+
+        Returns:
+            ChatBedrock: An instance of ChatBedrock configured with the specified model.
+        """
+        # imported on first use, so that cold starts only pay for the provider in use
+        from langchain_aws import ChatBedrock
+
         try:
-            bedrock_client = boto3.client('bedrock-runtime', region_name=self.region)
+            bedrock_client = get_client('bedrock-runtime', region_name=self.region)
             llm = ChatBedrock(
                 client=bedrock_client,
                 model_id=self.model_id,
                 streaming=True,
-                callbacks=[self.streaming_callback],
+                callbacks=callbacks,
                 model_kwargs={
                     "max_tokens": self.max_tokens,
                     "temperature": self.temperature
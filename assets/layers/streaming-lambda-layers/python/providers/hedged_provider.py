@@ -0,0 +1,65 @@
+from typing import TYPE_CHECKING, Hashable, List, Optional, Tuple
+from providers.base_provider import BaseProvider
+import logging
+
+if TYPE_CHECKING:
+    from model.streaming import StreamingCallback
+    from providers.hedging import HedgedChatModel
+
+class HedgedProvider(BaseProvider):
+    """
+    Provider that hedges slow first tokens of one provider with requests to alternate providers,
+    e.g. the same Bedrock model in another region or another model. See `HedgedChatModel`.
+    """
+
+    def __init__(self, providers: List[BaseProvider], streaming_callback: "StreamingCallback" = None, hedge_delay_ms: float = 1000) -> None:
+        """
+        Initialize the HedgedProvider with necessary parameters.
+
+        Parameters:
+            providers (List[BaseProvider]): The primary provider followed by the alternates, in the order they are hedged with.
+            streaming_callback (StreamingCallback, optional): Callback handler for streaming responses. Not needed for
+                get_cached_llm, where the callback is passed when the LLM is invoked.
+            hedge_delay_ms (float, optional): Time to wait for a first token before sending the request to the next provider.
+                Defaults to 1000.
+        """
+        if len(providers) < 2:
+            raise ValueError("Hedging needs at least two providers")
+        if hedge_delay_ms < 0:
+            raise ValueError("hedge_delay_ms must not be negative")
+        self.providers = providers
+        self.streaming_callback = streaming_callback
+        self.hedge_delay_ms = hedge_delay_ms
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.debug(f"Initialized HedgedProvider with {len(self.providers)} providers, hedge_delay_ms: {self.hedge_delay_ms}")
+
+    def get_llm(self) -> "HedgedChatModel":
+        """
+        Instantiate and return the HedgedChatModel.
+
+        Returns:
+            HedgedChatModel: An instance of HedgedChatModel over the LLMs of the providers, with the streaming callback.
+        """
+        if not self.streaming_callback:
+            raise ValueError("Streaming callback is required for hedged models, or use get_cached_llm and pass it when invoking the LLM")
+        return self.create_llm(callbacks=[self.streaming_callback])
+
+    def cache_key(self) -> Tuple[Hashable, ...]:
+        return ("hedged", self.hedge_delay_ms) + tuple(provider.cache_key() for provider in self.providers)
+
+    def create_llm(self, callbacks: Optional[List] = None) -> "HedgedChatModel":
+        """
+        Instantiate the HedgedChatModel. The LLMs of the providers are built without callbacks, so that only the
+        tokens of the winning request reach the callbacks of the hedged model.
+
+        Parameters:
+            callbacks (list, optional): Callback handlers to attach to the LLM. Defaults to None.
+
+        Returns:
+            HedgedChatModel: An instance of HedgedChatModel over the LLMs of the providers.
+        """
+        # imported on first use, it loads LangChain
+        from providers.hedging import HedgedChatModel
+
+        llms = [provider.create_llm() for provider in self.providers]
+        return HedgedChatModel(llms=llms, hedge_delay_ms=self.hedge_delay_ms, callbacks=callbacks)
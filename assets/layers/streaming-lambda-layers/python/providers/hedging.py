@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+logger = logging.getLogger("HedgedChatModel")
+
+# marks the end of the stream of an attempt
+_DONE = object()
+
+# attempts are invoked without the callbacks of the run, even inside a chain whose config they inherit
+_NO_CALLBACKS = {"callbacks": []}
+
+
+class HedgeStats:
+    """
+    Counters of a hedged chat model, shared by all requests to it
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.hedged_requests = 0
+        self.hedges = 0
+        self.alternate_wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, attempts: int, winner: Optional[int]) -> None:
+        with self._lock:
+            self.requests += 1
+            self.hedges += attempts - 1
+            if attempts > 1:
+                self.hedged_requests += 1
+            if winner:
+                self.alternate_wins += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "hedged_requests": self.hedged_requests,
+            "hedges": self.hedges,
+            "alternate_wins": self.alternate_wins,
+        }
+
+
+class _Race:
+    """
+    Bookkeeping of the attempts of one hedged request
+
+    The first attempt to stream a token, or to finish, wins and is the only one whose chunks are
+    returned. Chunks without text that an attempt streams before its first token, such as the message
+    start of Bedrock, are kept until it wins or loses.
+    """
+
+    def __init__(self, n_llms: int) -> None:
+        self.n_llms = n_llms
+        self.launched = 0
+        self.winner: Optional[int] = None
+        self.finished = False
+        self._failed: Dict[int, BaseException] = {}
+        self._buffered: Dict[int, List[ChatGenerationChunk]] = {}
+
+    @property
+    def can_hedge(self) -> bool:
+        return self.winner is None and self.launched < self.n_llms
+
+    @property
+    def needs_failover(self) -> bool:
+        """Whether every launched attempt failed before its first token, while alternates are left"""
+        return self.winner is None and len(self._failed) == self.launched < self.n_llms
+
+    def add(self, index: int, item: Any, error: Optional[BaseException]) -> List[ChatGenerationChunk]:
+        """
+        Add an event of attempt `index`, a chunk, `_DONE` or an error, and return the chunks to emit
+
+        Raises the error of the winner, or the last error once every attempt failed.
+        """
+        if self.winner is not None and index != self.winner:
+            return []
+        if error is not None:
+            if self.winner is not None:
+                raise error
+            self._failed[index] = error
+            self._buffered.pop(index, None)
+            logger.warning(f"Attempt {index} failed before its first token: {error}")
+            if len(self._failed) == self.n_llms:
+                raise error
+            return []
+        if self.winner is None:
+            if item is not _DONE and not item.text:
+                self._buffered.setdefault(index, []).append(item)
+                return []
+            self.winner = index
+        chunks = self._buffered.pop(index, [])
+        if item is _DONE:
+            self.finished = True
+        else:
+            chunks.append(item)
+        return chunks
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that hedges slow first tokens with requests to alternate models
+
+    The request is sent to the first of `llms`. If no token arrived after `hedge_delay_ms`, the same
+    request is also sent to the next one, and so on until every model was asked. The first model to
+    stream a token wins: only its chunks are returned and passed to the callbacks of the run, so the
+    streaming callback never sees tokens of the other requests, which are cancelled. An attempt that
+    fails before its first token immediately hands over to the next model.
+
+    The models are invoked with their callbacks explicitly cleared, so the callbacks of the run,
+    including those inherited from an enclosing chain, never see the attempts. In the sync `_stream`,
+    attempts stream from threads, which stop at the next chunk once they lost; in `_astream` they are
+    tasks and are cancelled right away.
+    """
+
+    llms: List[BaseChatModel]
+    hedge_delay_ms: float = 1000.0
+
+    _stats: HedgeStats = PrivateAttr(default_factory=HedgeStats)
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "llms": [llm._identifying_params for llm in self.llms],
+            "hedge_delay_ms": self.hedge_delay_ms,
+        }
+
+    @property
+    def stats(self) -> HedgeStats:
+        return self._stats
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunks = list(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        return _to_result(chunks)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunks = [chunk async for chunk in self._astream(messages, stop=stop, run_manager=run_manager, **kwargs)]
+        return _to_result(chunks)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        race = _Race(len(self.llms))
+        events: "queue.Queue[Tuple[int, Any, Optional[BaseException]]]" = queue.Queue()
+        cancelled: List[threading.Event] = []
+
+        def launch() -> float:
+            index = race.launched
+            race.launched += 1
+            cancelled.append(threading.Event())
+            threading.Thread(
+                target=self._pump,
+                args=(index, messages, stop, kwargs, events, cancelled[index]),
+                name=f"hedge-{index}",
+                daemon=True,
+            ).start()
+            return time.monotonic() + self.hedge_delay_ms / 1000
+
+        deadline = launch()
+        try:
+            while not race.finished:
+                timeout = max(0.0, deadline - time.monotonic()) if race.can_hedge else None
+                try:
+                    index, item, error = events.get(timeout=timeout)
+                except queue.Empty:
+                    logger.debug(f"No token after {self.hedge_delay_ms}ms, hedging with attempt {race.launched}")
+                    deadline = launch()
+                    continue
+                had_winner = race.winner is not None
+                chunks = race.add(index, item, error)
+                if race.needs_failover:
+                    deadline = launch()
+                if not had_winner and race.winner is not None:
+                    self._stats.record(race.launched, race.winner)
+                    for loser, event in enumerate(cancelled):
+                        if loser != race.winner:
+                            event.set()
+                for chunk in chunks:
+                    if run_manager is not None:
+                        run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+        finally:
+            for event in cancelled:
+                event.set()
+
+    def _pump(self, index, messages, stop, kwargs, events, cancelled) -> None:
+        try:
+            for chunk in self.llms[index].stream(messages, stop=stop, config=_NO_CALLBACKS, **kwargs):
+                if cancelled.is_set():
+                    return
+                events.put((index, ChatGenerationChunk(message=chunk), None))
+        except Exception as e:
+            events.put((index, None, e))
+        else:
+            events.put((index, _DONE, None))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        race = _Race(len(self.llms))
+        events: "asyncio.Queue[Tuple[int, Any, Optional[BaseException]]]" = asyncio.Queue()
+        tasks: List[asyncio.Task] = []
+
+        def launch() -> float:
+            tasks.append(asyncio.ensure_future(self._apump(race.launched, messages, stop, kwargs, events)))
+            race.launched += 1
+            return time.monotonic() + self.hedge_delay_ms / 1000
+
+        deadline = launch()
+        try:
+            while not race.finished:
+                timeout = max(0.0, deadline - time.monotonic()) if race.can_hedge else None
+                try:
+                    index, item, error = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    logger.debug(f"No token after {self.hedge_delay_ms}ms, hedging with attempt {race.launched}")
+                    deadline = launch()
+                    continue
+                had_winner = race.winner is not None
+                chunks = race.add(index, item, error)
+                if race.needs_failover:
+                    deadline = launch()
+                if not had_winner and race.winner is not None:
+                    self._stats.record(race.launched, race.winner)
+                    for loser, task in enumerate(tasks):
+                        if loser != race.winner:
+                            task.cancel()
+                for chunk in chunks:
+                    if run_manager is not None:
+                        await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _apump(self, index, messages, stop, kwargs, events) -> None:
+        try:
+            # the task copied the context of the run, which holds its config and callbacks
+            async for chunk in self.llms[index].astream(messages, stop=stop, config=_NO_CALLBACKS, **kwargs):
+                events.put_nowait((index, ChatGenerationChunk(message=chunk), None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            events.put_nowait((index, None, e))
+        else:
+            events.put_nowait((index, _DONE, None))
+
+
+def _to_result(chunks: List[ChatGenerationChunk]) -> ChatResult:
+    if not chunks:
+        return ChatResult(generations=[ChatGenerationChunk(message=AIMessageChunk(content=""))])
+    generation = chunks[0]
+    for chunk in chunks[1:]:
+        generation += chunk
+    return ChatResult(generations=[generation])
@@ -0,0 +1,74 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class LLMCache:
+    """
+    LRU cache of LangChain chat models kept alive across warm Lambda invocations
+
+    Models are cached without callbacks, the per-request streaming callback is passed when the model is
+    invoked, e.g. `llm.stream(messages, config={"callbacks": [streaming_callback]})`. Once `max_size`
+    models are cached, the least recently used one is evicted.
+    """
+
+    def __init__(self, max_size: int = 8) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._llms: "OrderedDict[Tuple[Hashable, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: Tuple[Hashable, ...], create: Callable[[], Any]) -> Any:
+        """
+        Return the model cached under `key`, creating it with `create` on a miss.
+
+        Parameters:
+            key (tuple): Cache key, see `BaseProvider.cache_key`.
+            create (Callable): Builds the model when it is not cached.
+        """
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is not None:
+                self._llms.move_to_end(key)
+                self.hits += 1
+                return llm
+            self.misses += 1
+            llm = create()
+            self._llms[key] = llm
+            if len(self._llms) > self.max_size:
+                self._llms.popitem(last=False)
+                self.evictions += 1
+            return llm
+
+    def __len__(self) -> int:
+        return len(self._llms)
+
+    def __contains__(self, key: Tuple[Hashable, ...]) -> bool:
+        return key in self._llms
+
+    def clear(self) -> None:
+        """
+        Forget all cached models and reset the counters
+        """
+        with self._lock:
+            self._llms.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+LLM_CACHE = LLMCache()
+
+
+def secret_fingerprint(secret: Optional[str]) -> Optional[str]:
+    """
+    Return a digest of a secret, such as an API key, to use in cache keys instead of the secret itself
+    """
+    if secret is None:
+        return None
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
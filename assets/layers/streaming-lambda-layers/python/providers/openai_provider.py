@@ -1,19 +1,24 @@
-from langchain_openai import ChatOpenAI
-from model.streaming import StreamingCallback
+from typing import TYPE_CHECKING, Hashable, List, Optional, Tuple
 from providers.base_provider import BaseProvider
+from providers.llm_cache import secret_fingerprint
 import logging
 
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+    from model.streaming import StreamingCallback
+
 class OpenAIProvider(BaseProvider):
     """
     Provider implementation for OpenAI Models
     """
-    def __init__(self, model_id: str, api_key: str, streaming_callback: StreamingCallback, max_tokens: int = 1000, temperature: float = .7) -> None:
+    def __init__(self, model_id: str, api_key: str, streaming_callback: "StreamingCallback" = None, max_tokens: int = 1000, temperature: float = .7) -> None:
         """
         Initialize the OpenAIProvider with necessary parameters.
         Parameters:
         model_id (str): The model identifier for OpenAI.
         api_key (str): API key for accessing OpenAI models.
-        streaming_callback: Callback handler for streaming responses.
+        streaming_callback (optional): Callback handler for streaming responses. Not needed for get_cached_llm,
+            where the callback is passed when the LLM is invoked.
         max_tokens (int, optional): Maximum number of tokens in the model's response. Defaults to 1000.
         temperature (float, optional): Temperature to set for the model. Defaults to 0.7.
         """
@@ -25,18 +30,36 @@ class OpenAIProvider(BaseProvider):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.debug(f"Initialized OpenAIProvider with model_id: {self.model_id}, max_tokens: {self.max_tokens}, temperature: {self.temperature}")
 
-    def get_llm(self) -> ChatOpenAI:
+    def get_llm(self) -> "ChatOpenAI":
         """
         Instantiate and return the ChatOpenAI LLM.
         Returns:
         ChatOpenAI: An instance of ChatOpenAI configured with the specified model and token limit.
         """
+        if not self.streaming_callback:
+            raise ValueError("Streaming callback is required for OpenAI Models, or use get_cached_llm and pass it when invoking the LLM")
+        return self.create_llm(callbacks=[self.streaming_callback])
+
+    def cache_key(self) -> Tuple[Hashable, ...]:
+        return ("openai", self.model_id, self.max_tokens, self.temperature, secret_fingerprint(self.api_key))
+
+    def create_llm(self, callbacks: Optional[List] = None) -> "ChatOpenAI":
+        """
+        Instantiate the ChatOpenAI LLM.
+        Parameters:
+        callbacks (list, optional): Callback handlers to attach to the LLM. Defaults to None.
+        Returns:
+        ChatOpenAI: An instance of ChatOpenAI configured with the specified model and token limit.
+        """
+        # imported on first use, so that cold starts only pay for the provider in use
+        from langchain_openai import ChatOpenAI
+
         try:
             llm = ChatOpenAI(
                 api_key=self.api_key,
                 model=self.model_id,
                 streaming=True,
-                callbacks=[self.streaming_callback],
+                callbacks=callbacks,
                 max_tokens=self.max_tokens,
                 temperature=self.temperature
             )
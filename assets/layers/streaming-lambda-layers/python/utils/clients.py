@@ -0,0 +1,90 @@
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ClientRegistry:
+    """
+    Registry of boto3 clients shared across publishers, providers and warm Lambda invocations
+
+    Clients are keyed by service, region, endpoint and connection settings, so callers asking for the
+    same client get the same instance along with its pool of open HTTPS connections.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._clients: Dict[Tuple[Hashable, ...], Any] = {}
+        self._lock = threading.Lock()
+        self._session = None
+
+    def get_client(
+        self,
+        service_name: str,
+        region_name: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        max_pool_connections: int = 10,
+        tcp_keepalive: bool = True,
+        max_attempts: int = 3,
+        retry_mode: str = "standard",
+    ) -> Any:
+        """
+        Return a cached boto3 client, creating it on first use.
+
+        Parameters:
+            service_name (str): Name of the AWS service, e.g. "bedrock-runtime".
+            region_name (str, optional): AWS region. Defaults to the boto3 default region.
+            endpoint_url (str, optional): Endpoint to send requests to, e.g. the API Gateway callback URL.
+            max_pool_connections (int, optional): Size of the client's connection pool. Defaults to 10.
+            tcp_keepalive (bool, optional): Whether to enable TCP keep-alive on pooled connections. Defaults to True.
+            max_attempts (int, optional): Maximum number of attempts per request, including retries. Defaults to 3.
+            retry_mode (str, optional): botocore retry mode. Defaults to "standard".
+        """
+        key = (service_name, region_name, endpoint_url, max_pool_connections, tcp_keepalive, max_attempts, retry_mode)
+        client = self._clients.get(key)
+        if client is not None:
+            self.hits += 1
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            self.misses += 1
+            # boto3 is imported on first use, it is the largest part of the messaging cold start
+            import boto3
+            from botocore.config import Config
+
+            # boto3 sessions are not thread safe, so clients are only created under the lock
+            if self._session is None:
+                self._session = boto3.session.Session()
+            config = Config(
+                max_pool_connections=max_pool_connections,
+                tcp_keepalive=tcp_keepalive,
+                retries={"max_attempts": max_attempts, "mode": retry_mode},
+            )
+            client = self._session.client(
+                service_name, region_name=region_name, endpoint_url=endpoint_url, config=config
+            )
+            self._clients[key] = client
+            return client
+
+    def clear(self) -> None:
+        """
+        Forget all cached clients and reset the counters
+        """
+        with self._lock:
+            self._clients.clear()
+            self._session = None
+            self.hits = 0
+            self.misses = 0
+
+
+CLIENT_REGISTRY = ClientRegistry()
+
+
+def get_client(service_name: str, **kwargs) -> Any:
+    """
+    Return a boto3 client from the module level registry. See `ClientRegistry.get_client`.
+    """
+    return CLIENT_REGISTRY.get_client(service_name, **kwargs)
@@ -18,13 +18,26 @@ class WebSocketMessageFields(str, Enum):
     ACTION = "action"
     FEEDBACK = "feedback"
     DATA = "data"
+    SEQUENCE = "sequence"
+    OFFSET = "offset"
+    SCORE = "score"
+    INDEX = "index"
+    ID = "id"
+    COUNT = "count"
 
 class WebSocketMessageTypes(str, Enum):
     ERROR = "error"
     MESSAGE = "message"
     STREAM = "stream"
+    DELTA = "delta"
+    SCORE = "score"
+    FRAGMENT = "fragment"
     END = "end"
 
+class ResponseStreamFormats(str, Enum):
+    NDJSON = "ndjson"
+    SSE = "sse"
+
 class WebSocketMessageActions(str, Enum):
     CLOSE = "close"
 
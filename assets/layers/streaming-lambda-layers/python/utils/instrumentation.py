@@ -0,0 +1,235 @@
+import json
+import math
+import sys
+import threading
+import time
+from typing import IO, Dict, List, Mapping, Optional
+
+# sub-buckets per power of two, the relative error of a recorded value is at most 1 / (2 * 8)
+_SUB_BUCKETS = 8
+
+# bucket of zero and negative durations, below the bucket of any positive duration
+_ZERO_BUCKET = -(2**31)
+
+# EMF accepts at most 100 values per metric
+_MAX_EMF_VALUES = 100
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations in seconds
+
+    Each power of two is split into `_SUB_BUCKETS` buckets, so recording is a `frexp` and a
+    dictionary update and percentiles are within about 6% of the recorded values. Count, sum, min
+    and max are exact.
+    """
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        mantissa, exponent = math.frexp(seconds)
+        if seconds > 0:
+            # mantissa is in [0.5, 1) for positive values
+            bucket = exponent * _SUB_BUCKETS + int((mantissa - 0.5) * 2 * _SUB_BUCKETS)
+        else:
+            bucket = _ZERO_BUCKET
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """
+        Add the recordings of `other`, e.g. to aggregate the histograms of many generations
+        """
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @staticmethod
+    def _bucket_value(bucket: int) -> float:
+        if bucket == _ZERO_BUCKET:
+            return 0.0
+        exponent, sub_bucket = divmod(bucket, _SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2 * _SUB_BUCKETS), exponent)
+
+    def percentile(self, q: float) -> float:
+        """
+        Approximate `q`-th percentile, q in [0, 100]
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(self._bucket_value(bucket), self.min), self.max)
+        return self.max
+
+    def values(self, scale: float = 1.0, max_values: int = _MAX_EMF_VALUES) -> List[float]:
+        """
+        Values describing the distribution, for an EMF metric: the value of every recording when there
+        are at most `max_values`, else `max_values` evenly spaced percentiles
+        """
+        if self.count <= max_values:
+            values = []
+            for bucket in sorted(self.counts):
+                value = min(max(self._bucket_value(bucket), self.min), self.max)
+                values += [value * scale] * self.counts[bucket]
+            return values
+        return [self.percentile(100 * (i + 1) / max_values) * scale for i in range(max_values)]
+
+    def summary(self, scale: float = 1.0) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum * scale,
+            "min": (self.min if self.count else 0.0) * scale,
+            "max": self.max * scale,
+            "p50": self.percentile(50) * scale,
+            "p90": self.percentile(90) * scale,
+            "p99": self.percentile(99) * scale,
+        }
+
+
+class StreamingInstrumentation:
+    """
+    Opt-in latency instrumentation of a streamed generation
+
+    Pass the same instance to `BedrockStreamingCallback`, `MessageDeliveryService` and
+    `WebSocketPublisher` to record, with monotonic `time.perf_counter` timestamps:
+
+    - TimeToFirstToken: from `on_llm_start` to the first token
+    - InterTokenGap: between consecutive tokens
+    - Clean: cleaning the answer for a frame, `snapshot` or `clean_answer` for the END frame
+    - Encode: encoding a frame
+    - FrameProcessing: building a frame, cleaning and encoding
+    - Publish: posting a payload to all publishers of the service
+    - PostToConnection: one `post_to_connection` call
+
+    The callback writes a CloudWatch Embedded Metric Format record to stdout once the END frame was
+    posted, see `emf_record`. Without an instrumentation, none of these timestamps are taken.
+
+    Parameters:
+        namespace (str, optional): CloudWatch namespace of the metrics.
+        dimensions (Mapping[str, str], optional): Dimensions of the metrics, e.g. the model id.
+        stream (IO, optional): Where records are written. Defaults to stdout.
+    """
+
+    METRICS = (
+        "TimeToFirstToken",
+        "InterTokenGap",
+        "Clean",
+        "Encode",
+        "FrameProcessing",
+        "Publish",
+        "PostToConnection",
+    )
+
+    def __init__(
+        self,
+        namespace: str = "StreamingLambdaLayers",
+        dimensions: Optional[Mapping[str, str]] = None,
+        stream: Optional[IO[str]] = None,
+    ) -> None:
+        self.namespace = namespace
+        self.dimensions = dict(dimensions or {})
+        self.stream = stream
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget all recorded timings and timestamps
+        """
+        with self._lock:
+            self.histograms = {name: LatencyHistogram() for name in self.METRICS}
+            self.tokens = 0
+            self.started_at: Optional[float] = None
+            self.first_token_at: Optional[float] = None
+            self.last_token_at: Optional[float] = None
+            self.ended_at: Optional[float] = None
+
+    def start(self, now: Optional[float] = None) -> None:
+        """
+        Start a new generation, resetting the recorded timings
+        """
+        self.reset()
+        self.started_at = time.perf_counter() if now is None else now
+
+    def token(self, now: float) -> None:
+        """
+        Record the arrival of a token at `now`, a `time.perf_counter` timestamp
+        """
+        with self._lock:
+            self.tokens += 1
+            if self.last_token_at is None:
+                self.first_token_at = now
+                if self.started_at is not None:
+                    self.histograms["TimeToFirstToken"].record(now - self.started_at)
+            else:
+                self.histograms["InterTokenGap"].record(now - self.last_token_at)
+            self.last_token_at = now
+
+    def record(self, metric: str, seconds: float) -> None:
+        """
+        Record a duration of one of METRICS
+        """
+        with self._lock:
+            self.histograms[metric].record(seconds)
+
+    def end(self, now: Optional[float] = None) -> None:
+        self.ended_at = time.perf_counter() if now is None else now
+
+    def emf_record(self) -> dict:
+        """
+        CloudWatch Embedded Metric Format record of the recorded timings, in milliseconds
+
+        Every metric with recordings is emitted with the values describing its distribution, see
+        `LatencyHistogram.values`, and a `<metric>Summary` property holds its exact count, sum, min
+        and max and its percentiles.
+        """
+        with self._lock:
+            histograms = {name: histogram for name, histogram in self.histograms.items() if histogram.count}
+            record = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": self.namespace,
+                            "Dimensions": [list(self.dimensions)],
+                            "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in histograms]
+                            + [{"Name": "Tokens", "Unit": "Count"}],
+                        }
+                    ],
+                },
+                **self.dimensions,
+                "Tokens": self.tokens,
+            }
+            for name, histogram in histograms.items():
+                record[name] = histogram.values(scale=1000)
+                record[f"{name}Summary"] = histogram.summary(scale=1000)
+            if self.started_at is not None and self.ended_at is not None:
+                record["GenerationMs"] = (self.ended_at - self.started_at) * 1000
+        return record
+
+    def emit(self) -> dict:
+        """
+        Write the EMF record as one line, which the Lambda runtime forwards to CloudWatch Logs
+        """
+        record = self.emf_record()
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record) + "\n")
+        stream.flush()
+        return record
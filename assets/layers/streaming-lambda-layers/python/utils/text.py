@@ -1,6 +1,6 @@
 import re
-from functools import partial, reduce
-from typing import List, Optional
+from functools import lru_cache
+from typing import Iterable, List, Optional
 
 EXCLUDED_CHARACTERS = ["™", "®", "©"]
 EXCLUDED_LEADING_CHARS = ["#", "*"]
@@ -71,23 +71,109 @@ def clean_text_snippet(
     str
         Cleaned text snippet
     """
-    leading_sequence = LEADING_SEQUENCE if add_dots_on_start else ""
-    trailing_sequence = TRAILING_SEQUENCE if add_dots_on_end else ""
-    return reduce(
-        lambda x, f: f(x),
-        [
-            text,
-            partial(remove_excluded_characters, excluded_chars=EXCLUDED_CHARACTERS),
-            partial(
-                remove_leading_non_alphanumeric_chars,
-                remove_only_excluded_chars=remove_only_excluded_leading_chars,
-            ),
-            lambda x: x.rstrip(),
-            remove_multi_consecutive_whitespaces if remove_consecutive_spaces else lambda x: x,
-            lambda x: x[slice(None, max_length, None)],
-            partial(add_leading_sequence, seq=leading_sequence, append=False),
-            partial(add_trailing_sequence, seq=trailing_sequence, append=True),
-        ],
+    return get_text_normalizer(
+        add_dots_on_start=add_dots_on_start,
+        add_dots_on_end=add_dots_on_end,
+        remove_consecutive_spaces=remove_consecutive_spaces,
+        remove_only_excluded_leading_chars=remove_only_excluded_leading_chars,
+        max_length=max_length,
+    )(text)
+
+
+class TextNormalizer:
+    """
+    Precompiled `clean_text_snippet`, configured once with the same options and producing the same output
+
+    Excluded characters are removed with one `str.translate` call, leading characters with one
+    anchored match, and consecutive whitespaces with one precompiled substitution.
+
+    Parameters
+    ----------
+    add_dots_on_start : bool, by default False
+        Whether to add two dots in the start of the snippet
+    add_dots_on_end : bool, by default True
+        Whether to add three dots in the end of the snippet
+    remove_consecutive_spaces : bool, by default True
+        Whether to remove consecutive whitespaces and line breaks
+    remove_only_excluded_leading_chars : bool, by default True
+        Whether to remove only specific leading non-alphanumeric characters
+    max_length : None
+        Maximum no. characters in the text snippet, by default None
+    """
+
+    _EXCLUDED_TABLE = str.maketrans("", "", "".join(EXCLUDED_CHARACTERS))
+    _EXCLUDED_LEADING_PATTERN = re.compile(f"[{''.join(EXCLUDED_LEADING_CHARS)}]+")
+    _NON_ALPHANUMERIC_PATTERN = re.compile(r"\W+")
+    _CONSECUTIVE_WHITESPACE_PATTERN = re.compile(r"(\s)\s+")
+
+    def __init__(
+        self,
+        add_dots_on_start: Optional[bool] = False,
+        add_dots_on_end: Optional[bool] = True,
+        remove_consecutive_spaces: Optional[bool] = True,
+        remove_only_excluded_leading_chars: Optional[bool] = True,
+        max_length: Optional[int] = None,
+    ):
+        self.leading_sequence = LEADING_SEQUENCE if add_dots_on_start else ""
+        self.trailing_sequence = TRAILING_SEQUENCE if add_dots_on_end else ""
+        self.remove_consecutive_spaces = remove_consecutive_spaces
+        self.max_length = max_length
+        self._leading_pattern = (
+            self._EXCLUDED_LEADING_PATTERN if remove_only_excluded_leading_chars else self._NON_ALPHANUMERIC_PATTERN
+        )
+
+    def __call__(self, text: str) -> str:
+        """
+        Clean a text snippet, see `clean_text_snippet`
+        """
+        text = text.translate(self._EXCLUDED_TABLE)
+        leading = self._leading_pattern.match(text)
+        if leading:
+            text = text[leading.end() :]
+        text = text.rstrip()
+        if self.remove_consecutive_spaces:
+            text = self._CONSECUTIVE_WHITESPACE_PATTERN.sub(r"\1", text)
+        if self.max_length is not None:
+            text = text[: self.max_length]
+        if self.leading_sequence:
+            text = self.leading_sequence + text[len(self.leading_sequence) :]
+        return text + self.trailing_sequence
+
+    def clean_batch(self, texts: Iterable[str]) -> List[str]:
+        """
+        Clean a list of text snippets, e.g. the sentences of an answer
+
+        Parameters
+        ----------
+        texts : Iterable[str]
+            Text snippets to be cleaned
+
+        Returns
+        -------
+        List[str]
+            Cleaned text snippets, in the same order
+        """
+        clean = self.__call__
+        return [clean(text) for text in texts]
+
+
+@lru_cache(maxsize=32)
+def get_text_normalizer(
+    add_dots_on_start: Optional[bool] = False,
+    add_dots_on_end: Optional[bool] = True,
+    remove_consecutive_spaces: Optional[bool] = True,
+    remove_only_excluded_leading_chars: Optional[bool] = True,
+    max_length: Optional[int] = None,
+) -> TextNormalizer:
+    """
+    Return a shared `TextNormalizer` for the given options, see `clean_text_snippet`
+    """
+    return TextNormalizer(
+        add_dots_on_start=add_dots_on_start,
+        add_dots_on_end=add_dots_on_end,
+        remove_consecutive_spaces=remove_consecutive_spaces,
+        remove_only_excluded_leading_chars=remove_only_excluded_leading_chars,
+        max_length=max_length,
     )
 
 
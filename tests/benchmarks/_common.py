@@ -0,0 +1,82 @@
+"""
+Shared helpers for the benchmark scripts in this directory
+
+Benchmarks are plain scripts, run from the repository root, e.g.
+    python tests/benchmarks/bench_streaming_cleaner.py
+"""
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+LAYER_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "assets", "layers", "streaming-lambda-layers", "python")
+)
+if LAYER_PATH not in sys.path:
+    sys.path.insert(0, LAYER_PATH)
+
+# for the fakes shared with the unit tests
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
+WORDS = (
+    "the model streams an answer to the user over a websocket connection while the lambda function "
+    "keeps running and every token is cleaned before it is posted to api gateway as a json frame"
+).split()
+
+
+def synthetic_tokens(n_tokens: int, seed: int = 0) -> List[str]:
+    """
+    Build a reproducible LLM-like token stream of `n_tokens` word pieces
+    """
+    rng = random.Random(seed)
+    tokens = []
+    for i in range(n_tokens):
+        token = " " + rng.choice(WORDS)
+        if rng.random() < 0.05:
+            token += rng.choice([".", ",", ".\n"])
+        tokens.append(token)
+    return tokens
+
+
+def synthetic_context(n_bytes: int, seed: int = 1) -> str:
+    """
+    Build a reproducible retrieved context of about `n_bytes` characters
+    """
+    # vary the vocabulary a little so that the context is not a handful of repeated words
+    rng = random.Random(seed)
+    words = []
+    size = 0
+    for token in synthetic_tokens(n_bytes // 4, seed):
+        word = token + (str(rng.randint(0, 500)) if rng.random() < 0.2 else "")
+        words.append(word)
+        size += len(word)
+        if size >= n_bytes:
+            break
+    return "".join(words)
+
+
+def best_of(function: Callable[[], object], repeat: int = 3) -> float:
+    """
+    Return the best wall-clock time in seconds of `repeat` calls of `function`
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_table(title: str, header: List[str], rows: List[List[object]]) -> None:
+    """
+    Print benchmark results as an aligned text table
+    """
+    rows = [[f"{cell:.3f}" if isinstance(cell, float) else str(cell) for cell in row] for row in rows]
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    print(title)
+    for row in [header] + rows:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+    print()
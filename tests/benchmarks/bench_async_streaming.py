@@ -0,0 +1,94 @@
+"""
+Per-token overhead of the sync and asyncio streaming paths, driving a fake streaming chat model with
+`astream`: the sync `BedrockStreamingCallback` (run by LangChain on a thread executor, posting with a
+blocking `publish`) versus `AsyncBedrockStreamingCallback` (awaited on the event loop, posting with
+`apublish`). The publisher waits `latency` per frame like a post to API Gateway, sleeping the worker
+thread on the sync path and awaiting on the async path. The overhead is the time per token above a
+stream without callback. The last column runs 8 streams concurrently on one event loop.
+"""
+import asyncio
+import time
+
+from _common import print_table, synthetic_tokens
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from messaging.publishers.base import BasePublisher
+from messaging.service import MessageDeliveryService
+from model.streaming import AsyncBedrockStreamingCallback, BedrockStreamingCallback
+
+N_TOKENS = 500
+CONCURRENT_STREAMS = 8
+
+
+class LatencyPublisher(BasePublisher):
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.frames = 0
+
+    def publish(self, payload) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        self.frames += 1
+
+    async def apublish(self, payload) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.frames += 1
+
+
+def make_callback(kind, latency):
+    if kind is None:
+        return None
+    service = MessageDeliveryService()
+    service.attach(LatencyPublisher(latency))
+    return kind(service)
+
+
+async def run_stream(answer, kind, latency):
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content=answer)]))
+    callback = make_callback(kind, latency)
+    config = {"callbacks": [callback]} if callback is not None else {}
+    async for _ in llm.astream("question", config=config):
+        pass
+
+
+async def run_streams(answer, kind, latency, n_streams):
+    await asyncio.gather(*(run_stream(answer, kind, latency) for _ in range(n_streams)))
+
+
+def per_token(answer, kind, latency, n_streams=1):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        asyncio.run(run_streams(answer, kind, latency, n_streams))
+        best = min(best, time.perf_counter() - start)
+    return best / (N_TOKENS * n_streams)
+
+
+def main():
+    # the fake model streams whitespace separated words, each one a token
+    answer = "".join(synthetic_tokens(N_TOKENS)).strip()
+    rows = []
+    for latency in (0.0, 0.002):
+        baseline = per_token(answer, None, latency)
+        baseline_concurrent = per_token(answer, None, latency, CONCURRENT_STREAMS)
+        for name, kind in (("sync", BedrockStreamingCallback), ("async", AsyncBedrockStreamingCallback)):
+            rows.append(
+                [
+                    latency * 1e3,
+                    name,
+                    (per_token(answer, kind, latency) - baseline) * 1e6,
+                    (per_token(answer, kind, latency, CONCURRENT_STREAMS) - baseline_concurrent) * 1e6,
+                ]
+            )
+    print_table(
+        f"Callback overhead per token with astream, {N_TOKENS} tokens (us)",
+        ["publish latency ms", "callback", "1 stream", f"{CONCURRENT_STREAMS} streams"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Throughput of batch relevance scoring with `calculate_relevance_scores`, in this process and with
+process pools of increasing size, against scoring one triple at a time with `calculate_relevance_score`.
+"""
+import argparse
+import os
+import time
+
+from _common import print_table, synthetic_context, synthetic_tokens
+
+from model.postprocess import calculate_relevance_score, calculate_relevance_scores
+
+
+def triples(n_triples, contexts):
+    # generated lazily and grouped by context, like a nightly job reading its dataset
+    for i in range(n_triples):
+        answer = "".join(synthetic_tokens(60, i))
+        yield answer, contexts[i * len(contexts) // n_triples], "how are tokens streamed to the user"
+
+
+def throughput(score, n_triples):
+    start = time.perf_counter()
+    count = sum(1 for _ in score())
+    assert count == n_triples
+    return n_triples / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--triples", type=int, default=20_000)
+    parser.add_argument("--contexts", type=int, default=500, help="distinct contexts in the batch")
+    parser.add_argument("--context-bytes", type=int, default=2000)
+    parser.add_argument("--method", default="TOKEN_INTERSECTION", choices=["WORD_RELEVANCE", "TOKEN_INTERSECTION"])
+    parser.add_argument(
+        "--processes", type=int, nargs="*", default=[p for p in (2, 4, 8) if p <= (os.cpu_count() or 1)],
+        help="process pool sizes, by default up to the number of cores",
+    )
+    args = parser.parse_args()
+
+    contexts = [synthetic_context(args.context_bytes, seed) for seed in range(args.contexts)]
+    n = args.triples
+
+    def one_at_a_time():
+        return (calculate_relevance_score(a, c, question=q, method=args.method) for a, c, q in triples(n, contexts))
+
+    rows = [["one call per triple", 1, throughput(one_at_a_time, n)]]
+    for processes in [None] + args.processes:
+        def batch():
+            return calculate_relevance_scores(triples(n, contexts), args.method, processes=processes)
+
+        rows.append(["calculate_relevance_scores", processes or 1, throughput(batch, n)])
+    for row in rows:
+        row.append(row[2] / row[1])
+    print_table(
+        f"{args.method} on {n} triples, {args.contexts} distinct {args.context_bytes} byte contexts",
+        ["scoring", "processes", "triples/s", "triples/s per core"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Throughput of `compute_bleu` on an offline evaluation corpus of answer/context pairs, counting
+n-grams with Counters of token tuples (engine="python") versus NumPy n-gram ids (engine="numpy").
+"""
+import argparse
+import time
+
+from _common import print_table, synthetic_context, synthetic_tokens
+
+from model.relevance.bleu import compute_bleu
+from model.relevance.tokenizer import Tokenizer13a
+
+
+def corpus(n_pairs, context_bytes):
+    tokenizer = Tokenizer13a()
+    references = [[tokenizer(synthetic_context(context_bytes, seed))] for seed in range(n_pairs)]
+    translations = [tokenizer("".join(synthetic_tokens(60, seed))) for seed in range(n_pairs)]
+    return references, translations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--context-bytes", type=int, default=2000, help="size of each context")
+    args = parser.parse_args()
+
+    rows = []
+    for n_pairs in (100, 1000, 5000):
+        references, translations = corpus(n_pairs, args.context_bytes)
+        timings = {}
+        for engine in ("python", "numpy"):
+            start = time.perf_counter()
+            scores = compute_bleu(references, translations, engine=engine)
+            timings[engine] = time.perf_counter() - start
+        assert compute_bleu(references, translations) == scores
+        rows.append([
+            n_pairs,
+            n_pairs / timings["python"],
+            n_pairs / timings["numpy"],
+            timings["python"] / timings["numpy"],
+        ])
+    print_table(
+        f"compute_bleu throughput with {args.context_bytes} byte contexts (pairs/s)",
+        ["pairs", "python", "numpy", "speedup"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Per-invocation setup time of a WebSocket publisher and a Bedrock runtime client, creating new boto3
+clients on every invocation versus reusing them from the client registry.
+"""
+import os
+import time
+
+from _common import print_table
+
+import boto3
+
+from messaging.publishers.websocket import WebSocketPublisher
+from utils.clients import CLIENT_REGISTRY, get_client
+
+ENDPOINT = "https://example.execute-api.us-west-2.amazonaws.com/prod"
+INVOCATIONS = 50
+
+
+def fresh_clients():
+    WebSocketPublisher(ENDPOINT, "connection", client=boto3.client("apigatewaymanagementapi", endpoint_url=ENDPOINT))
+    boto3.client("bedrock-runtime", region_name="us-west-2")
+
+
+def registry_clients():
+    WebSocketPublisher(ENDPOINT, "connection")
+    get_client("bedrock-runtime", region_name="us-west-2")
+
+
+def per_invocation(setup):
+    setup()  # the cold invocation
+    start = time.perf_counter()
+    for _ in range(INVOCATIONS):
+        setup()
+    return (time.perf_counter() - start) / INVOCATIONS
+
+
+def main():
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+    rows = [
+        ["new boto3 clients", per_invocation(fresh_clients) * 1e3],
+        ["client registry", per_invocation(registry_clients) * 1e3],
+    ]
+    print_table("Warm invocation setup time (ms)", ["clients", "setup"], rows)
+    print(f"registry hits={CLIENT_REGISTRY.hits} misses={CLIENT_REGISTRY.misses}")
+
+
+if __name__ == "__main__":
+    main()
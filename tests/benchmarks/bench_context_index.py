@@ -0,0 +1,53 @@
+"""
+Cost of scoring many answers against one 50 KB retrieved context with `check_relevance` and
+`check_token_intersection`, passing the raw context string on every call versus a `ContextIndex`
+built once per context.
+"""
+import argparse
+import time
+
+from _common import print_table, synthetic_context, synthetic_tokens
+
+from model.postprocess import check_relevance, check_token_intersection
+from model.relevance.context_index import ContextIndex
+
+CONTEXT_BYTES = 50_000
+
+
+def per_answer(score, context, answers):
+    start = time.perf_counter()
+    for answer in answers:
+        score(context, answer)
+    return (time.perf_counter() - start) / len(answers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--answers", type=int, default=50, help="answers scored against the context")
+    args = parser.parse_args()
+
+    context = synthetic_context(CONTEXT_BYTES)
+    answers = ["".join(synthetic_tokens(80, seed)) for seed in range(args.answers)]
+    methods = {
+        "check_relevance": lambda context, answer: check_relevance(context, answer[:200], answer),
+        "check_token_intersection": check_token_intersection,
+    }
+
+    rows = []
+    for name, score in methods.items():
+        raw = per_answer(score, context, answers)
+        start = time.perf_counter()
+        index = ContextIndex(context)
+        score(index, answers[0])  # builds the parts of the index the method uses
+        build = time.perf_counter() - start
+        indexed = per_answer(score, index, answers)
+        rows.append([name, raw * 1e3, build * 1e3, indexed * 1e3, raw / indexed])
+    print_table(
+        f"Scoring 80-token answers against a {len(context) // 1000} KB context (ms)",
+        ["method", "raw context/answer", "index build", "indexed/answer", "speedup"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
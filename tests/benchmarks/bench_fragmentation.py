@@ -0,0 +1,66 @@
+"""
+Throughput of splitting large frames into API Gateway sized fragments with `PayloadFragmenter`, and of
+posting them through `WebSocketPublisher` to an in-process endpoint that enforces the 32 KB frame limit.
+"""
+from _common import best_of, print_table, synthetic_tokens
+
+from messaging.fragments import MAX_FRAME_BYTES, FragmentAssembler, PayloadFragmenter
+from messaging.frames import FrameEncoder
+from messaging.publishers.websocket import WebSocketPublisher
+from utils.enums import WebSocketMessageTypes as wsst
+
+
+class FrameLimitedEndpoint:
+    """Minimal `apigatewaymanagementapi` client that only checks the frame size"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def post_to_connection(self, Data, ConnectionId):
+        if len(Data) > MAX_FRAME_BYTES:
+            raise ValueError(f"PayloadTooLarge: {len(Data)} bytes")
+        self.frames += 1
+        self.bytes += len(Data)
+
+
+def repeat(function, n=20):
+    for _ in range(n):
+        function()
+
+
+def main():
+    fragmenter = PayloadFragmenter()
+    rows = []
+    for n_kib in (100, 250, 1000):
+        message = "".join(synthetic_tokens(n_kib * 1024 // 5))[: n_kib * 1024] + "..."
+        payload = FrameEncoder().encode(wsst.STREAM, message)
+        frames = fragmenter.split(payload)
+        assembler = FragmentAssembler()
+        assert [assembler.add(frame) for frame in frames][-1] == payload
+
+        endpoint = FrameLimitedEndpoint()
+        publisher = WebSocketPublisher("https://example.com", "abc", client=endpoint)
+        split_time = best_of(lambda: repeat(lambda: fragmenter.split(payload)), repeat=5) / 20
+        publish_time = best_of(lambda: repeat(lambda: publisher.publish(payload)), repeat=5) / 20
+        overhead = sum(len(frame) for frame in frames) / len(payload) - 1
+        rows.append(
+            [
+                n_kib,
+                len(frames),
+                overhead * 100,
+                split_time * 1e3,
+                len(payload) / split_time / 2**20,
+                publish_time * 1e3,
+                len(payload) / publish_time / 2**20,
+            ]
+        )
+    print_table(
+        "Fragmenting STREAM frames for the 32 KB frame limit",
+        ["answer KiB", "fragments", "header %", "split ms", "split MiB/s", "publish ms", "publish MiB/s"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
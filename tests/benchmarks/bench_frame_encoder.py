@@ -0,0 +1,52 @@
+"""
+Time to serialize a STREAM frame of a growing answer: `json.dumps` followed by `.encode("utf-8")` as the
+callback and publisher used to do, and `FrameEncoder` with and without orjson. The last table is the
+total encoding time of all frames of a stream when every token is posted as its own frame.
+"""
+import json
+
+from _common import best_of, print_table, synthetic_tokens
+
+from messaging.frames import FrameEncoder
+from utils.enums import WebSocketMessageFields as wssm
+from utils.enums import WebSocketMessageTypes as wsst
+
+
+def dumps_and_encode(message):
+    return json.dumps({wssm.MESSAGE: message, wssm.TYPE: wsst.STREAM}).encode("utf-8")
+
+
+def main():
+    stdlib = FrameEncoder(use_orjson=False)
+    encoders = [("json.dumps", dumps_and_encode), ("FrameEncoder", lambda m: stdlib.encode(wsst.STREAM, m))]
+    if FrameEncoder().uses_orjson:
+        fast = FrameEncoder(use_orjson=True)
+        encoders.append(("FrameEncoder+orjson", lambda m: fast.encode(wsst.STREAM, m)))
+    else:
+        print("orjson is not installed, skipping FrameEncoder+orjson\n")
+
+    rows = []
+    for n_chars in (100, 1_000, 10_000, 100_000):
+        message = "".join(synthetic_tokens(n_chars // 5))[:n_chars] + "..."
+        assert len({encode(message) for _, encode in encoders}) == 1
+        rows.append([n_chars] + [best_of(lambda: [encode(message) for _ in range(100)], repeat=5) * 1e4 for _, encode in encoders])
+    print_table("STREAM frame encoding time per frame (us)", ["answer chars"] + [name for name, _ in encoders], rows)
+
+    rows = []
+    for n_tokens in (500, 2_000, 8_000):
+        tokens = synthetic_tokens(n_tokens)
+        answers = []
+        answer = ""
+        for token in tokens:
+            answer += token
+            answers.append(answer + "...")
+        total_bytes = sum(len(a) for a in answers)
+        rows.append(
+            [n_tokens, total_bytes // 1024]
+            + [best_of(lambda: [encode(a) for a in answers], repeat=3) * 1e3 for _, encode in encoders]
+        )
+    print_table("Encoding all frames of a stream, one frame per token (ms)", ["tokens", "KiB"] + [name for name, _ in encoders], rows)
+
+
+if __name__ == "__main__":
+    main()
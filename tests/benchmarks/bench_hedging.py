@@ -0,0 +1,82 @@
+"""
+Time to first token with and without hedging, on scripted models whose first token latency has a long
+tail like the cross-region Bedrock inference profiles: most requests answer after ~20ms, 8% after
+200-600ms (real latencies divided by ten). Every request races two independent draws, the primary
+and the alternate `HedgedChatModel` hedges with once `hedge_delay_ms` passed without a token. The
+extra requests column is the share of requests that were hedged.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import print_table
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from providers.hedging import HedgedChatModel
+from tests.unit.fakes import ScriptedChatModel
+
+N_REQUESTS = 400
+CONCURRENCY = 32
+TOKENS = [" token"] * 20
+
+
+def first_token_delay(rng: random.Random) -> float:
+    if rng.random() < 0.08:
+        return rng.uniform(0.2, 0.6)
+    return rng.lognormvariate(-3.9, 0.3)
+
+
+class FirstTokenTimer(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.first_token_at = None
+
+    def on_llm_new_token(self, token, **kwargs) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+
+def time_to_first_token(seed: int, hedge_delay_ms):
+    """Time to first token of a request and whether it was hedged"""
+    rng = random.Random(seed)
+    primary = ScriptedChatModel(tokens=TOKENS, first_token_delay=first_token_delay(rng))
+    alternate = ScriptedChatModel(tokens=TOKENS, first_token_delay=first_token_delay(rng))
+    llm = primary
+    if hedge_delay_ms is not None:
+        llm = HedgedChatModel(llms=[primary, alternate], hedge_delay_ms=hedge_delay_ms)
+    timer = FirstTokenTimer()
+    for _ in llm.stream("hi", config={"callbacks": [timer]}):
+        pass
+    return timer.first_token_at - timer.start, llm is not primary and llm.stats.hedged_requests > 0
+
+
+def percentile(values, q):
+    return sorted(values)[max(0, round(q / 100 * len(values)) - 1)]
+
+
+def main():
+    rows = []
+    for hedge_delay_ms in (None, 100, 60, 40):
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+            results = list(executor.map(lambda seed: time_to_first_token(seed, hedge_delay_ms), range(N_REQUESTS)))
+        ttfts = [ttft for ttft, _ in results]
+        hedged = sum(1 for _, was_hedged in results if was_hedged)
+        rows.append(
+            [
+                "off" if hedge_delay_ms is None else hedge_delay_ms,
+                percentile(ttfts, 50) * 1e3,
+                percentile(ttfts, 90) * 1e3,
+                percentile(ttfts, 99) * 1e3,
+                hedged / N_REQUESTS * 100,
+            ]
+        )
+    print_table(
+        f"Time to first token over {N_REQUESTS} requests (ms)",
+        ["hedge delay ms", "p50", "p90", "p99", "extra requests %"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Cost of the streaming latency instrumentation: time per token of a full stream, callback, delivery
+service and `WebSocketPublisher` posting to an in-process client, without instrumentation and with a
+`StreamingInstrumentation` shared by all three. Without instrumentation, the only cost left is an
+`is not None` check per stage, whose time per token is measured on its own and compared to the time
+per token of the stream.
+"""
+import io
+import timeit
+
+from _common import best_of, print_table, synthetic_tokens
+
+from messaging.publishers.websocket import WebSocketPublisher
+from messaging.service import MessageDeliveryService
+from model.streaming import BedrockStreamingCallback
+from utils.instrumentation import StreamingInstrumentation
+
+N_TOKENS = 2000
+
+# checks per token without coalescing: one for the token, three for its frame, one in `post` and one
+# around `post_to_connection`
+CHECKS_PER_TOKEN = 6
+
+
+class NullEndpoint:
+    def post_to_connection(self, Data, ConnectionId):
+        pass
+
+
+def run_stream(tokens, instrumentation, **kwargs):
+    service = MessageDeliveryService(instrumentation=instrumentation)
+    publisher = WebSocketPublisher("https://example.com", "abc", client=NullEndpoint(), instrumentation=instrumentation)
+    service.attach(publisher)
+    callback = BedrockStreamingCallback(service, instrumentation=instrumentation, **kwargs)
+    callback.on_llm_start({}, [])
+    for token in tokens:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+
+
+def main():
+    tokens = synthetic_tokens(N_TOKENS)
+    instrumentation = StreamingInstrumentation(stream=io.StringIO())
+    checks = timeit.timeit("instrumentation is not None", globals={"instrumentation": None}, number=1_000_000) / 1e6
+
+    rows = []
+    for name, kwargs in (("every token", {}), ("coalesced", {"coalesce": True, "max_latency_ms": 10_000})):
+        disabled = best_of(lambda: run_stream(tokens, None, **kwargs), repeat=5) / N_TOKENS
+        enabled = best_of(lambda: run_stream(tokens, instrumentation, **kwargs), repeat=5) / N_TOKENS
+        rows.append(
+            [
+                name,
+                disabled * 1e6,
+                enabled * 1e6,
+                (enabled - disabled) * 1e6,
+                checks * CHECKS_PER_TOKEN * 1e9,
+                checks * CHECKS_PER_TOKEN / disabled * 100,
+            ]
+        )
+    print_table(
+        f"Streaming instrumentation overhead, {N_TOKENS} tokens",
+        ["frames", "disabled us/token", "enabled us/token", "enabled cost us", "disabled checks ns", "checks %"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Per-request LLM setup time for Bedrock and OpenAI models, building a new chat model with the streaming
+callback baked in on every request versus reusing a cached model and passing the callback at invoke time.
+"""
+import os
+import time
+
+from _common import print_table
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from factories.provider_factory import ProviderFactory
+from providers.llm_cache import LLM_CACHE
+
+MODELS = ["CLAUDE_3_HAIKU", "GPT_4O_MINI"]
+REQUESTS = 50
+
+
+def fresh_llm(model_name):
+    factory = ProviderFactory(model_name, streaming_callback=BaseCallbackHandler(), api_key="sk-benchmark")
+    factory.get_provider().get_llm()
+
+
+def cached_llm(model_name):
+    factory = ProviderFactory(model_name, api_key="sk-benchmark")
+    factory.get_cached_llm()
+
+
+def per_request(setup, model_name):
+    setup(model_name)  # the cold invocation
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        setup(model_name)
+    return (time.perf_counter() - start) / REQUESTS
+
+
+def main():
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+    rows = []
+    for model_name in MODELS:
+        fresh = per_request(fresh_llm, model_name)
+        cached = per_request(cached_llm, model_name)
+        rows.append([model_name, fresh * 1e3, cached * 1e3, fresh / cached])
+    print_table("Per-request LLM setup time (ms)", ["model", "new LLM", "cached LLM", "speedup"], rows)
+    print(f"cache hits={LLM_CACHE.hits} misses={LLM_CACHE.misses} evictions={LLM_CACHE.evictions}")
+
+
+if __name__ == "__main__":
+    main()
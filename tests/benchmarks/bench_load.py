@@ -0,0 +1,203 @@
+"""
+End-to-end load harness of the streaming stack: N concurrent sessions, each streaming a generation
+through `BedrockStreamingCallback`, `MessageDeliveryService` and `WebSocketPublisher` to a local HTTP
+stand-in for the `apigatewaymanagementapi` endpoint, `FakeApiGatewayServer`, posted to by a real boto3
+client. The endpoint runs in its own process, so the CPU time per token is the one of the streaming
+stack, and can add latency per post and answer GoneException for a share of the sessions.
+
+Sessions stream from a fake chat model with a configurable token rate and length, or from the model
+built by `ProviderFactory` with `--model`, which needs credentials for the provider. The report is
+printed as JSON so runs can be compared, e.g.
+    python tests/benchmarks/bench_load.py --sessions 16 --latency-ms 5 --output before.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional
+
+from _common import synthetic_tokens
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from messaging.publishers.websocket import BackgroundWebSocketPublisher, WebSocketPublisher
+from messaging.service import MessageDeliveryService
+from model.streaming import BedrockStreamingCallback
+from tests.unit.fakes import FakeApiGatewayServer
+from utils.clients import get_client
+from utils.instrumentation import LatencyHistogram, StreamingInstrumentation
+
+
+class RateLimitedFakeChatModel(BaseChatModel):
+    """Fake chat model streaming `n_tokens` synthetic tokens at `tokens_per_second`, 0 for no limit"""
+
+    n_tokens: int = 500
+    tokens_per_second: float = 0.0
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "rate-limited-fake"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        content = "".join(synthetic_tokens(self.n_tokens, self.seed))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        for i, token in enumerate(synthetic_tokens(self.n_tokens, self.seed)):
+            if self.tokens_per_second:
+                delay = start + i / self.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def serve(connection, **kwargs) -> None:
+    """Run a `FakeApiGatewayServer` until the parent sends on `connection`, then send back its stats"""
+    with FakeApiGatewayServer(**kwargs) as server:
+        connection.send(server.endpoint_url)
+        connection.recv()
+        connection.send(server.stats())
+
+
+def make_llm(args, session: int):
+    if args.model:
+        from factories.provider_factory import ProviderFactory
+
+        return ProviderFactory(args.model).get_cached_llm()
+    return RateLimitedFakeChatModel(n_tokens=args.tokens, tokens_per_second=args.tokens_per_second, seed=session)
+
+
+def run_session(args, session: int, client: Any, endpoint_url: str) -> StreamingInstrumentation:
+    instrumentation = StreamingInstrumentation(stream=io.StringIO())
+    gone = session < round(args.sessions * args.gone_fraction)
+    connection_id = f"gone-{session}" if gone else f"session-{session}"
+    publisher_class = BackgroundWebSocketPublisher if args.background else WebSocketPublisher
+    publisher = publisher_class(endpoint_url, connection_id, client=client, instrumentation=instrumentation)
+    # concurrent, so that a GoneException detaches the publisher like in the handlers
+    service = MessageDeliveryService(concurrent=True, instrumentation=instrumentation)
+    service.attach(publisher)
+    callback = BedrockStreamingCallback(
+        service,
+        coalesce=args.coalesce,
+        max_latency_ms=args.max_latency_ms,
+        delta_frames=args.delta_frames,
+        instrumentation=instrumentation,
+    )
+    for _ in make_llm(args, session).stream("Tell me about streaming.", config={"callbacks": [callback]}):
+        pass
+    service.flush(timeout=60)
+    if args.background:
+        publisher.close()
+    return instrumentation
+
+
+def summary_ms(histogram: LatencyHistogram) -> dict:
+    return {"p50": histogram.percentile(50) * 1e3, "p99": histogram.percentile(99) * 1e3, "max": histogram.max * 1e3}
+
+
+def run(args) -> dict:
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(
+        target=serve,
+        args=(child,),
+        kwargs={"latency": args.latency_ms / 1e3, "gone_after": args.gone_after, "max_frame_bytes": 32 * 1024},
+        daemon=True,
+    )
+    server.start()
+    endpoint_url = parent.recv()
+    # one pooled connection per session, as every Lambda invocation posts on its own connection
+    client = get_client(
+        "apigatewaymanagementapi",
+        region_name="us-east-1",
+        endpoint_url=endpoint_url,
+        max_pool_connections=max(10, args.sessions),
+        max_attempts=1,
+    )
+
+    cpu_start, start = time.process_time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="session") as executor:
+        futures = [executor.submit(run_session, args, i, client, endpoint_url) for i in range(args.sessions)]
+        results = [future.exception() or future.result() for future in futures]
+    duration, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    parent.send("stop")
+    endpoint = parent.recv()
+    server.join()
+
+    instrumentations = [result for result in results if isinstance(result, StreamingInstrumentation)]
+    histograms = {name: LatencyHistogram() for name in StreamingInstrumentation.METRICS}
+    for instrumentation in instrumentations:
+        for name, histogram in instrumentation.histograms.items():
+            histograms[name].merge(histogram)
+    tokens = sum(instrumentation.tokens for instrumentation in instrumentations)
+    return {
+        "config": vars(args),
+        "completed_sessions": len(instrumentations),
+        "failed_sessions": [repr(result) for result in results if isinstance(result, BaseException)],
+        "tokens": tokens,
+        "frames": histograms["FrameProcessing"].count,
+        "endpoint": endpoint,
+        "duration_s": duration,
+        "tokens_per_s": tokens / duration,
+        "frames_per_s": endpoint["posted_frames"] / duration,
+        "cpu_us_per_token": cpu / max(tokens, 1) * 1e6,
+        "time_to_first_token_ms": summary_ms(histograms["TimeToFirstToken"]),
+        # time for the delivery service to post one frame, the time a frame adds to the stream
+        "frame_latency_ms": summary_ms(histograms["Publish"]),
+        "post_to_connection_ms": summary_ms(histograms["PostToConnection"]),
+        "frame_processing_ms": summary_ms(histograms["FrameProcessing"]),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--tokens", type=int, default=500, help="tokens per generation of the fake model")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="token rate, 0 for no limit")
+    parser.add_argument("--model", help="model name for ProviderFactory instead of the fake model")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency of every post to the endpoint")
+    parser.add_argument("--gone-fraction", type=float, default=0.0, help="share of sessions whose connection goes away")
+    parser.add_argument("--gone-after", type=int, default=10, help="frames posted before a connection goes away")
+    parser.add_argument("--coalesce", action="store_true", help="coalesce tokens into frames")
+    parser.add_argument("--max-latency-ms", type=float, default=50.0, help="coalescing latency budget")
+    parser.add_argument("--delta-frames", action="store_true", help="post DELTA frames")
+    parser.add_argument("--background", action="store_true", help="post with BackgroundWebSocketPublisher")
+    parser.add_argument("--output", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = json.dumps(run(args), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
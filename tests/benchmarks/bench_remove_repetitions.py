@@ -0,0 +1,44 @@
+"""
+Runtime of `remove_repetitions` with the word id engine versus the original string based
+implementation, on answers of up to 50k words with a few repetition loops.
+
+The original implementation is cubic in the answer length, so it is only measured up to
+`--legacy-max` words.
+"""
+import argparse
+import random
+
+from _common import WORDS, best_of, print_table
+
+from model.postprocess import remove_repetitions
+
+
+def synthetic_answer(n_words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    # LLMs that get stuck repeat whole phrases, add a few of those loops
+    for _ in range(max(1, n_words // 500)):
+        start = rng.randrange(n_words)
+        words[start:start] = words[start : start + rng.randint(2, 12)] * rng.randint(1, 4)
+    return " ".join(words[:n_words])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--legacy-max", type=int, default=300, help="largest size measured with legacy=True")
+    args = parser.parse_args()
+
+    rows = []
+    for n_words in (100, 300, 1000, 10000, 50000):
+        text = synthetic_answer(n_words)
+        legacy = (
+            best_of(lambda: remove_repetitions(text, legacy=True), repeat=1) * 1e3
+            if n_words <= args.legacy_max
+            else "skipped"
+        )
+        rows.append([n_words, legacy, best_of(lambda: remove_repetitions(text)) * 1e3])
+    print_table("remove_repetitions runtime (ms)", ["words", "legacy", "word ids"], rows)
+
+
+if __name__ == "__main__":
+    main()
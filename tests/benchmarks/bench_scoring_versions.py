@@ -0,0 +1,56 @@
+"""
+Cost of scoring answers against a 50 KB context with scoring version 1 (stopwords kept) and version 2
+(stopwords dropped per token by `TextAnalyzer`), with raw context strings and with a `ContextIndex`,
+along with the number of context n-grams each version counts.
+"""
+import argparse
+import time
+
+from _common import print_table, synthetic_context, synthetic_tokens
+
+from model.postprocess import calculate_relevance_score
+from model.relevance.context_index import ContextIndex
+
+
+def per_answer(context, answers, method, scoring_version):
+    start = time.perf_counter()
+    for answer in answers:
+        calculate_relevance_score(
+            answer, context, question=answer[:200], method=method, scoring_version=scoring_version
+        )
+    return (time.perf_counter() - start) / len(answers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--answers", type=int, default=20, help="answers scored against the context")
+    args = parser.parse_args()
+
+    context = synthetic_context(50_000)
+    answers = ["".join(synthetic_tokens(80, seed)) for seed in range(args.answers)]
+    rows = []
+    for method in ("WORD_RELEVANCE", "TOKEN_INTERSECTION"):
+        for scoring_version in (1, 2):
+            raw = per_answer(context, answers, method, scoring_version)
+            index = ContextIndex(context)
+            calculate_relevance_score(answers[0], index, answers[0], method, scoring_version)  # builds the index
+            indexed = per_answer(index, answers, method, scoring_version)
+            rows.append([method, scoring_version, raw * 1e3, indexed * 1e3])
+
+    index = ContextIndex(context)
+    index.ngram_precisions([])
+    index.analyzed_ngram_precisions([])
+    counted = {
+        1: sum(sum(counts.values()) for counts in index._ngram_counts.counts),
+        2: sum(sum(counts.values()) for counts in index._analyzed_ngram_counts.counts),
+    }
+    print_table(
+        "Scoring 80-token answers against a 50 KB context (ms per answer)",
+        ["method", "version", "raw context", "ContextIndex"],
+        rows,
+    )
+    print(f"context n-grams counted: version 1 {counted[1]}, version 2 {counted[2]}")
+
+
+if __name__ == "__main__":
+    main()
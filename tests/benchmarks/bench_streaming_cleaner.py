@@ -0,0 +1,50 @@
+"""
+Per-token cost of cleaning a streamed answer: `clean_answer` on the full text after every token
+versus `IncrementalAnswerCleaner`.
+
+The full `clean_answer` path is only measured up to `--full-max` tokens.
+"""
+import argparse
+import time
+
+from _common import print_table, synthetic_tokens
+
+from model.postprocess import IncrementalAnswerCleaner, clean_answer
+
+
+def full_cost_per_token(tokens):
+    # cost of the last token, i.e. of cleaning the whole answer once
+    text = "".join(tokens)
+    start = time.perf_counter()
+    clean_answer(text)
+    return time.perf_counter() - start
+
+
+def incremental_cost_per_token(tokens):
+    cleaner = IncrementalAnswerCleaner()
+    start = time.perf_counter()
+    for token in tokens:
+        cleaner.feed(token)
+        cleaner.snapshot()
+    return (time.perf_counter() - start) / len(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--full-max", type=int, default=8000, help="largest size measured with clean_answer")
+    args = parser.parse_args()
+
+    rows = []
+    for n_tokens in (100, 1000, 8000):
+        tokens = synthetic_tokens(n_tokens)
+        full = full_cost_per_token(tokens) * 1e3 if n_tokens <= args.full_max else "skipped"
+        rows.append([n_tokens, full, incremental_cost_per_token(tokens) * 1e3])
+    print_table(
+        "Per-token cleaning cost (ms)",
+        ["tokens", "clean_answer(full)", "incremental"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
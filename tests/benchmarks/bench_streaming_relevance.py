@@ -0,0 +1,66 @@
+"""
+Per-token overhead of scoring each sentence of a streamed answer against a 50 KB context while the
+answer streams, with `StreamingRelevanceScorer` on its own and inside `BedrockStreamingCallback`.
+"""
+import argparse
+import time
+
+from _common import print_table, synthetic_context, synthetic_tokens
+
+from messaging.publishers.base import BasePublisher
+from messaging.service import MessageDeliveryService
+from model.postprocess import StreamingRelevanceScorer
+from model.relevance.context_index import ContextIndex
+from model.streaming import BedrockStreamingCallback
+
+
+class NullPublisher(BasePublisher):
+    def publish(self, payload) -> None:
+        pass
+
+
+def callback_per_token(tokens, scorer=None):
+    service = MessageDeliveryService()
+    service.attach(NullPublisher())
+    callback = BedrockStreamingCallback(service, relevance_scorer=scorer)
+    callback.on_llm_start({}, [])
+    start = time.perf_counter()
+    for token in tokens:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+    return (time.perf_counter() - start) / len(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000, help="length of the streamed answer")
+    parser.add_argument("--budget-ms", type=float, default=0.1, help="scoring budget per token")
+    args = parser.parse_args()
+
+    tokens = synthetic_tokens(args.tokens, seed=7)
+    index = ContextIndex(synthetic_context(50_000))
+    rows = []
+    for method in ("TOKEN_INTERSECTION", "WORD_RELEVANCE"):
+        scorer = StreamingRelevanceScorer(index, question="how are tokens streamed", method=method)
+        scorer.feed("warm up the index.")
+        scorer.reset()
+        for token in tokens:
+            scorer.feed(token)
+        scorer.finish()
+        overhead = scorer.overhead_per_token * 1e3
+        without = callback_per_token(tokens)
+        scorer.reset()
+        with_scorer = callback_per_token(tokens, scorer)
+        rows.append([
+            method, len(scorer.scores), overhead, without * 1e3, with_scorer * 1e3,
+            "yes" if overhead <= args.budget_ms else "NO",
+        ])
+    print_table(
+        f"Sentence scoring while streaming {args.tokens} tokens (ms per token)",
+        ["method", "sentences", "scorer", "callback", "callback+scorer", f"within {args.budget_ms}ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Time to clean the sentences of an answer the way `split_into_sentences` does: the former step by step
+`clean_text_snippet` pipeline per sentence, `TextNormalizer` per sentence, and `TextNormalizer.clean_batch`.
+"""
+import re
+from functools import partial, reduce
+
+from _common import best_of, print_table, synthetic_tokens
+
+from utils.text import (
+    EXCLUDED_CHARACTERS,
+    TextNormalizer,
+    add_leading_sequence,
+    add_trailing_sequence,
+    remove_excluded_characters,
+    remove_leading_non_alphanumeric_chars,
+)
+
+SENTENCE_OPTIONS = dict(
+    add_dots_on_start=False,
+    add_dots_on_end=False,
+    remove_consecutive_spaces=False,
+    remove_only_excluded_leading_chars=False,
+)
+
+
+def pipeline(text):
+    # the reduce chain clean_text_snippet ran, with the options split_into_sentences uses
+    return reduce(
+        lambda x, f: f(x),
+        [
+            text,
+            partial(remove_excluded_characters, excluded_chars=EXCLUDED_CHARACTERS),
+            partial(remove_leading_non_alphanumeric_chars, remove_only_excluded_chars=False),
+            lambda x: x.rstrip(),
+            lambda x: x,
+            lambda x: x[slice(None, None, None)],
+            partial(add_leading_sequence, seq="", append=False),
+            partial(add_trailing_sequence, seq="", append=True),
+        ],
+    )
+
+
+def main():
+    normalizer = TextNormalizer(**SENTENCE_OPTIONS)
+    rows = []
+    for n_tokens in (100, 1000, 10000):
+        sentences = re.split(r"[.!?]\s*", "".join(synthetic_tokens(n_tokens)))
+        assert [pipeline(s) for s in sentences] == normalizer.clean_batch(sentences)
+        timings = [
+            best_of(lambda: [pipeline(s) for s in sentences], repeat=5),
+            best_of(lambda: [normalizer(s) for s in sentences], repeat=5),
+            best_of(lambda: normalizer.clean_batch(sentences), repeat=5),
+        ]
+        per_sentence = [t / len(sentences) * 1e6 for t in timings]
+        rows.append([n_tokens, len(sentences)] + per_sentence + [timings[0] / timings[2]])
+    print_table(
+        "Sentence cleaning time per sentence (us)",
+        ["tokens", "sentences", "pipeline", "TextNormalizer", "clean_batch", "speedup"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
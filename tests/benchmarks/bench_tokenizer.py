@@ -0,0 +1,44 @@
+"""
+13a tokenization time per line for answers and retrieved contexts: `Tokenizer13a` created per call,
+as the relevance checks used to, versus the shared `TOKENIZER_13A` without and with cache hits.
+"""
+from _common import best_of, print_table, synthetic_context
+
+from model.relevance.tokenizer import TOKENIZER_13A, CompiledTokenizer13a, Tokenizer13a
+
+SIZES = {"sentence": 200, "answer": 2_000, "context": 50_000}
+
+
+def main():
+    rows = []
+    for name, size in SIZES.items():
+        # punctuation and numbers exercise every rule of the tokenizer
+        lines = [
+            synthetic_context(size, seed).replace(" api", " api-2.0").replace(" user", " user, 3.5...")
+            for seed in range(20)
+        ]
+
+        def current():
+            for line in lines:
+                Tokenizer13a()(line)
+
+        def compiled():
+            for line in lines:
+                CompiledTokenizer13a()(line)
+
+        def cached():
+            for line in lines:
+                TOKENIZER_13A(line)
+
+        cached()
+        timings = [best_of(function) / len(lines) * 1e3 for function in (current, compiled, cached)]
+        rows.append([name, size] + timings + [timings[0] / timings[1]])
+    print_table(
+        "13a tokenization time per line (ms)",
+        ["line", "bytes", "Tokenizer13a", "compiled", "compiled, cached", "speedup"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
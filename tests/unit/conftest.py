@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the layer code is imported the same way Lambda does, from the layer's python directory
+LAYER_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "assets", "layers", "streaming-lambda-layers", "python")
+)
+if LAYER_PATH not in sys.path:
+    sys.path.insert(0, LAYER_PATH)
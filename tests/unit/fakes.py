@@ -0,0 +1,266 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+from urllib.parse import unquote
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class GoneException(Exception):
+    """Stand-in for the client error API Gateway raises for closed connections."""
+
+
+class PayloadTooLargeException(Exception):
+    """Stand-in for the client error API Gateway raises for frames above its size limit."""
+
+
+class FakeApiGatewayManagementApi:
+    """
+    Local stand-in for the boto3 `apigatewaymanagementapi` client
+
+    Records every posted frame per connection, optionally sleeping `latency` seconds per call,
+    blocking until `gate` is set, raising `GoneException` for connections in `gone`, or raising
+    `PayloadTooLargeException` for frames larger than `max_frame_bytes`.
+    """
+
+    exceptions = type(
+        "exceptions", (), {"GoneException": GoneException, "PayloadTooLargeException": PayloadTooLargeException}
+    )
+
+    def __init__(
+        self, latency: float = 0.0, gone=(), gate: threading.Event = None, max_frame_bytes: int = None
+    ) -> None:
+        self.latency = latency
+        self.max_frame_bytes = max_frame_bytes
+        self.gone = set(gone)
+        self.gate = gate
+        self.frames = {}
+        self.calls = 0
+        self.data_ids = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, Data, ConnectionId):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.gate is not None:
+                self.gate.wait()
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                self.calls += 1
+                self.data_ids.add(id(Data))
+                if ConnectionId in self.gone:
+                    raise GoneException(f"Connection {ConnectionId} is gone")
+                if self.max_frame_bytes is not None and len(Data) > self.max_frame_bytes:
+                    raise PayloadTooLargeException(f"Frame of {len(Data)} bytes is too large")
+                self.frames.setdefault(ConnectionId, []).append(bytes(Data))
+            return {}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def decoded(self, connection_id):
+        return [frame.decode("utf-8") for frame in self.frames.get(connection_id, [])]
+
+
+class FakeResponseStream:
+    """
+    Local stand-in for a Lambda response stream
+
+    Records the written bytes and counts writes and flushes; `chunks` keeps the data of every write.
+    """
+
+    def __init__(self) -> None:
+        self.chunks = []
+        self.flushes = 0
+        self.closed = False
+
+    @property
+    def data(self) -> bytes:
+        return b"".join(self.chunks)
+
+    @property
+    def bytes(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def write(self, data: bytes) -> None:
+        if self.closed:
+            raise ValueError("write to a closed response stream")
+        self.chunks.append(bytes(data))
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeApiGatewayServer:
+    """
+    Local HTTP stand-in for the `apigatewaymanagementapi` endpoint, for real boto3 clients
+
+    Serves `POST /@connections/{id}` on 127.0.0.1, recording the frames of every connection and
+    optionally sleeping `latency` seconds per call. Connections whose id starts with `gone_prefix`
+    answer with a 410 GoneException once they received `gone_after` frames, and frames larger than
+    `max_frame_bytes` with a 413 PayloadTooLargeException.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        gone_prefix: str = "gone-",
+        gone_after: int = 0,
+        max_frame_bytes: int = None,
+        port: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.gone_prefix = gone_prefix
+        self.gone_after = gone_after
+        self.max_frame_bytes = max_frame_bytes
+        self.frames = {}
+        self.posted_frames = 0
+        self.posted_bytes = 0
+        self.gone_responses = 0
+        self.rejected_frames = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeApiGatewayServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-apigateway", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeApiGatewayServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": len(self.frames),
+                "posted_frames": self.posted_frames,
+                "posted_bytes": self.posted_bytes,
+                "gone_responses": self.gone_responses,
+                "rejected_frames": self.rejected_frames,
+            }
+
+    def _post(self, connection_id: str, data: bytes):
+        """Status, error type and message of a post"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            frames = self.frames.setdefault(connection_id, [])
+            if connection_id.startswith(self.gone_prefix) and len(frames) >= self.gone_after:
+                self.gone_responses += 1
+                return 410, "GoneException", f"Connection {connection_id} is gone"
+            if self.max_frame_bytes is not None and len(data) > self.max_frame_bytes:
+                self.rejected_frames += 1
+                return 413, "PayloadTooLargeException", f"Frame of {len(data)} bytes is too large"
+            frames.append(data)
+            self.posted_frames += 1
+            self.posted_bytes += len(data)
+        return 200, None, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so boto3 reuses its pooled connections like it does with API Gateway
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                prefix = "/@connections/"
+                path = unquote(self.path)
+                if not path.startswith(prefix):
+                    self._respond(404, {"message": f"Unknown path {self.path}"})
+                    return
+                status, error_type, message = server._post(path[len(prefix):], data)
+                self._respond(status, {"message": message} if error_type else None, error_type)
+
+            def _respond(self, status, body=None, error_type=None):
+                data = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if error_type is not None:
+                    self.send_header("x-amzn-ErrorType", error_type)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model streaming `tokens` after `first_token_delay` seconds, then one every `token_delay`
+
+    With `error`, it raises instead of streaming its first token. `streamed` counts the chunks it
+    produced over all requests, `closed` the streams that stopped before their last token.
+    """
+
+    tokens: List[str]
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+    error: Optional[str] = None
+    streamed: int = 0
+    closed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        time.sleep(self.first_token_delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        for i, token in enumerate(self.tokens):
+            if i:
+                time.sleep(self.token_delay)
+            self.streamed += 1
+            try:
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            except GeneratorExit:
+                self.closed += 1
+                raise
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        try:
+            await asyncio.sleep(self.first_token_delay)
+            if self.error:
+                raise RuntimeError(self.error)
+            for i, token in enumerate(self.tokens):
+                if i:
+                    await asyncio.sleep(self.token_delay)
+                self.streamed += 1
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        except (GeneratorExit, asyncio.CancelledError):
+            self.closed += 1
+            raise
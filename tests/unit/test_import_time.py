@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.unit.conftest import LAYER_PATH
+
+# cumulative import budgets in milliseconds, generous enough for a slow CI runner but far below the
+# cost of loading boto3 (~250ms) or a LangChain integration (>1s)
+IMPORT_BUDGETS_MS = {
+    "messaging.service": 150,
+    "messaging.publishers.websocket": 150,
+    "model.postprocess": 150,
+    "providers.bedrock_provider": 250,
+    "providers.openai_provider": 250,
+    "providers.hedged_provider": 250,
+    "factories.provider_factory": 250,
+}
+
+# modules that must only be loaded on first use
+DEFERRED_MODULES = {
+    "messaging.service": ["boto3", "langchain_core"],
+    "messaging.publishers.websocket": ["boto3", "botocore"],
+    "model.postprocess": ["model.relevance.bleu", "model.relevance.tokenizer", "numpy"],
+    "providers.bedrock_provider": ["boto3", "langchain", "langchain_aws", "langchain_openai"],
+    "providers.openai_provider": ["langchain", "langchain_aws", "langchain_openai"],
+    "providers.hedged_provider": ["langchain_core", "langchain_aws", "langchain_openai"],
+    "factories.provider_factory": ["boto3", "langchain_aws", "langchain_openai", "model.relevance.bleu"],
+}
+
+
+def _run(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=LAYER_PATH)
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def import_time_ms(module: str) -> float:
+    """
+    Cumulative import time of `module` and its parent packages, as reported by `python -X importtime`
+    """
+    result = _run("-X", "importtime", "-c", f"import {module}")
+    package = module.split(".")[0]
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented, the top level lines are the module and its parent packages
+        if not name.startswith(" ") or name[1:2] == " ":
+            continue
+        name = name.strip()
+        if name == package or name.startswith(package + "."):
+            total += int(cumulative)
+    return total / 1000
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS_MS))
+def test_import_time_budget(module):
+    # warm the bytecode cache, then keep the best of a few runs
+    _run("-c", f"import {module}")
+    elapsed = min(import_time_ms(module) for _ in range(3))
+    assert elapsed < IMPORT_BUDGETS_MS[module], f"importing {module} took {elapsed:.1f}ms"
+
+
+@pytest.mark.parametrize("module", sorted(DEFERRED_MODULES))
+def test_heavy_modules_are_imported_lazily(module):
+    script = f"import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+    loaded = set(json.loads(_run("-c", script).stdout))
+    assert loaded.isdisjoint(DEFERRED_MODULES[module])
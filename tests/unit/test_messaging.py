@@ -0,0 +1,352 @@
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from tests.unit.fakes import (
+    FakeApiGatewayManagementApi,
+    FakeApiGatewayServer,
+    FakeResponseStream,
+    PayloadTooLargeException,
+)
+
+from messaging.fragments import FragmentAssembler, PayloadFragmenter
+from messaging.frames import FRAME_ENCODER, FRAME_TYPES, FrameEncoder
+from messaging.publishers.base import BasePublisher
+from messaging.publishers.broadcast import BroadcastWebSocketPublisher
+from messaging.publishers.response_stream import ResponseStreamPublisher
+from messaging.publishers.websocket import BackgroundWebSocketPublisher, WebSocketPublisher
+from messaging.reassembler import StreamReassembler
+from messaging.service import MessageDeliveryService
+from utils.clients import ClientRegistry
+
+ENDPOINT = "https://example.execute-api.us-west-2.amazonaws.com/prod"
+
+
+def test_websocket_publisher_posts_utf8():
+    client = FakeApiGatewayManagementApi()
+    WebSocketPublisher(ENDPOINT, "abc", client=client).publish('{"message": "héllo"}')
+    assert client.frames["abc"] == ['{"message": "héllo"}'.encode("utf-8")]
+
+
+def test_websocket_publisher_posts_bytes_unchanged():
+    client = FakeApiGatewayManagementApi()
+    WebSocketPublisher(ENDPOINT, "abc", client=client).publish('{"message": "héllo"}'.encode("utf-8"))
+    assert client.frames["abc"] == ['{"message": "héllo"}'.encode("utf-8")]
+
+
+def _random_text(rng: random.Random) -> str:
+    alphabet = [chr(i) for i in range(0x20)] + ['"', "\\", "\x7f", "é", "€", "😀", "\ud800"] + list("abc /<>")
+    length = rng.choice([0, 1, 5, 40, 20_000])
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+@pytest.mark.parametrize("use_orjson", [False, None])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_frame_encoder_matches_json_dumps(use_orjson, ensure_ascii):
+    encoder = FrameEncoder(ensure_ascii=ensure_ascii, use_orjson=use_orjson)
+    rng = random.Random(7)
+    for _ in range(300):
+        message = _random_text(rng)
+        if not ensure_ascii and "\ud800" in message:
+            # lone surrogates can not be encoded to UTF-8 without escaping
+            continue
+        message_type = rng.choice(FRAME_TYPES)
+        frame = {"message": message, "type": message_type}
+        kwargs = {}
+        if message_type == "delta":
+            frame["offset"] = kwargs["offset"] = rng.randrange(100_000)
+        if message_type == "score":
+            frame["index"] = kwargs["index"] = rng.randrange(1000)
+            frame["score"] = kwargs["score"] = rng.choice([0.0, 1.0, rng.random()])
+        if rng.random() < 0.5:
+            frame["sequence"] = kwargs["sequence"] = rng.randrange(100_000)
+
+        expected = json.dumps(frame, ensure_ascii=ensure_ascii).encode("utf-8")
+        assert encoder.encode(message_type, message, **kwargs) == expected
+        assert encoder.encode(message_type.value, message, **kwargs) == expected
+
+
+def test_frame_encoder_rejects_other_message_types():
+    with pytest.raises(ValueError):
+        FrameEncoder().encode("fragment", "The answer is ready")
+
+
+def test_fragments_fit_the_frame_limit_and_reassemble():
+    rng = random.Random(11)
+    fragmenter = PayloadFragmenter(max_frame_bytes=1000)
+    assembler = FragmentAssembler()
+    small = FrameEncoder().encode("stream", "Short answer...")
+    assert fragmenter.split(small) == [small]
+    for _ in range(50):
+        message = "".join(rng.choice(["a", " ", "é", "€", "😀", '"', "\n"]) for _ in range(rng.randint(500, 5000)))
+        payload = FrameEncoder(ensure_ascii=False).encode("stream", message)
+        frames = fragmenter.split(payload)
+        assert all(len(frame) <= 1000 for frame in frames)
+        for frame in frames:
+            # slices end on character boundaries
+            frame.decode("utf-8")
+            result = assembler.add(frame)
+        assert result == payload
+        assert assembler.pending_payloads == 0
+
+
+def test_websocket_publisher_fragments_oversize_payloads():
+    message = "".join(f" word{i}" for i in range(20_000))
+    payload = FrameEncoder().encode("end", message)
+    assert len(payload) > 100 * 1024
+
+    client = FakeApiGatewayManagementApi(max_frame_bytes=32 * 1024)
+    with pytest.raises(PayloadTooLargeException):
+        WebSocketPublisher(ENDPOINT, "abc", client=client, max_frame_bytes=None).publish(payload)
+
+    WebSocketPublisher(ENDPOINT, "abc", client=client).publish(payload)
+    frames = client.frames["abc"]
+    assert len(frames) == len(payload) // (32 * 1024) + 1
+    assembler = FragmentAssembler()
+    assert [assembler.add(frame) for frame in frames] == [None] * (len(frames) - 1) + [payload]
+
+
+def test_background_publisher_keeps_order():
+    client = FakeApiGatewayManagementApi(latency=0.001)
+    publisher = BackgroundWebSocketPublisher(ENDPOINT, "abc", client=client, max_queue_size=1000)
+    payloads = [json.dumps({"message": str(i), "type": "message"}) for i in range(100)]
+    for payload in payloads:
+        publisher.publish(payload)
+
+    assert publisher.flush(timeout=5)
+    assert client.decoded("abc") == payloads
+    publisher.close()
+
+
+def test_background_publisher_drops_obsolete_stream_frames():
+    gate = threading.Event()
+    client = FakeApiGatewayManagementApi(gate=gate)
+    publisher = BackgroundWebSocketPublisher(ENDPOINT, "abc", client=client, max_queue_size=4)
+    publisher.publish(json.dumps({"message": "first...", "type": "stream"}))
+    for i in range(20):
+        publisher.publish(json.dumps({"message": f"answer {i}...", "type": "stream"}))
+    publisher.publish(json.dumps({"message": "Error occurred: boom", "type": "error"}))
+    publisher.publish(json.dumps({"message": "answer.", "type": "end"}))
+    assert not publisher.flush(timeout=0.01)
+    gate.set()
+    assert publisher.flush(timeout=5)
+
+    frames = [json.loads(frame) for frame in client.decoded("abc")]
+    assert len(frames) <= 6
+    assert [frame["type"] for frame in frames][-2:] == ["error", "end"]
+    assert publisher.dropped_frames == 22 - len(frames) + 1
+    publisher.close()
+
+
+def test_background_publisher_merges_delta_frames():
+    gate = threading.Event()
+    client = FakeApiGatewayManagementApi(gate=gate)
+    publisher = BackgroundWebSocketPublisher(ENDPOINT, "abc", client=client, max_queue_size=3)
+    expected = StreamReassembler()
+    text = ""
+    for sequence in range(30):
+        # every delta rewrites the trailing dot
+        offset = max(0, len(text) - 1)
+        frame = {"message": f" w{sequence}.", "type": "delta", "offset": offset, "sequence": sequence}
+        text = expected.add(frame)
+        publisher.publish(FRAME_ENCODER.encode("delta", frame["message"], offset=offset, sequence=sequence))
+    # merged deltas are encoded like the frames they replace
+    assert all(isinstance(payload, bytes) for payload in publisher._queue)
+    gate.set()
+    assert publisher.flush(timeout=5)
+
+    reassembler = StreamReassembler()
+    for frame in client.decoded("abc"):
+        reassembler.add(json.loads(frame))
+    assert reassembler.text == text
+    assert len(client.decoded("abc")) < 30
+    publisher.close()
+
+
+def test_background_publishers_hold_no_thread_once_flushed():
+    client = FakeApiGatewayManagementApi()
+    threads = threading.active_count()
+    service = MessageDeliveryService()
+    for i in range(50):
+        service.attach(BackgroundWebSocketPublisher(ENDPOINT, f"connection-{i}", client=client))
+    service.post(json.dumps({"message": "0", "type": "message"}))
+    assert service.flush(timeout=5)
+    deadline = time.monotonic() + 5
+    while threading.active_count() > threads and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == threads
+
+    service.post(json.dumps({"message": "1", "type": "message"}))
+    assert service.flush(timeout=5)
+    assert all(len(client.frames[f"connection-{i}"]) == 2 for i in range(50))
+
+
+def test_service_flush_waits_for_background_publishers():
+    client = FakeApiGatewayManagementApi(latency=0.01)
+    service = MessageDeliveryService()
+    service.attach(BackgroundWebSocketPublisher(ENDPOINT, "abc", client=client))
+    for i in range(5):
+        service.post(json.dumps({"message": str(i), "type": "message"}))
+    assert service.flush(timeout=5)
+    assert len(client.frames["abc"]) == 5
+
+
+class SlowPublisher(BasePublisher):
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.payloads = []
+
+    def publish(self, payload) -> None:
+        time.sleep(self.delay)
+        self.payloads.append(payload)
+
+
+def test_concurrent_service_isolates_failures_and_detaches_gone_connections():
+    client = FakeApiGatewayManagementApi(gone={"closed"})
+    live = WebSocketPublisher(ENDPOINT, "live", client=client)
+    closed = WebSocketPublisher(ENDPOINT, "closed", client=client)
+    service = MessageDeliveryService(concurrent=True, publish_timeout=1)
+    service.attach(live)
+    service.attach(closed)
+
+    report = service.post('{"message": "1"}')
+    assert report.delivered == [live]
+    assert report.detached == [closed]
+    assert not report.ok
+
+    report = service.post('{"message": "2"}')
+    assert report.ok and report.delivered == [live]
+    assert client.decoded("live") == ['{"message": "1"}', '{"message": "2"}']
+
+
+def test_websocket_publisher_posts_to_an_http_endpoint_with_boto3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with FakeApiGatewayServer(gone_after=1) as server:
+        client = ClientRegistry().get_client(
+            "apigatewaymanagementapi", region_name="us-east-1", endpoint_url=server.endpoint_url, max_attempts=1
+        )
+        live = WebSocketPublisher(server.endpoint_url, "abc", client=client)
+        gone = WebSocketPublisher(server.endpoint_url, "gone-abc", client=client)
+        service = MessageDeliveryService(concurrent=True)
+        service.attach(live)
+        service.attach(gone)
+        reports = [service.post(f'{{"message": "héllo {i}"}}') for i in range(3)]
+        service.flush()
+
+    assert reports[1].detached == [gone] and reports[2].delivered == [live]
+    assert server.frames["abc"] == [f'{{"message": "héllo {i}"}}'.encode("utf-8") for i in range(3)]
+    assert len(server.frames["gone-abc"]) == 1
+    assert server.stats()["gone_responses"] == 1
+
+
+def test_concurrent_service_does_not_wait_for_slow_publishers():
+    slow, fast = SlowPublisher(0.3), SlowPublisher(0.0)
+    service = MessageDeliveryService(concurrent=True, publish_timeout=0.05)
+    service.attach(slow)
+    service.attach(fast)
+
+    start = time.monotonic()
+    reports = [service.post(str(i)) for i in range(3)]
+    assert time.monotonic() - start < 0.6
+    assert reports[0].timed_out == [slow] and reports[0].delivered == [fast]
+
+    assert service.flush(timeout=5)
+    assert slow.payloads == ["0", "1", "2"]
+    assert fast.payloads == ["0", "1", "2"]
+
+
+def test_concurrent_service_waits_for_each_publisher_its_own_timeout():
+    patient, impatient = SlowPublisher(0.1), SlowPublisher(0.1)
+    service = MessageDeliveryService(concurrent=True, publish_timeout=0.02)
+    service.attach(impatient)
+    service.attach(patient, timeout=1.0)
+
+    start = time.monotonic()
+    report = service.post("0")
+    assert time.monotonic() - start < 0.5
+    assert report.timed_out == [impatient] and report.delivered == [patient]
+
+    service.detach(patient)
+    service.attach(patient)
+    assert service.post("1").timed_out == [impatient, patient]
+    assert service.flush(timeout=5)
+
+
+def test_broadcast_publisher_sends_one_buffer_to_all_connections():
+    connection_ids =[f"viewer-{i}" for i in range(300)]
+    gone = set(connection_ids[::10])
+    client = FakeApiGatewayManagementApi(latency=0.001, gone=gone)
+    publisher = BroadcastWebSocketPublisher(ENDPOINT, connection_ids, client=client, max_concurrency=16)
+
+    payload = '{"message": "Hello...", "type": "stream"}'
+    publisher.publish(payload)
+    assert len(client.data_ids) == 1
+    assert publisher.stale_connections == gone
+    assert len(publisher.connection_ids) == 270
+
+    publisher.publish('{"message": "Hello.", "type": "end"}')
+    assert client.calls == 300 + 270
+    assert client.max_in_flight <= 16
+    for connection_id in publisher.connection_ids:
+        assert client.decoded(connection_id) == [payload, '{"message": "Hello.", "type": "end"}']
+
+
+def _frames(count):
+    return [FrameEncoder().encode("stream", f"answer {i}...") for i in range(count)] + [
+        FrameEncoder().encode("end", "answer.")
+    ]
+
+
+def test_response_stream_publisher_writes_ndjson():
+    stream = FakeResponseStream()
+    service = MessageDeliveryService()
+    publisher = ResponseStreamPublisher(stream)
+    service.attach(publisher)
+    frames = _frames(5)
+    for frame in frames:
+        service.post(frame)
+
+    assert publisher.content_type == "application/x-ndjson"
+    assert stream.data == b"".join(frame + b"\n" for frame in frames)
+    assert stream.flushes == len(stream.chunks) == len(frames)
+    reassembler = StreamReassembler()
+    for line in stream.data.splitlines():
+        reassembler.add(json.loads(line))
+    assert reassembler.finished and reassembler.text == "answer."
+
+
+def test_response_stream_publisher_writes_server_sent_events():
+    stream = FakeResponseStream()
+    publisher = ResponseStreamPublisher(stream, framing="sse")
+    publisher.publish('{"message": "Hello...", "type": "stream"}')
+    publisher.publish("first line\nsecond line")
+
+    assert publisher.content_type == "text/event-stream"
+    events = stream.data.decode("utf-8").split("\n\n")
+    assert events == ['data: {"message": "Hello...", "type": "stream"}', "data: first line\ndata: second line", ""]
+
+
+def test_response_stream_publisher_writes_chunks_until_flushed():
+    stream = FakeResponseStream()
+    service = MessageDeliveryService()
+    publisher = ResponseStreamPublisher(stream, chunk_bytes=256, auto_flush=False)
+    service.attach(publisher)
+    frames = _frames(100)
+    for frame in frames:
+        service.post(frame)
+
+    assert stream.flushes == 0
+    assert len(stream.chunks) > 1 and all(len(chunk) == 256 for chunk in stream.chunks)
+    assert service.flush(timeout=1)
+    assert stream.flushes == 1
+    assert stream.data == b"".join(frame + b"\n" for frame in frames)
+    assert publisher.bytes_written == stream.bytes and publisher.writes == len(stream.chunks)
+
+    publisher.close()
+    assert stream.closed
+    with pytest.raises(RuntimeError):
+        publisher.publish(frames[0])
@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+from model.postprocess import IncrementalAnswerCleaner, clean_answer, remove_repetitions
+
+VOCABULARY = ["the", "model", "answer", "is", "streaming", "tokens", "Human:", "<n>", "\n", "Context:", "!"]
+
+
+REPETITION_GOLDEN_CORPUS = [
+    (
+        "The answer is is is the answer is the answer is clear.",
+        "The answer is is is the answer is clear.",
+    ),
+    (
+        "Lambda layers layers are shared. Lambda layers layers are shared. Lambda layers are shared.",
+        "Lambda layers layers are shared. Lambda layers are shared.",
+    ),
+    (
+        "- first point\n- second point\n- second point\n- third point",
+        "- first point \n- second point \n- third point",
+    ),
+    (
+        "It depends on the region. It depends on the region. It depends on the region.",
+        "It depends on the region. It depends on the region. It depends on the region.",
+    ),
+    ("a b a b", "a b a b"),
+    ("a b a b c", "a b c"),
+    ("single", "single"),
+    ("  spaced   out\n\nwords  ", "spaced out \n\nwords"),
+    ("Yes. Yes. No. No. Maybe maybe.", "Yes. Yes. No. No. Maybe maybe."),
+]
+
+
+def _tokenize_stream(text, rng):
+    # split text into randomly sized tokens, the way an LLM would stream it
+    tokens = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 6)
+        tokens.append(text[position : position + size])
+        position += size
+    return tokens
+
+
+def _random_answer(rng, n_words):
+    return "".join(rng.choice(VOCABULARY) + rng.choice([" ", " ", "\n", ""]) for _ in range(n_words))
+
+
+def test_incremental_cleaner_matches_clean_answer_while_short():
+    rng = random.Random(0)
+    for _ in range(200):
+        text = _random_answer(rng, rng.randint(1, 40))
+        cleaner = IncrementalAnswerCleaner(window_words=32)
+        received = ""
+        for token in _tokenize_stream(text, rng):
+            cleaner.feed(token)
+            received += token
+            # a trailing "<" or "<n" is held back until it is known not to start "<n>"
+            held = 2 if received.endswith("<n") else 1 if received.endswith("<") else 0
+            try:
+                expected = clean_answer(received[: len(received) - held])
+            except IndexError:
+                continue
+            assert cleaner.snapshot() == expected
+
+
+def test_incremental_cleaner_matches_clean_answer_without_repetitions():
+    rng = random.Random(1)
+    for _ in range(5):
+        words = [f"word{i}" for i in range(rng.randint(20, 80))]
+        text = "Answer: " + " ".join(words)
+        cleaner = IncrementalAnswerCleaner(window_words=8)
+        received = ""
+        for token in _tokenize_stream(text, rng):
+            cleaner.feed(token)
+            received += token
+            if len(received) > 8:
+                assert cleaner.snapshot() == clean_answer(received)
+
+
+def test_incremental_cleaner_stops_at_human():
+    cleaner = IncrementalAnswerCleaner(window_words=4)
+    text = " ".join(f"word{i}" for i in range(30)) + " Hum"
+    for token in [text, "an: what else?", " more words"]:
+        cleaner.feed(token)
+    assert cleaner.snapshot() == clean_answer(text + "an: what else? more words")
+
+
+@pytest.mark.parametrize("text, expected", REPETITION_GOLDEN_CORPUS)
+def test_remove_repetitions_golden_corpus(text, expected):
+    assert remove_repetitions(text) == expected
+    assert remove_repetitions(text, legacy=True) == expected
+
+
+def test_remove_repetitions_matches_legacy_on_random_texts():
+    # property-based differential test: small vocabularies and injected loops produce many repetitions
+    rng = random.Random(2)
+    for _ in range(1000):
+        vocabulary = [f"w{i}" for i in range(rng.randint(1, 8))] + ["\n"]
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 50))]
+        for _ in range(rng.randint(0, 3)):
+            start = rng.randint(0, len(words))
+            words[start:start] = words[start : start + rng.randint(1, 8)] * rng.randint(1, 3)
+        text = "".join(word + rng.choice([" ", " ", "  ", "\n"]) for word in words)
+        assert remove_repetitions(text) == remove_repetitions(text, legacy=True)
+
+
+def test_remove_repetitions_handles_long_loops():
+    text = "the model repeats itself " * 5000 + "until it stops."
+    assert remove_repetitions(text) == "the model repeats itself until it stops."
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from tests.unit.fakes import ScriptedChatModel
+
+from factories.provider_factory import ProviderFactory
+from messaging.publishers.base import BasePublisher
+from messaging.service import MessageDeliveryService
+from model.postprocess import clean_answer
+from model.streaming import AsyncBedrockStreamingCallback, BedrockStreamingCallback
+from providers.base_provider import BaseProvider
+from providers.bedrock_provider import BedrockProvider
+from providers.hedged_provider import HedgedProvider
+from providers.hedging import HedgedChatModel
+from providers.llm_cache import LLMCache
+from providers.openai_provider import OpenAIProvider
+
+
+class TokenRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.tokens = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.tokens.append(token)
+
+
+class FakeProvider(BaseProvider):
+    def __init__(self, answer):
+        self.answer = answer
+        self.created = 0
+
+    def get_llm(self):
+        return self.create_llm()
+
+    def cache_key(self):
+        return ("fake", self.answer)
+
+    def create_llm(self, callbacks=None):
+        self.created += 1
+        return GenericFakeChatModel(messages=iter([AIMessage(content=self.answer)] * 10), callbacks=callbacks)
+
+
+def test_llm_cache_evicts_least_recently_used():
+    cache = LLMCache(max_size=2)
+    cache.get_or_create(("a",), object)
+    cache.get_or_create(("b",), object)
+    cache.get_or_create(("a",), object)
+    cache.get_or_create(("c",), object)
+
+    assert ("a",) in cache and ("c",) in cache and ("b",) not in cache
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 3, 1)
+
+    with pytest.raises(ValueError):
+        LLMCache(max_size=0)
+
+
+def test_cached_llm_streams_to_callbacks_passed_at_invoke_time():
+    cache = LLMCache()
+    provider = FakeProvider("Hello there friend")
+    first, second = TokenRecorder(), TokenRecorder()
+
+    llm = provider.get_cached_llm(cache)
+    list(llm.stream("hi", config={"callbacks": [first]}))
+    llm = provider.get_cached_llm(cache)
+    list(llm.stream("hi", config={"callbacks": [second]}))
+
+    assert provider.created == 1
+    assert "".join(first.tokens) == "".join(second.tokens) == "Hello there friend"
+
+
+def test_provider_cache_keys(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    cache = LLMCache()
+    bedrock = BedrockProvider("anthropic.claude-v2", region="us-west-2")
+    llm = bedrock.get_cached_llm(cache)
+
+    assert BedrockProvider("anthropic.claude-v2", region="us-west-2").get_cached_llm(cache) is llm
+    assert BedrockProvider("anthropic.claude-v2", region="us-east-1").get_cached_llm(cache) is not llm
+    assert BedrockProvider("anthropic.claude-v2", temperature=0.1, region="us-west-2").get_cached_llm(cache) is not llm
+    assert llm.callbacks is None
+
+    key = OpenAIProvider("gpt-4o", api_key="sk-secret").cache_key()
+    assert "sk-secret" not in key
+    assert key != OpenAIProvider("gpt-4o", api_key="sk-other").cache_key()
+
+
+def test_get_llm_still_requires_a_streaming_callback():
+    with pytest.raises(ValueError):
+        BedrockProvider("anthropic.claude-v2", region="us-west-2").get_llm()
+    with pytest.raises(ValueError):
+        ProviderFactory("GPT_4O").get_provider()
+
+
+PRIMARY_TOKENS = ["The", " primary", " answer", "."]
+ALTERNATE_TOKENS = ["An", " alternate", " answer", "."]
+
+
+class FramePublisher(BasePublisher):
+    def __init__(self) -> None:
+        self.frames = []
+
+    def publish(self, payload) -> None:
+        self.frames.append(json.loads(payload))
+
+    async def apublish(self, payload) -> None:
+        self.publish(payload)
+
+
+def _streamed_answer(publisher):
+    assert publisher.frames[-1]["type"] == "end"
+    return publisher.frames[-1]["message"]
+
+
+def test_hedged_model_does_not_hedge_fast_first_tokens():
+    primary = ScriptedChatModel(tokens=PRIMARY_TOKENS)
+    alternate = ScriptedChatModel(tokens=ALTERNATE_TOKENS)
+    llm = HedgedChatModel(llms=[primary, alternate], hedge_delay_ms=1000)
+    recorder = TokenRecorder()
+
+    chunks = list(llm.stream("hi", config={"callbacks": [recorder]}))
+
+    assert "".join(chunk.content for chunk in chunks) == "".join(recorder.tokens) == "".join(PRIMARY_TOKENS)
+    assert alternate.streamed == 0
+    assert llm.stats.as_dict() == {"requests": 1, "hedged_requests": 0, "hedges": 0, "alternate_wins": 0}
+
+
+def test_hedged_model_binds_the_first_stream_to_produce_a_token():
+    primary = ScriptedChatModel(tokens=PRIMARY_TOKENS, first_token_delay=0.3, token_delay=0.05)
+    alternate = ScriptedChatModel(tokens=ALTERNATE_TOKENS, first_token_delay=0.01)
+    llm = HedgedChatModel(llms=[primary, alternate], hedge_delay_ms=20)
+    publisher = FramePublisher()
+    service = MessageDeliveryService()
+    service.attach(publisher)
+
+    start = time.perf_counter()
+    list(llm.stream("hi", config={"callbacks": [BedrockStreamingCallback(service)]}))
+
+    assert time.perf_counter() - start < 0.3
+    # only the tokens of the alternate reached the delivery service
+    assert _streamed_answer(publisher) == clean_answer("".join(ALTERNATE_TOKENS))
+    assert all("primary" not in frame["message"] for frame in publisher.frames)
+    assert llm.stats.as_dict() == {"requests": 1, "hedged_requests": 1, "hedges": 1, "alternate_wins": 1}
+    # the losing request stops at its first token
+    deadline = time.monotonic() + 5
+    while not primary.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert (primary.streamed, primary.closed) == (1, 1)
+
+
+def test_hedged_model_fails_over_on_errors_before_the_first_token():
+    failing = ScriptedChatModel(tokens=PRIMARY_TOKENS, error="throttled")
+    alternate = ScriptedChatModel(tokens=ALTERNATE_TOKENS)
+    llm = HedgedChatModel(llms=[failing, alternate], hedge_delay_ms=10_000)
+
+    start = time.perf_counter()
+    assert llm.invoke("hi").content == "".join(ALTERNATE_TOKENS)
+    assert time.perf_counter() - start < 5
+
+    llm = HedgedChatModel(llms=[failing, failing.model_copy()], hedge_delay_ms=10_000)
+    with pytest.raises(RuntimeError, match="throttled"):
+        list(llm.stream("hi"))
+
+
+def test_async_hedged_model_cancels_the_losing_request():
+    primary = ScriptedChatModel(tokens=PRIMARY_TOKENS, first_token_delay=0.3)
+    alternate = ScriptedChatModel(tokens=ALTERNATE_TOKENS, first_token_delay=0.01)
+    llm = HedgedChatModel(llms=[primary, alternate], hedge_delay_ms=20)
+    publisher = FramePublisher()
+    service = MessageDeliveryService()
+    service.attach(publisher)
+
+    async def stream():
+        async for _ in llm.astream("hi", config={"callbacks": [AsyncBedrockStreamingCallback(service)]}):
+            pass
+
+    asyncio.run(stream())
+    assert _streamed_answer(publisher) == clean_answer("".join(ALTERNATE_TOKENS))
+    assert (primary.streamed, primary.closed) == (0, 1)
+    assert llm.stats.alternate_wins == 1
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_hedged_model_in_a_chain_only_streams_the_winner(use_async):
+    primary = ScriptedChatModel(tokens=PRIMARY_TOKENS, first_token_delay=0.3)
+    alternate = ScriptedChatModel(tokens=ALTERNATE_TOKENS, first_token_delay=0.01)
+    # the chain passes its config, callbacks included, down to the model through the context
+    chain = RunnableLambda(lambda x: x) | HedgedChatModel(llms=[primary, alternate], hedge_delay_ms=20)
+    publisher = FramePublisher()
+    service = MessageDeliveryService()
+    service.attach(publisher)
+
+    if use_async:
+        async def stream():
+            config = {"callbacks": [AsyncBedrockStreamingCallback(service)]}
+            async for _ in chain.astream("hi", config=config):
+                pass
+
+        asyncio.run(stream())
+    else:
+        list(chain.stream("hi", config={"callbacks": [BedrockStreamingCallback(service)]}))
+
+    assert [frame["type"] for frame in publisher.frames] == ["stream"] * len(ALTERNATE_TOKENS) + ["end"]
+    assert _streamed_answer(publisher) == clean_answer("".join(ALTERNATE_TOKENS))
+
+
+def test_provider_factory_builds_hedged_providers(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    factory = ProviderFactory(
+        "CLAUDE_3_HAIKU", hedge_delay_ms=500, hedge_regions=["us-east-1"], hedge_models=["CLAUDE_3_5_SONNET"]
+    )
+    provider = factory.get_provider()
+
+    assert isinstance(provider, HedgedProvider)
+    assert [(p.model_id, p.region) for p in provider.providers] == [
+        ("us.anthropic.claude-3-haiku-20240307-v1:0", "us-west-2"),
+        ("us.anthropic.claude-3-haiku-20240307-v1:0", "us-east-1"),
+        ("us.anthropic.claude-3-5-sonnet-20240620-v1:0", "us-west-2"),
+    ]
+    llm = provider.get_cached_llm(LLMCache())
+    assert isinstance(llm, HedgedChatModel)
+    assert len(llm.llms) == 3 and llm.callbacks is None
+    assert all(inner.callbacks is None for inner in llm.llms)
+
+    with pytest.raises(ValueError):
+        ProviderFactory("GPT_4O", api_key="sk", hedge_delay_ms=500, hedge_regions=["us-east-1"])
+    with pytest.raises(ValueError):
+        ProviderFactory("CLAUDE_3_HAIKU", hedge_delay_ms=500)
+    with pytest.raises(ValueError):
+        HedgedProvider([provider.providers[0]])
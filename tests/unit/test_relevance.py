@@ -0,0 +1,269 @@
+import random
+import re
+import string
+import sys
+
+import pytest
+
+from model.postprocess import (
+    StreamingRelevanceScorer,
+    calculate_relevance_score,
+    calculate_relevance_scores,
+    check_relevance,
+    check_token_intersection,
+    split_into_sentences,
+)
+from model.relevance.bleu import compute_bleu
+from model.relevance.analysis import TextAnalyzer, Vocabulary
+from model.relevance.context_index import ContextIndex
+from model.relevance.stopwords import STOPWORD_SET
+from model.relevance.tokenizer import CompiledTokenizer13a, Tokenizer13a
+
+RELEVANCE_WORDS = [
+    "lambda", "layers", "share", "code", "between", "functions", "the", "a", "of", "in", "stream",
+    "tokens", "api", "gateway", "websocket", "connection", "bedrock", "model", "answer", "2024",
+    "3.5", "e-mail", "it's", "under_score", "cold-start", "Région", "data,", "(context)", "supercalifragilisticexpialidocious",
+]
+
+
+def _random_text(rng, n_words):
+    return " ".join(rng.choice(RELEVANCE_WORDS) for _ in range(n_words))
+
+
+def _token_intersection_reference(context, answer, length_cutoff=3):
+    """The scoring before ContextIndex, re-tokenizing the context and counting its n-grams on every call"""
+    context = re.sub(r"[^\w\s]", "", context).lower()
+    answer = re.sub(r"[^\w\s]", "", answer).lower()
+    if len(context.split()) < length_cutoff:
+        return 0.0
+    if len(answer.split()) < length_cutoff:
+        return 1.0
+    tokenizer = Tokenizer13a()
+    scores = compute_bleu([[tokenizer(context)]], [tokenizer(answer)])
+    return sum(scores[1]) / len(scores[1])
+
+
+def test_context_index_matches_substring_scan():
+    rng = random.Random(11)
+    for _ in range(50):
+        context = _random_text(rng, rng.randint(0, 60))
+        index = ContextIndex(context)
+        for _ in range(20):
+            word = re.sub(r"[^\w\s]", "", rng.choice(RELEVANCE_WORDS)).lower()
+            start = rng.randint(0, len(word))
+            term = word[start : rng.randint(start, len(word))]
+            assert index.contains(term) == (term in index.text), term
+
+
+def test_relevance_checks_accept_a_prebuilt_index():
+    rng = random.Random(5)
+    for _ in range(200):
+        context = _random_text(rng, rng.randint(0, 80))
+        index = ContextIndex(context)
+        for _ in range(3):
+            answer = _random_text(rng, rng.randint(0, 25))
+            question = _random_text(rng, rng.randint(0, 10))
+            expected = _token_intersection_reference(context, answer)
+            assert check_token_intersection(context, answer) == expected
+            assert check_token_intersection(index, answer) == expected
+            assert check_relevance(index, question, answer) == check_relevance(context, question, answer)
+
+
+@pytest.mark.parametrize("answer", ["", "lambda", "lambda layers share code"])
+def test_token_intersection_cutoffs_with_index(answer):
+    assert check_token_intersection(ContextIndex("too short"), "lambda layers share code") == 0.0
+    index = ContextIndex("Lambda layers share code between functions.")
+    assert check_token_intersection(index, answer) == _token_intersection_reference(index.text, answer)
+
+
+def test_streaming_scorer_scores_the_sentences_of_split_into_sentences():
+    rng = random.Random(3)
+    pieces = RELEVANCE_WORDS + [".", "!", "?", "...", " ", "\n", "- ", "e.g."]
+    context = _random_text(rng, 300)
+    scorer = StreamingRelevanceScorer(context)
+    for _ in range(100):
+        scorer.reset()
+        tokens = [rng.choice([" ", ""]) + rng.choice(pieces) for _ in range(rng.randint(0, 60))]
+        streamed = []
+        for token in tokens:
+            streamed.extend(scorer.feed(token))
+        streamed.extend(scorer.finish())
+
+        sentences = split_into_sentences("".join(tokens))
+        assert [score.sentence for score in streamed] == sentences
+        assert [score.index for score in streamed] == list(range(len(sentences)))
+        assert [score.score for score in streamed] == [
+            calculate_relevance_score(sentence, context, method="TOKEN_INTERSECTION") for sentence in sentences
+        ]
+        assert scorer.scores == streamed
+
+
+def test_streaming_scorer_scores_a_sentence_when_it_completes():
+    scorer = StreamingRelevanceScorer(ContextIndex("Lambda layers share code between functions."))
+    assert scorer.feed("Lambda layers share") == []
+    completed = scorer.feed(" code. The moon")
+    assert [(score.sentence, score.score) for score in completed] == [("Lambda layers share code", 1.0)]
+    assert scorer.feed(" is made of cheese") == []
+    assert scorer.finish()[0].score < 0.5
+
+
+def test_streaming_scorer_skips_sentences_over_budget():
+    scorer = StreamingRelevanceScorer("Lambda layers share code.", max_overhead_ms=0)
+    scorer.feed("Lambda layers share code.")
+    scorer.feed(" Lambda layers share code.")
+
+    assert [score.index for score in scorer.scores] == [0]
+    assert scorer.skipped_sentences == 1
+
+
+def test_streaming_scorer_overhead_per_token():
+    rng = random.Random(9)
+    index = ContextIndex(_random_text(rng, 8000))
+    scorer = StreamingRelevanceScorer(index)
+    for _ in range(2000):
+        scorer.feed(" " + rng.choice(RELEVANCE_WORDS) + ("." if rng.random() < 0.05 else ""))
+    scorer.finish()
+
+    assert len(scorer.scores) > 50
+    # generous budget for slow runners, bench_streaming_relevance.py measures ~0.02ms
+    assert scorer.overhead_per_token < 0.001
+
+
+@pytest.mark.parametrize("max_order,smooth", [(4, False), (4, True), (2, False)])
+def test_numpy_bleu_matches_python_bleu(max_order, smooth):
+    rng = random.Random(max_order + smooth)
+    tokenizer = Tokenizer13a()
+    for _ in range(300):
+        n_segments = rng.randint(1, 6)
+        references = [
+            [tokenizer(_random_text(rng, rng.randint(1, 20))) for _ in range(rng.randint(1, 3))]
+            for _ in range(n_segments)
+        ]
+        translations = [tokenizer(_random_text(rng, rng.randint(1, 20))) for _ in range(n_segments)]
+        expected = compute_bleu(references, translations, max_order=max_order, smooth=smooth)
+        assert compute_bleu(references, translations, max_order, smooth, engine="numpy") == expected
+
+
+def _random_triples(rng, n_triples, n_contexts=5):
+    contexts = [_random_text(rng, rng.randint(0, 80)) for _ in range(n_contexts)]
+    for _ in range(n_triples):
+        yield _random_text(rng, rng.randint(0, 25)), rng.choice(contexts), _random_text(rng, rng.randint(1, 10))
+
+
+@pytest.mark.parametrize("method", [None, "WORD_RELEVANCE", "TOKEN_INTERSECTION"])
+@pytest.mark.parametrize("processes", [None, 2])
+def test_batch_scores_match_single_scores(method, processes):
+    triples = list(_random_triples(random.Random(1), 150))
+    expected = [calculate_relevance_score(a, c, question=q, method=method) for a, c, q in triples]
+    assert list(calculate_relevance_scores(iter(triples), method, processes=processes, chunk_size=16)) == expected
+
+
+def test_batch_scoring_reads_input_lazily():
+    consumed = []
+
+    def triples():
+        for i, triple in enumerate(_random_triples(random.Random(2), 10_000)):
+            consumed.append(i)
+            yield triple
+
+    scores = calculate_relevance_scores(triples(), "TOKEN_INTERSECTION", chunk_size=10)
+    assert len([score for _, score in zip(range(25), scores)]) == 25
+    assert len(consumed) == 30
+
+
+TOKENIZER_ALPHABET = list("ab1 .,.,-09?!&'\"/\\_^`~(){}[]:;@#\n\t") + ["é", "٣", "\xa0", "&amp;", "<skipped>", "-\n"]
+
+
+def test_compiled_tokenizer_matches_tokenizer_13a():
+    rng = random.Random(13)
+    reference = Tokenizer13a()
+    tokenizer = CompiledTokenizer13a()
+    corpus = [
+        "Hello, world. It costs $3.50, or 1,000.5 for 2-3 items... e.g. a..5 a...5 3..5 3...5 (see: x/y).",
+        "&quot;quoted&quot; &amp; <skipped> hyphen-\nated\nlines",
+    ]
+    corpus += ["".join(rng.choice(TOKENIZER_ALPHABET) for _ in range(rng.randint(0, 20))) for _ in range(20_000)]
+    for line in corpus:
+        assert tokenizer(line) == reference(line), line
+
+
+def test_compiled_tokenizer_cache_is_bounded_in_bytes():
+    tokenizer = CompiledTokenizer13a(max_cache_bytes=64 * 1024)
+    for i in range(2000):
+        tokenizer(f"line {i} " + "word " * 20)
+    assert 0 < tokenizer.cache_bytes <= 64 * 1024
+    # the line, the token list and the token strings of every entry
+    real_size = sum(
+        sys.getsizeof(line) + sys.getsizeof(tokens) + sum(map(sys.getsizeof, tokens))
+        for line, tokens in tokenizer._cache.items()
+    )
+    assert tokenizer.cache_bytes == real_size
+
+    tokenizer("x " * 10_000)  # larger than an eighth of the cache, not cached
+    assert "x " * 10_000 not in tokenizer._cache
+
+
+def test_text_analyzer_drops_stopwords_per_token():
+    vocabulary = Vocabulary(TextAnalyzer())
+    ids = vocabulary.analyze("Don't stream THE tokens, it's (really) the e-mail of Lambda's layers!")
+    assert vocabulary.tokens(ids) == ["stream", "tokens", "really", "email", "lambdas", "layers"]
+    assert vocabulary.analyze("the tokens") == vocabulary.analyze("Tokens.")
+    assert vocabulary.analyzer.token("The") is None
+
+
+def test_token_ids_are_scoped_to_a_context_index():
+    analyzer = TextAnalyzer(max_words=1000)
+    for i in range(20):
+        vocabulary = Vocabulary(analyzer)
+        context = " ".join(f"word{i}x{j}" for j in range(1000))
+        assert len(vocabulary.analyze_set(context)) == len(vocabulary) == 1000
+        assert len(analyzer._word_tokens) <= 1000
+
+    index = ContextIndex("streaming tokens to the users")
+    answer_ids = index.vocabulary.analyze("The users get streaming tokens")
+    assert index.vocabulary.tokens(answer_ids) == ["users", "get", "streaming", "tokens"]
+    assert set(answer_ids) - index.analyzed_id_set == {index.vocabulary.analyze("get")[0]}
+
+
+def _analyzed_tokens(text):
+    # version 2 tokens computed step by step
+    tokens = []
+    for word in text.lower().split():
+        token = re.sub(r"[^\w]", "", word)
+        if token and word.strip(string.punctuation) not in STOPWORD_SET and token not in STOPWORD_SET:
+            tokens.append(token)
+    return tokens
+
+
+def test_scoring_version_2_filters_stopwords():
+    rng = random.Random(17)
+    for _ in range(200):
+        context = _random_text(rng, rng.randint(0, 80))
+        answer = _random_text(rng, rng.randint(0, 25))
+        question = _random_text(rng, rng.randint(1, 10))
+        context_tokens, answer_tokens = _analyzed_tokens(context), _analyzed_tokens(answer)
+        if len(context_tokens) < 3:
+            expected = 0.0
+        elif len(answer_tokens) < 3:
+            expected = 1.0
+        else:
+            precisions = compute_bleu([[context_tokens]], [answer_tokens])[1]
+            expected = sum(precisions) / len(precisions)
+
+        index = ContextIndex(context)
+        assert check_token_intersection(context, answer, scoring_version=2) == pytest.approx(expected)
+        assert check_token_intersection(index, answer, scoring_version=2) == pytest.approx(expected)
+        assert check_relevance(index, question, answer, scoring_version=2) == check_relevance(
+            context, question, answer, scoring_version=2
+        )
+
+
+def test_scoring_version_2_ignores_matching_stopwords():
+    context = "The model is one of the best of the models and it is in the region of the users."
+    answer = "The moon is made of the cheese that is in the sky."
+    assert check_token_intersection(context, answer) > 0.15
+    assert check_token_intersection(context, answer, scoring_version=2) == 0.0
+    assert calculate_relevance_score(answer, context, method="TOKEN_INTERSECTION", scoring_version=2) == 0.0
+
+    with pytest.raises(ValueError):
+        check_token_intersection(context, answer, scoring_version=3)
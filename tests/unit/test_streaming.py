@@ -0,0 +1,459 @@
+import asyncio
+import io
+import json
+import random
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+from tests.unit.fakes import FakeApiGatewayManagementApi
+
+from messaging.fragments import FragmentAssembler
+from messaging.publishers.base import BasePublisher
+from messaging.publishers.websocket import BackgroundWebSocketPublisher, WebSocketPublisher
+from messaging.reassembler import StreamReassembler
+from messaging.service import MessageDeliveryService
+from model.postprocess import StreamingRelevanceScorer, clean_answer
+from model.streaming import AsyncBedrockStreamingCallback, BedrockStreamingCallback, ResponseBuffer
+from utils.instrumentation import StreamingInstrumentation
+
+
+class CountingPublisher(BasePublisher):
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+
+    def publish(self, payload) -> None:
+        self.frames += 1
+        self.bytes += len(payload)
+
+
+class RecordingPublisher(BasePublisher):
+    def __init__(self) -> None:
+        self.frames = []
+        self.payloads = []
+        self.bytes = 0
+
+    def publish(self, payload) -> None:
+        self.bytes += len(payload)
+        self.payloads.append(payload)
+        self.frames.append(json.loads(payload))
+
+
+def _callback(**kwargs):
+    publisher = RecordingPublisher()
+    service = MessageDeliveryService()
+    service.attach(publisher)
+    callback = BedrockStreamingCallback(service, **kwargs)
+    callback.on_llm_start({}, [])
+    return callback, publisher
+
+
+TOKENS = ["The", " answer", " is", " ready", ".", " It", " streams", " fine", "."]
+
+
+def test_every_token_is_a_frame_by_default():
+    callback, publisher = _callback()
+    for token in TOKENS:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+
+    assert [frame["type"] for frame in publisher.frames] == ["stream"] * len(TOKENS) + ["end"]
+    assert publisher.frames[-1]["message"] == clean_answer("".join(TOKENS))
+    assert callback.metrics.tokens_per_frame == len(TOKENS) / (len(TOKENS) + 1)
+
+
+@pytest.mark.parametrize("delta_frames", [False, True])
+def test_frames_are_the_json_encoded_bytes(delta_frames):
+    scorer = StreamingRelevanceScorer("The answer is ready and it streams fine.")
+    callback, publisher = _callback(delta_frames=delta_frames, relevance_scorer=scorer)
+    for token in TOKENS + [" Ünïcode", " \"quoted\"", "\n"]:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+    callback.on_llm_error(RuntimeError("throttled"))
+
+    expected_types = {"stream" if not delta_frames else "delta", "end", "error", "score"}
+    assert {frame["type"] for frame in publisher.frames} >= expected_types
+    for payload, frame in zip(publisher.payloads, publisher.frames):
+        assert isinstance(payload, bytes)
+        assert payload == json.dumps(frame).encode("utf-8")
+
+
+def test_coalescing_flushes_on_sentence_end():
+    callback, publisher = _callback(coalesce=True, max_latency_ms=10_000)
+    for token in TOKENS:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+
+    assert [frame["type"] for frame in publisher.frames] == ["stream", "stream", "end"]
+    assert publisher.frames[0]["message"] == "The answer is ready...."
+    assert publisher.frames[-1]["message"] == clean_answer("".join(TOKENS))
+    assert callback.metrics.frames == 3
+
+
+def test_coalescing_flushes_on_frame_size():
+    callback, publisher = _callback(coalesce=True, max_latency_ms=10_000, max_frame_bytes=10)
+    for token in ["abc", "def", "ghij", "k"]:
+        callback.on_llm_new_token(token)
+
+    assert len(publisher.frames) == 1
+    assert publisher.frames[0]["message"] == "Abcdefghij...."
+
+
+def test_coalescing_flushes_on_timer():
+    callback, publisher = _callback(coalesce=True, max_latency_ms=20, flush_on_sentence_end=False)
+    callback.on_llm_new_token("Slow")
+    callback.on_llm_new_token(" tokens")
+    assert publisher.frames == []
+
+    deadline = time.monotonic() + 2
+    while not publisher.frames and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert [frame["message"] for frame in publisher.frames] == ["Slow tokens...."]
+    assert callback.metrics.max_added_latency >= 0.02
+
+
+def test_buffered_tokens_are_flushed_before_error():
+    callback, publisher = _callback(coalesce=True, max_latency_ms=10_000)
+    callback.on_llm_new_token("Partial")
+    callback.on_llm_new_token(" answer")
+    callback.on_llm_error(RuntimeError("throttled"))
+
+    assert [frame["type"] for frame in publisher.frames] == ["stream", "error"]
+    assert publisher.frames[0]["message"] == "Partial answer...."
+    assert publisher.frames[1]["message"] == "Error occurred: throttled"
+
+
+def test_delta_frames_reassemble_to_snapshots():
+    rng = random.Random(3)
+    words = ["lambda", "layers", "stream", "tokens", "to", "the", "client", ".", "\n"]
+    for _ in range(30):
+        callback, publisher = _callback(delta_frames=True)
+        reassembler = StreamReassembler()
+        tokens = [rng.choice([" ", ""]) + rng.choice(words) for _ in range(rng.randint(1, 150))]
+        for token in tokens:
+            callback.on_llm_new_token(token)
+            reassembler.add(publisher.frames[-1])
+            assert reassembler.text == callback.answer_cleaner.snapshot()
+        callback.on_llm_end(None)
+        reassembler.add(publisher.frames[-1])
+        assert reassembler.finished
+        assert reassembler.text == clean_answer("".join(tokens))
+        assert {frame["type"] for frame in publisher.frames[:-1]} <= {"delta", "stream"}
+
+
+def test_delta_frames_fall_back_to_snapshot_on_rewrite():
+    callback, publisher = _callback(delta_frames=True)
+    phrase = [" the", " lambda", " layer", " streams", " every", " token"]
+    for token in ["Sure"] + phrase + phrase + [" fast"]:
+        callback.on_llm_new_token(token)
+
+    # the trailing dot keeps the repetition apart until the next word arrives
+    assert [frame["type"] for frame in publisher.frames] == ["delta"] * 13 + ["stream"]
+    assert [frame["sequence"] for frame in publisher.frames] == list(range(14))
+    assert publisher.frames[13]["message"] == "Sure the lambda layer streams every token fast...."
+
+
+def test_delta_frames_send_fewer_bytes():
+    tokens = [f" word{i}" for i in range(300)]
+    sizes = []
+    for delta_frames in (False, True):
+        callback, publisher = _callback(delta_frames=delta_frames)
+        for token in tokens:
+            callback.on_llm_new_token(token)
+        callback.on_llm_end(None)
+        sizes.append(publisher.bytes)
+    assert sizes[1] * 10 < sizes[0]
+
+
+def test_reassembler_rejects_out_of_order_frames():
+    reassembler = StreamReassembler()
+    reassembler.add({"message": "Hello", "type": "delta", "offset": 0, "sequence": 0})
+    with pytest.raises(ValueError):
+        reassembler.add({"message": " world", "type": "delta", "offset": 5, "sequence": 0})
+
+
+def test_relevance_scorer_posts_score_frames():
+    scorer = StreamingRelevanceScorer("The answer is ready and it streams fine.")
+    callback, publisher = _callback(delta_frames=True, relevance_scorer=scorer)
+    for token in TOKENS + [" Cheese", " is", " made", " of", " milk"]:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+
+    scores = [frame for frame in publisher.frames if frame["type"] == "score"]
+    assert [(frame["index"], frame["message"]) for frame in scores] == [
+        (0, "The answer is ready"),
+        (1, "It streams fine"),
+        (2, "Cheese is made of milk"),
+    ]
+    assert scores[0]["score"] == 1.0 and scores[2]["score"] < 0.5
+    # the first score frame follows the frames of the five tokens of its sentence
+    assert publisher.frames.index(scores[0]) == 5
+
+    reassembler = StreamReassembler()
+    for frame in publisher.frames:
+        reassembler.add(frame)
+    assert reassembler.text == clean_answer("".join(TOKENS) + " Cheese is made of milk")
+
+
+def test_relevance_scores_without_frames():
+    scorer = StreamingRelevanceScorer("The answer is ready and it streams fine.")
+    callback, publisher = _callback(relevance_scorer=scorer, score_frames=False)
+    for token in TOKENS:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+
+    assert "score" not in [frame["type"] for frame in publisher.frames]
+    assert [score.sentence for score in scorer.scores] == ["The answer is ready", "It streams fine"]
+
+
+def test_response_buffer_materializes_on_demand():
+    buffer = ResponseBuffer(chunk_fragments=4)
+    tokens = [f" word{i}" for i in range(10)] + ["", "."]
+    for token in tokens:
+        buffer.append(token)
+    assert len(buffer) == len("".join(tokens))
+    assert buffer.getvalue() == "".join(tokens)
+    assert buffer.getvalue() is buffer.getvalue()
+
+    buffer.append(" more")
+    assert str(buffer) == "".join(tokens) + " more"
+    buffer.clear()
+    assert buffer.getvalue() == "" and len(buffer) == 0
+
+
+def test_long_stream_peak_memory_per_token_is_bounded():
+    rng = random.Random(5)
+    tokens = [" " + f"w{rng.randrange(1000)}" + ("." if i % 20 == 19 else "") for i in range(32_768)]
+    publisher = CountingPublisher()
+    service = MessageDeliveryService()
+    service.attach(publisher)
+    callback = BedrockStreamingCallback(
+        service, coalesce=True, max_latency_ms=10_000_000, max_frame_bytes=16_384, flush_on_sentence_end=False
+    )
+    callback.on_llm_start({}, [])
+
+    tracemalloc.start()
+    try:
+        for token in tokens:
+            callback.on_llm_new_token(token)
+        _, streaming_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        callback.on_llm_end(None)
+        _, end_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert callback.current_response == "".join(tokens)
+    assert publisher.frames > 1
+    # while streaming, memory grows with the answer text and the frames built from it, a few tens
+    # of bytes per token; cleaning the full answer for the END frame costs a few hundred
+    assert streaming_peak / len(tokens) < 64
+    assert end_peak / len(tokens) < 512
+
+
+def test_long_answers_are_fragmented_for_api_gateway():
+    client = FakeApiGatewayManagementApi(max_frame_bytes=32 * 1024)
+    publisher = BackgroundWebSocketPublisher("https://example.com", "abc", client=client)
+    service = MessageDeliveryService()
+    service.attach(publisher)
+    callback = BedrockStreamingCallback(service, coalesce=True, max_latency_ms=10_000, max_frame_bytes=8192)
+    callback.on_llm_start({}, [])
+    tokens = [f" token{i}" + ("." if i % 10 == 9 else "") for i in range(20_000)]
+    for token in tokens:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+    assert publisher.flush(timeout=30)
+    publisher.close()
+
+    assert publisher.errors == []
+    assert publisher.fragmenter.fragmented_payloads > 0
+    assembler = FragmentAssembler()
+    reassembler = StreamReassembler()
+    for frame in client.frames["abc"]:
+        payload = assembler.add(frame)
+        if payload is not None:
+            reassembler.add(json.loads(payload))
+    assert reassembler.finished
+    assert len(reassembler.text.encode("utf-8")) > 100 * 1024
+    assert reassembler.text == clean_answer("".join(tokens))
+
+
+class AsyncRecordingPublisher(RecordingPublisher):
+    async def apublish(self, payload) -> None:
+        self.publish(payload)
+
+
+async def _astream(tokens, publisher, fail=False, **kwargs):
+    service = MessageDeliveryService()
+    service.attach(publisher)
+    callback = AsyncBedrockStreamingCallback(service, **kwargs)
+    await callback.on_llm_start({}, [])
+    for token in tokens:
+        await callback.on_llm_new_token(token)
+    if fail:
+        await callback.on_llm_error(RuntimeError("throttled"))
+    else:
+        await callback.on_llm_end(None)
+    return callback
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"delta_frames": True}, {"coalesce": True, "max_latency_ms": 10_000}, {"delta_frames": True, "fail": True}],
+)
+def test_async_callback_posts_the_same_frames(kwargs):
+    tokens = TOKENS + [" Cheese", " is", " made", " of", " milk", "."]
+    context = "The answer is ready and it streams fine."
+    fail = kwargs.pop("fail", False)
+
+    callback, expected = _callback(relevance_scorer=StreamingRelevanceScorer(context), **kwargs)
+    for token in tokens:
+        callback.on_llm_new_token(token)
+    if fail:
+        callback.on_llm_error(RuntimeError("throttled"))
+    else:
+        callback.on_llm_end(None)
+
+    publisher = AsyncRecordingPublisher()
+    scorer = StreamingRelevanceScorer(context)
+    asyncio.run(_astream(tokens, publisher, fail=fail, relevance_scorer=scorer, **kwargs))
+    assert publisher.payloads == expected.payloads
+
+
+def test_async_callback_flushes_on_timer():
+    async def stream():
+        publisher = AsyncRecordingPublisher()
+        service = MessageDeliveryService()
+        service.attach(publisher)
+        callback = AsyncBedrockStreamingCallback(service, coalesce=True, max_latency_ms=20, flush_on_sentence_end=False)
+        await callback.on_llm_start({}, [])
+        await callback.on_llm_new_token("Slow")
+        await callback.on_llm_new_token(" tokens")
+        assert publisher.frames == []
+        await asyncio.sleep(0.2)
+        return publisher
+
+    publisher = asyncio.run(stream())
+    assert [frame["message"] for frame in publisher.frames] == ["Slow tokens...."]
+
+
+def test_async_callback_with_a_streaming_chat_model():
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+
+    answer = "The answer is ready. It streams fine."
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content=answer)]))
+    publisher = AsyncRecordingPublisher()
+    service = MessageDeliveryService()
+    service.attach(publisher)
+    callback = AsyncBedrockStreamingCallback(service)
+
+    async def stream():
+        return [chunk.content async for chunk in llm.astream("question", config={"callbacks": [callback]})]
+
+    chunks = asyncio.run(stream())
+    assert "".join(chunks) == answer
+    assert [frame["type"] for frame in publisher.frames] == ["stream"] * len(chunks) + ["end"]
+    assert publisher.frames[-1]["message"] == clean_answer(answer)
+
+
+class SlowAsyncPublisher(BasePublisher):
+    def __init__(self, delay: float, error: Exception = None) -> None:
+        self.delay = delay
+        self.error = error
+        self.payloads = []
+
+    def publish(self, payload) -> None:
+        raise AssertionError("the async path must not call publish")
+
+    async def apublish(self, payload) -> None:
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        self.payloads.append(payload)
+
+
+def test_apost_awaits_publishers_concurrently():
+    publishers = [SlowAsyncPublisher(0.05) for _ in range(10)]
+    service = MessageDeliveryService()
+    for publisher in publishers:
+        service.attach(publisher)
+
+    start = time.perf_counter()
+    report = asyncio.run(service.apost("frame"))
+    assert time.perf_counter() - start < 0.05 * 5
+    assert report.ok and report.delivered == publishers
+    assert all(publisher.payloads == ["frame"] for publisher in publishers)
+
+
+def test_concurrent_apost_keeps_order_and_isolates_failures():
+    slow = SlowAsyncPublisher(0.05)
+    failing = SlowAsyncPublisher(0.0, error=RuntimeError("boom"))
+    service = MessageDeliveryService(concurrent=True, publish_timeout=0.01)
+    service.attach(slow)
+    service.attach(failing)
+
+    async def post_all():
+        reports = [await service.apost(str(i)) for i in range(3)]
+        assert await service.aflush(timeout=5)
+        return reports
+
+    reports = asyncio.run(post_all())
+    assert all(report.timed_out == [slow] for report in reports)
+    assert all(isinstance(report.failed[failing], RuntimeError) for report in reports)
+    assert slow.payloads == ["0", "1", "2"]
+
+
+def test_apublish_runs_sync_publishers_in_a_worker_thread():
+    threads = []
+
+    class ThreadRecordingPublisher(BasePublisher):
+        def publish(self, payload) -> None:
+            threads.append(threading.current_thread())
+
+    service = MessageDeliveryService()
+    service.attach(ThreadRecordingPublisher())
+    asyncio.run(service.apost("frame"))
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_instrumentation_emits_an_emf_record_after_the_end_frame():
+    stream = io.StringIO()
+    instrumentation = StreamingInstrumentation(dimensions={"ModelId": "fake"}, stream=stream)
+    client = FakeApiGatewayManagementApi()
+    service = MessageDeliveryService(instrumentation=instrumentation)
+    service.attach(WebSocketPublisher("https://example.com", "abc", client=client, instrumentation=instrumentation))
+    callback = BedrockStreamingCallback(service, instrumentation=instrumentation)
+    callback.on_llm_start({}, [])
+    for token in TOKENS:
+        callback.on_llm_new_token(token)
+    callback.on_llm_end(None)
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Dimensions"] == [["ModelId"]]
+    assert {metric["Name"] for metric in directive["Metrics"]} == set(StreamingInstrumentation.METRICS) | {"Tokens"}
+    assert record["ModelId"] == "fake"
+    assert record["Tokens"] == len(TOKENS)
+    assert record["TimeToFirstTokenSummary"]["count"] == 1
+    assert record["InterTokenGapSummary"]["count"] == len(TOKENS) - 1
+    # one STREAM frame per token and the END frame
+    assert record["FrameProcessingSummary"]["count"] == len(TOKENS) + 1
+    assert record["PublishSummary"]["count"] == len(client.frames["abc"]) == len(TOKENS) + 1
+    assert record["PostToConnectionSummary"]["count"] == len(TOKENS) + 1
+    assert len(record["Publish"]) == len(TOKENS) + 1
+    assert record["GenerationMs"] >= record["TimeToFirstTokenSummary"]["max"]
+
+
+def test_async_callback_emits_an_emf_record():
+    stream = io.StringIO()
+    instrumentation = StreamingInstrumentation(stream=stream)
+    asyncio.run(_astream(TOKENS, AsyncRecordingPublisher(), instrumentation=instrumentation))
+    record = json.loads(stream.getvalue())
+    assert record["Tokens"] == len(TOKENS)
+    assert record["FrameProcessingSummary"]["count"] == len(TOKENS) + 1
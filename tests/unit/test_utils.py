@@ -0,0 +1,107 @@
+import itertools
+import random
+from functools import partial, reduce
+
+import pytest
+
+from utils.clients import ClientRegistry
+from utils.instrumentation import LatencyHistogram
+from utils.text import (
+    EXCLUDED_CHARACTERS,
+    LEADING_SEQUENCE,
+    TRAILING_SEQUENCE,
+    TextNormalizer,
+    add_leading_sequence,
+    add_trailing_sequence,
+    clean_text_snippet,
+    remove_excluded_characters,
+    remove_leading_non_alphanumeric_chars,
+    remove_multi_consecutive_whitespaces,
+)
+
+
+def test_client_registry_reuses_clients():
+    registry = ClientRegistry()
+    first = registry.get_client("bedrock-runtime", region_name="us-west-2")
+    second = registry.get_client("bedrock-runtime", region_name="us-west-2")
+    other_region = registry.get_client("bedrock-runtime", region_name="us-east-1")
+    other_config = registry.get_client("bedrock-runtime", region_name="us-west-2", max_pool_connections=50)
+
+    assert first is second
+    assert first is not other_region
+    assert first is not other_config
+    assert other_config.meta.config.max_pool_connections == 50
+    assert (registry.hits, registry.misses) == (1, 3)
+
+    registry.clear()
+    assert registry.get_client("bedrock-runtime", region_name="us-west-2") is not first
+    assert (registry.hits, registry.misses) == (0, 1)
+
+
+def _clean_text_snippet_reference(
+    text, add_dots_on_start, add_dots_on_end, remove_consecutive_spaces, remove_only_excluded_leading_chars, max_length
+):
+    """The step by step pipeline TextNormalizer replaces"""
+    leading_sequence = LEADING_SEQUENCE if add_dots_on_start else ""
+    trailing_sequence = TRAILING_SEQUENCE if add_dots_on_end else ""
+    return reduce(
+        lambda x, f: f(x),
+        [
+            text,
+            partial(remove_excluded_characters, excluded_chars=EXCLUDED_CHARACTERS),
+            partial(remove_leading_non_alphanumeric_chars, remove_only_excluded_chars=remove_only_excluded_leading_chars),
+            lambda x: x.rstrip(),
+            remove_multi_consecutive_whitespaces if remove_consecutive_spaces else lambda x: x,
+            lambda x: x[slice(None, max_length, None)],
+            partial(add_leading_sequence, seq=leading_sequence, append=False),
+            partial(add_trailing_sequence, seq=trailing_sequence, append=True),
+        ],
+    )
+
+
+TEXT_NORMALIZER_OPTIONS = list(itertools.product([False, True], [False, True], [False, True], [False, True], [None, 0, 5]))
+
+
+@pytest.mark.parametrize("options", TEXT_NORMALIZER_OPTIONS)
+def test_text_normalizer_matches_clean_text_snippet_pipeline(options):
+    rng = random.Random(str(options))
+    alphabet = list("ab1 #*-.\n\t\r") + ["\xa0", "™", "®", "©", "é", "  "]
+    texts = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(300)]
+    expected = [_clean_text_snippet_reference(text, *options) for text in texts]
+
+    normalizer = TextNormalizer(*options)
+    assert [normalizer(text) for text in texts] == expected
+    assert normalizer.clean_batch(texts) == expected
+    assert [clean_text_snippet(text, *options) for text in texts] == expected
+
+
+def test_latency_histogram_percentiles_are_within_the_bucket_error():
+    rng = random.Random(0)
+    durations = [rng.lognormvariate(-6, 1.5) for _ in range(10_000)] + [0.0]
+    histogram = LatencyHistogram()
+    for duration in durations:
+        histogram.record(duration)
+
+    durations.sort()
+    assert histogram.count == len(durations)
+    assert histogram.sum == pytest.approx(sum(durations))
+    assert (histogram.min, histogram.max) == (0.0, durations[-1])
+    assert histogram.percentile(0) == 0.0
+    for q in (50, 90, 99, 99.9):
+        expected = durations[max(0, int(q / 100 * len(durations)) - 1)]
+        assert histogram.percentile(q) == pytest.approx(expected, rel=1 / 16 + 0.01)
+    assert len(histogram.values()) == 100
+    assert histogram.values(scale=1000)[-1] == pytest.approx(durations[-1] * 1000, rel=1 / 16)
+
+    merged = LatencyHistogram()
+    for half in (durations[::2], durations[1::2]):
+        part = LatencyHistogram()
+        for duration in half:
+            part.record(duration)
+        merged.merge(part)
+    assert (merged.counts, merged.count, merged.min, merged.max) == (
+        histogram.counts,
+        histogram.count,
+        histogram.min,
+        histogram.max,
+    )